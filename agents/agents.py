@@ -2,18 +2,38 @@ import asyncio
 import json
 import logging
 import os
+import time
 from asyncio import gather
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 import httpx
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from observability.telemetry import (
+    extract_context,
+    inject_context,
+    metrics_response,
+    telemetry_middleware,
+)
+from opentelemetry.trace import SpanKind
 from pydantic import BaseModel
 from uagents import Agent, Context, Model
 from uagents.envelope import Envelope
 from uagents.query import query
+from uagents.resolver import GlobalResolver, Resolver, parse_identifier
+
+from agents_telemetry import (
+    AGENT_QUERY_LATENCY,
+    telemetry_lifespan,
+    traced_llm_call,
+    tracer,
+)
+from llm_batching import LLMBatcher
+from llm_routing import ModelRouter
+from session_store import create_session_store
 
 load_dotenv()
 
@@ -21,25 +41,58 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Initial context of each agent and its hash, naming its version, under
+# "context:{address}", kept by SESSION_STORE
+session_store = create_session_store("agents")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with telemetry_lifespan("agents")(app):
+        try:
+            yield
+        finally:
+            session_store.close()
+
+
 # FastAPI app initialization
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(telemetry_middleware)
 
-# Enviroment variables
-token = os.getenv("LLM_API_TOKEN")
-llm_api_url = os.getenv("LLM_URL")
-llm_model = os.getenv("LLM_MODEL")
+# LLM tiers, from LLM_TIERS_FILE or the LLM_URL, LLM_MODEL and LLM_API_TOKEN variables
+router = ModelRouter.from_env()
+dialogue_tier = router.tier("npc_dialogue")
 
-if not all([token, llm_api_url, llm_model]):
-    raise RuntimeError(
-        "Missing required environment variables: LLM_API_TOKEN, LLM_URL, LLM_MODEL"
-    )
+# Micro-batching of the LLM requests, off unless a window is set
+llm_batch_window_ms = float(os.getenv("LLM_BATCH_WINDOW_MS", 0))
+llm_batch_max_size = int(os.getenv("LLM_BATCH_MAX_SIZE", 16))
+llm_batch_url = os.getenv("LLM_BATCH_URL")
+llm_batch_prompt_template = os.getenv("LLM_BATCH_PROMPT_TEMPLATE", "{message}")
 
 agents: Dict[str, Agent] = {}
-initial_contexts: Dict[str, str] = {}
+
+
+class LocalResolver(Resolver):
+    """Resolves the agents run by this service to their own endpoints, others through the Almanac."""
+
+    def __init__(self):
+        self.endpoints: Dict[str, List[str]] = {}
+        self._global_resolver = GlobalResolver()
+
+    async def resolve(self, destination: str) -> tuple[str | None, list[str]]:
+        _, _, address = parse_identifier(destination)
+        if address in self.endpoints:
+            return address, self.endpoints[address]
+        return await self._global_resolver.resolve(destination)
+
+
+resolver = LocalResolver()
 
 
 class AgentMessage(Model):
     message: str
+    # W3C trace context of the query, so the agent's spans join the caller's trace.
+    trace_context: Dict[str, str] = {}
 
 
 class SendMessageRequest(BaseModel):
@@ -61,7 +114,9 @@ class AgentConfiguration(BaseModel):
 
 class InitialContextRequest(BaseModel):
     agent_address: str
-    initial_context: str
+    # Left out to only check that the agent has the version named by `context_hash`.
+    initial_context: Optional[str] = None
+    context_hash: Optional[str] = None
 
 
 class InitialContextResponse(BaseModel):
@@ -71,14 +126,42 @@ class InitialContextResponse(BaseModel):
 
 @app.post("/init")
 async def set_initial_context(request: InitialContextRequest) -> InitialContextResponse:
-    """Sets the initial context for a given agent."""
-    initial_contexts[request.agent_address] = request.initial_context
+    """Sets the initial context for a given agent, a no-op when its hash is unchanged.
+
+    Without a context, answers 409 unless the agent has the version of the hash, to be
+    sent again in full.
+    """
+    key = f"context:{request.agent_address}"
+    known = session_store.get(key)
+    if (
+        request.context_hash is not None
+        and known is not None
+        and known["hash"] == request.context_hash
+    ):
+        return InitialContextResponse(
+            status="unchanged",
+            message=f"Initial context unchanged for {request.agent_address}",
+        )
+    if request.initial_context is None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Unknown context hash for {request.agent_address}",
+        )
+    session_store.put(
+        key, {"context": request.initial_context, "hash": request.context_hash}
+    )
     logger.info(f"Initial context set for {request.agent_address}")
     return InitialContextResponse(
         status="success", message=f"Initial context set for {request.agent_address}"
     )
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics with the latency histograms of requests, agent queries and LLM calls."""
+    return metrics_response()
+
+
 @app.post("/send-message")
 async def process_message(request: SendMessageRequest) -> Any:
     """Processes and sends a message to multiple agents."""
@@ -86,7 +169,8 @@ async def process_message(request: SendMessageRequest) -> Any:
 
     query_tasks = []
     for recipient in request.recipients:
-        initial_context = initial_contexts.get(recipient, "")
+        known = session_store.get(f"context:{recipient}")
+        initial_context = known["context"] if known else ""
         combined_message = (
             f"{initial_context}\n{request.message}"
             if initial_context
@@ -103,7 +187,15 @@ async def process_message(request: SendMessageRequest) -> Any:
 
 async def agent_query(destination: str, req: AgentMessage) -> Any:
     """Queries an agent with a given message."""
-    response = await query(destination=destination, message=req, timeout=15)
+    start = time.perf_counter()
+    with tracer.start_as_current_span("agent query", kind=SpanKind.CLIENT) as span:
+        span.set_attribute("agent.address", destination)
+        req.trace_context = inject_context()
+        response = await query(
+            destination=destination, message=req, resolver=resolver, timeout=15
+        )
+        status = "ok" if isinstance(response, Envelope) else "failed"
+        AGENT_QUERY_LATENCY.labels(status).observe(time.perf_counter() - start)
     if isinstance(response, Envelope):
         return json.loads(response.decode_payload())
     return response
@@ -119,44 +211,72 @@ def create_agent(config: AgentConfiguration) -> Agent:
     async def query_handler(ctx: Context, sender: str, msg: AgentMessage):
         logger.info(f"[{config.name}] Received message at {datetime.now()}")
 
-        llm_response = await fetch_llm_response(msg.message)
+        with tracer.start_as_current_span(
+            f"agent {config.name}",
+            context=extract_context(msg.trace_context),
+            kind=SpanKind.SERVER,
+        ):
+            llm_response = await fetch_llm_response(msg.message)
         await ctx.send(sender, AgentResponse(text=llm_response))
 
     return agent
 
 
 async def fetch_llm_response(message: str) -> str:
-    """Fetches a response from the LLM API."""
+    """Fetches a response from the LLM API, through the batcher if batching is on."""
+    try:
+        if batcher is not None:
+            return await batcher.complete(message)
+        return await request_chat_completion(message)
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP {e.response.status_code} error querying LLM: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error querying LLM: {e}")
+    return "Error: Unable to fetch response from LLM"
+
+
+async def request_chat_completion(message: str) -> str:
+    """Requests the chat completion of a single message."""
+    tier = dialogue_tier
     payload = {
-        "model": llm_model,
+        "model": tier.model,
         "messages": [{"role": "user", "content": message}],
-        "temperature": 0.7,
+        "temperature": tier.temperature,
         "stream": False,
-        "max_tokens": 1000,
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "Authorization": f"Bearer {token}",
+        "max_tokens": tier.max_tokens or 1000,
     }
 
-    try:
+    async def send(url: str) -> dict:
         async with httpx.AsyncClient() as client:
-            response = await client.post(
-                llm_api_url, headers=headers, json=payload, timeout=15
-            )
+            with traced_llm_call("agent", tier.name, tier.model) as outgoing:
+                response = await client.post(
+                    url,
+                    headers={**tier.headers(), **outgoing.headers},
+                    json=payload,
+                    timeout=tier.timeout or 15,
+                )
+                outgoing.status = response.status_code
             response.raise_for_status()
-            data = response.json()
-            return (
-                data.get("choices", [{}])[0]
-                .get("message", {})
-                .get("content", "No response")
-            )
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP {e.response.status_code} error querying LLM: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error querying LLM: {e}")
-    return "Error: Unable to fetch response from LLM"
+            return response.json()
+
+    data = await tier.pool.request(send)
+    tier.record_usage(data.get("usage"))
+    return data.get("choices", [{}])[0].get("message", {}).get("content", "No response")
+
+
+batcher = (
+    LLMBatcher(
+        tier=dialogue_tier,
+        url=llm_batch_url,
+        window=llm_batch_window_ms / 1000,
+        max_size=llm_batch_max_size,
+        prompt_template=llm_batch_prompt_template,
+        max_tokens=dialogue_tier.max_tokens or 1000,
+        fallback=request_chat_completion,
+    )
+    if llm_batch_window_ms > 0
+    else None
+)
 
 
 async def start_agents() -> None:
@@ -166,6 +286,9 @@ async def start_agents() -> None:
 
     for config in agent_configs:
         agents[config.name] = create_agent(config)
+        resolver.endpoints[agents[config.name].address] = (
+            [config.endpoint] if isinstance(config.endpoint, str) else config.endpoint
+        )
 
     await gather(*(agent.run_async() for agent in agents.values()))
 
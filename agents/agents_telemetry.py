@@ -0,0 +1,116 @@
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from observability.telemetry import (
+    OutgoingRequest,
+    inject_context,
+    setup_tracing,
+    shutdown_tracing,
+    start_metrics_file_writer,
+)
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind
+from prometheus_client import Counter, Gauge, Histogram
+
+# Metrics and instrumentation of the agents and the narrator, the HTTP ones and the
+# tracing setup shared with the backend are in `observability.telemetry`.
+
+# Spans are no-ops until `setup_telemetry` installs a tracer provider.
+tracer = trace.get_tracer("agents")
+
+LLM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+LLM_LATENCY = Histogram(
+    "llm_request_duration_seconds",
+    "Latency of the LLM completions.",
+    ["caller", "tier", "model", "status"],
+    buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens of the LLM completions, by kind (prompt or completion).",
+    ["tier", "model", "kind"],
+)
+LLM_COST = Counter(
+    "llm_cost_total",
+    "Estimated cost of the LLM completions, in the currency of the tier prices.",
+    ["tier", "model"],
+)
+LLM_BATCH_SIZE = Histogram(
+    "llm_batch_size",
+    "Completions sent together by the LLM batcher.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+LLM_ENDPOINT_LATENCY = Gauge(
+    "llm_endpoint_latency_ewma_seconds",
+    "Moving average of the latency of every LLM endpoint.",
+    ["tier", "url"],
+)
+LLM_ENDPOINT_EJECTIONS = Counter(
+    "llm_endpoint_ejections_total",
+    "Times an LLM endpoint was ejected after consecutive failures.",
+    ["tier", "url"],
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total",
+    "LLM requests answered after being hedged, by the attempt that won.",
+    ["tier", "winner"],
+)
+WORLD_TURNS = Counter(
+    "world_turns_total",
+    "Player turns handled in a single LLM call, by outcome.",
+    ["outcome"],
+)
+AGENT_QUERY_LATENCY = Histogram(
+    "agent_query_duration_seconds",
+    "Latency of the agent queries sent by the agents hub.",
+    ["status"],
+    buckets=LLM_BUCKETS,
+)
+
+
+def setup_telemetry(service_name: str):
+    """Installs the span exporter and the metrics file writer configured in the environment."""
+    setup_tracing(
+        service_name,
+        os.getenv("TRACE_EXPORTER", "none"),
+        os.getenv("TRACE_FILE") or f"{service_name}-traces.jsonl",
+    )
+    metrics_file = os.getenv("METRICS_FILE")
+    if metrics_file:
+        start_metrics_file_writer(
+            metrics_file, float(os.getenv("METRICS_FILE_INTERVAL", 15))
+        )
+
+
+def telemetry_lifespan(service_name: str):
+    """FastAPI lifespan setting up telemetry on startup and flushing it on shutdown."""
+
+    # uvicorn re-raises the shutdown signal, so atexit handlers would not run.
+    @asynccontextmanager
+    async def lifespan(app):
+        setup_telemetry(service_name)
+        yield
+        shutdown_tracing()
+
+    return lifespan
+
+
+@contextmanager
+def traced_llm_call(caller: str, tier: str, model: str):
+    """Span and latency of an LLM completion."""
+    start = time.perf_counter()
+    with tracer.start_as_current_span("llm chat", kind=SpanKind.CLIENT) as span:
+        outgoing = OutgoingRequest(inject_context())
+        try:
+            yield outgoing
+        finally:
+            status = str(outgoing.status) if outgoing.status is not None else "error"
+            span.set_attribute("gen_ai.request.model", model)
+            span.set_attribute("llm.caller", caller)
+            span.set_attribute("llm.tier", tier)
+            span.set_attribute("http.response.status_code", status)
+            LLM_LATENCY.labels(caller, tier, model, status).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from agents_telemetry import LLM_BATCH_SIZE, traced_llm_call
+from llm_routing import ModelTier
+
+logger = logging.getLogger(__name__)
+
+# Statuses telling that the LLM API has no multi-prompt completions endpoint.
+UNSUPPORTED_STATUSES = {400, 404, 405, 415, 422, 501}
+
+
+class LLMBatcher:
+    """Collects the completions requested within a time window and sends them as one multi-prompt request."""
+
+    def __init__(
+        self,
+        tier: ModelTier,
+        url: Optional[str],
+        window: float,
+        max_size: int,
+        prompt_template: str,
+        max_tokens: int,
+        fallback: Callable[[str], Awaitable[str]],
+    ):
+        self.tier = tier
+        self.url = url
+        self.window = window
+        self.max_size = max_size
+        self.prompt_template = prompt_template
+        self.max_tokens = max_tokens
+        self.fallback = fallback
+        self.supported = True
+        self.pending: List[Tuple[str, asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks, so the batches being sent are
+        # kept here until answered.
+        self.sending: Set[asyncio.Task] = set()
+
+    async def complete(self, message: str) -> str:
+        """Queues a completion and waits for its batch to be answered."""
+        if not self.supported:
+            return await self.fallback(message)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((message, future))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                self.window, self.flush
+            )
+        return await future
+
+    def flush(self):
+        """Sends the pending completions."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self.send(batch))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def send(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Sends a batch and hands every waiter its completion."""
+        LLM_BATCH_SIZE.observe(len(batch))
+        # A lone request gains nothing from the batch endpoint and keeps the chat template.
+        if len(batch) == 1 or not self.supported:
+            await gather_into(batch, self.fallback)
+            return
+
+        try:
+            choices = await self.request([message for message, _ in batch])
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in UNSUPPORTED_STATUSES:
+                fail(batch, e)
+                return
+            logger.warning(
+                f"Batched completions are not supported by {e.request.url} "
+                f"(HTTP {e.response.status_code}), sending the requests one by one"
+            )
+            self.supported = False
+            await gather_into(batch, self.fallback)
+            return
+        except Exception as e:
+            fail(batch, e)
+            return
+
+        missing = []
+        for index, (message, future) in enumerate(batch):
+            if index in choices:
+                if not future.done():
+                    future.set_result(choices[index])
+            else:
+                missing.append((message, future))
+        if missing:
+            await gather_into(missing, self.fallback)
+
+    async def request(self, messages: List[str]) -> Dict[int, str]:
+        """Requests the completions of all messages at once, by prompt index."""
+        payload = {
+            "model": self.tier.model,
+            "prompt": [
+                self.prompt_template.format(message=message) for message in messages
+            ],
+            "temperature": self.tier.temperature,
+            "max_tokens": self.max_tokens,
+        }
+
+        async def send(url: str) -> dict:
+            async with httpx.AsyncClient() as client:
+                with traced_llm_call(
+                    "agent batch", self.tier.name, self.tier.model
+                ) as outgoing:
+                    response = await client.post(
+                        self.url or url.replace("/chat/completions", "/completions"),
+                        headers={**self.tier.headers(), **outgoing.headers},
+                        json=payload,
+                        timeout=self.tier.timeout or 15,
+                    )
+                    outgoing.status = response.status_code
+                response.raise_for_status()
+                return response.json()
+
+        data = await self.tier.pool.request(send)
+        self.tier.record_usage(data.get("usage"))
+        return {
+            choice.get("index", index): choice.get("text", "")
+            for index, choice in enumerate(data.get("choices", []))
+        }
+
+
+async def gather_into(
+    batch: List[Tuple[str, asyncio.Future]],
+    complete: Callable[[str], Awaitable[str]],
+):
+    """Completes every message of the batch separately, concurrently."""
+    results = await asyncio.gather(
+        *(complete(message) for message, _ in batch), return_exceptions=True
+    )
+    for (_, future), result in zip(batch, results):
+        if future.done():
+            continue
+        if isinstance(result, BaseException):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+
+def fail(batch: List[Tuple[str, asyncio.Future]], error: Exception):
+    """Fails every waiter of the batch with the same error."""
+    for _, future in batch:
+        if not future.done():
+            future.set_exception(error)
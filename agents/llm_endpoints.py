@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+import httpx
+import requests
+
+from agents_telemetry import LLM_ENDPOINT_EJECTIONS, LLM_ENDPOINT_LATENCY, LLM_HEDGES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latency samples kept per endpoint for the hedging quantile.
+LATENCY_WINDOW = 200
+# Samples needed before an endpoint's quantile is trusted for hedging.
+MIN_SAMPLES = 20
+
+
+class Endpoint:
+    """An LLM replica with its latency statistics and health."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.ewma: Optional[float] = None
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Latency quantile of the recent successful requests, None without enough samples."""
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Tells whether an error is the replica's fault, so that another one may do better."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, requests.RequestException))
+
+
+class EndpointPool:
+    """Equivalent LLM replicas, with hedging, failover and ejection of the failing ones."""
+
+    def __init__(
+        self,
+        tier: str,
+        urls: List[str],
+        hedge_quantile: Optional[float],
+        eject_after: int,
+        eject_seconds: float,
+        ewma_alpha: float = 0.2,
+    ):
+        self.tier = tier
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.hedge_quantile = hedge_quantile
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.ewma_alpha = ewma_alpha
+
+    def ranked(self) -> List[Endpoint]:
+        """Orders the endpoints to try: a primary picked by two random choices, then the others by latency."""
+        now = time.monotonic()
+        healthy = [e for e in self.endpoints if e.ejected_until <= now]
+        if not healthy:
+            # Everything is ejected, try the one coming back first rather than nothing.
+            return sorted(self.endpoints, key=lambda e: e.ejected_until)
+
+        # Unmeasured endpoints rank first so that they get measured.
+        def latency(endpoint: Endpoint) -> float:
+            return endpoint.ewma if endpoint.ewma is not None else 0.0
+
+        choices = random.sample(healthy, min(2, len(healthy)))
+        primary = min(choices, key=latency)
+        rest = sorted((e for e in healthy if e is not primary), key=latency)
+        return [primary] + rest
+
+    def hedge_delay(self, endpoint: Endpoint) -> Optional[float]:
+        """Seconds after which a request to `endpoint` is hedged, None to not hedge."""
+        if self.hedge_quantile is None:
+            return None
+        delay = endpoint.quantile(self.hedge_quantile)
+        if delay is None:
+            samples = sorted(l for e in self.endpoints for l in e.latencies)
+            if len(samples) < MIN_SAMPLES:
+                return None
+            delay = samples[
+                min(len(samples) - 1, int(self.hedge_quantile * len(samples)))
+            ]
+        return delay
+
+    def record_success(self, endpoint: Endpoint, latency: float):
+        endpoint.failures = 0
+        self.observe(endpoint, latency)
+
+    def observe(self, endpoint: Endpoint, latency: float):
+        endpoint.latencies.append(latency)
+        self.update_ewma(endpoint, latency)
+
+    def observe_cancelled(self, endpoint: Endpoint, elapsed: float):
+        """Records an attempt cancelled after `elapsed` seconds, a lower bound of its latency."""
+        # Kept out of the quantile samples, which it would pull down toward the hedge
+        # delay, hedging ever sooner, and never lowering the EWMA.
+        self.update_ewma(
+            endpoint, elapsed if endpoint.ewma is None else max(elapsed, endpoint.ewma)
+        )
+
+    def update_ewma(self, endpoint: Endpoint, latency: float):
+        endpoint.ewma = (
+            latency
+            if endpoint.ewma is None
+            else self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.ewma
+        )
+        LLM_ENDPOINT_LATENCY.labels(self.tier, endpoint.url).set(endpoint.ewma)
+
+    def record_failure(self, endpoint: Endpoint, error: BaseException):
+        endpoint.failures += 1
+        if endpoint.failures >= self.eject_after and len(self.endpoints) > 1:
+            endpoint.failures = 0
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            LLM_ENDPOINT_EJECTIONS.labels(self.tier, endpoint.url).inc()
+            logger.warning(
+                f"Ejecting LLM endpoint {endpoint.url} for {self.eject_seconds} s after: {error}"
+            )
+
+    async def attempt(
+        self, endpoint: Endpoint, send: Callable[[str], Awaitable[T]]
+    ) -> T:
+        start = time.perf_counter()
+        try:
+            result = await send(endpoint.url)
+        except asyncio.CancelledError:
+            # The attempt lost to a hedge, its latency was at least this long.
+            self.observe_cancelled(endpoint, time.perf_counter() - start)
+            raise
+        except Exception as e:
+            if is_endpoint_failure(e):
+                self.record_failure(endpoint, e)
+            raise
+        self.record_success(endpoint, time.perf_counter() - start)
+        return result
+
+    async def request(self, send: Callable[[str], Awaitable[T]]) -> T:
+        """Sends `send(url)` to the best endpoint, hedges it once when slow and fails over on errors, the first answer wins."""
+        candidates = self.ranked()
+        pending = {}
+        next_index = 0
+        hedged = False
+        error: Optional[BaseException] = None
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            pending[asyncio.create_task(self.attempt(endpoint, send))] = endpoint
+
+        launch()
+        try:
+            while pending:
+                delay = None
+                if not hedged and len(pending) == 1 and next_index < len(candidates):
+                    delay = self.hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+
+                for task in done:
+                    endpoint = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            winner = "primary" if endpoint is candidates[0] else "hedge"
+                            LLM_HEDGES.labels(self.tier, winner).inc()
+                        return task.result()
+                    error = task.exception()
+                    if not is_endpoint_failure(error):
+                        raise error
+                if not pending and next_index < len(candidates):
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def request_sync(self, send: Callable[[str], T]) -> T:
+        """Blocking variant of `request`, failing over on errors without hedging."""
+        error: Optional[BaseException] = None
+        for endpoint in self.ranked():
+            start = time.perf_counter()
+            try:
+                result = send(endpoint.url)
+            except Exception as e:
+                if not is_endpoint_failure(e):
+                    raise
+                self.record_failure(endpoint, e)
+                error = e
+                continue
+            self.record_success(endpoint, time.perf_counter() - start)
+            return result
+        raise error
@@ -0,0 +1,131 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, PrivateAttr, model_validator
+
+from agents_telemetry import LLM_COST, LLM_TOKENS
+from llm_endpoints import EndpointPool
+
+# The LLM calls of the services, each routed to a tier.
+CALL_TYPES = ("npc_dialogue", "narrator_selection", "world_turn", "npc_tick")
+DEFAULT_TIER = "default"
+
+
+class ModelTier(BaseModel):
+    """LLM endpoints serving the same model, with its generation limits and prices."""
+
+    url: Optional[str] = None
+    # Equivalent replicas, used instead of `url` with hedging and failover.
+    urls: List[str] = []
+    model: str
+    # The token is read from this environment variable, keeping it out of the tiers file.
+    api_token_env: str = "LLM_API_TOKEN"
+    max_tokens: Optional[int] = None
+    temperature: float = 0.7
+    timeout: Optional[float] = None
+    input_cost_per_1k: float = 0
+    output_cost_per_1k: float = 0
+    # Latency quantile of an endpoint after which a request is hedged, None to not hedge.
+    hedge_quantile: Optional[float] = 0.95
+    eject_after_failures: int = 3
+    eject_seconds: float = 30
+    _name: str = PrivateAttr("")
+    _pool: Optional[EndpointPool] = PrivateAttr(None)
+
+    @model_validator(mode="after")
+    def check_urls(self):
+        if not self.urls:
+            if not self.url:
+                raise ValueError("A tier needs a `url` or `urls`")
+            self.urls = [self.url]
+        return self
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def pool(self) -> EndpointPool:
+        return self._pool
+
+    def headers(self) -> Dict[str, str]:
+        """Headers authenticating to the tier's endpoint, local servers may need no token."""
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        token = os.getenv(self.api_token_env)
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return headers
+
+    def record_usage(self, usage: Optional[dict]):
+        """Counts the tokens and the estimated cost of a completion from its `usage`."""
+        if not usage:
+            return
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        LLM_TOKENS.labels(self.name, self.model, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(self.name, self.model, "completion").inc(completion_tokens)
+        LLM_COST.labels(self.name, self.model).inc(
+            prompt_tokens / 1000 * self.input_cost_per_1k
+            + completion_tokens / 1000 * self.output_cost_per_1k
+        )
+
+
+class ModelRouter:
+    """Maps every call type to a model tier."""
+
+    def __init__(self, tiers: Dict[str, ModelTier], routes: Dict[str, str]):
+        for name, tier in tiers.items():
+            tier._name = name
+            tier._pool = EndpointPool(
+                name,
+                tier.urls,
+                tier.hedge_quantile,
+                tier.eject_after_failures,
+                tier.eject_seconds,
+            )
+        for call_type, tier in routes.items():
+            if call_type not in CALL_TYPES:
+                raise RuntimeError(f"Unknown LLM call type {call_type!r} in the routes")
+            if tier not in tiers:
+                raise RuntimeError(
+                    f"LLM call type {call_type!r} routed to unknown tier {tier!r}"
+                )
+        for call_type in CALL_TYPES:
+            if call_type not in routes and DEFAULT_TIER not in tiers:
+                raise RuntimeError(
+                    f"No LLM tier for {call_type!r} and no {DEFAULT_TIER!r} tier"
+                )
+        self.tiers = tiers
+        self.routes = routes
+
+    def tier(self, call_type: str) -> ModelTier:
+        """Returns the tier serving a call type."""
+        return self.tiers[self.routes.get(call_type, DEFAULT_TIER)]
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Loads the tiers file named by `LLM_TIERS_FILE`, or a single tier from `LLM_URL` (comma separated replicas) and `LLM_MODEL`."""
+        path = os.getenv("LLM_TIERS_FILE")
+        if path:
+            with open(path) as f:
+                config = json.load(f)
+            return cls(
+                {name: ModelTier(**tier) for name, tier in config["tiers"].items()},
+                config.get("routes", {}),
+            )
+
+        if not all(
+            [os.getenv("LLM_API_TOKEN"), os.getenv("LLM_URL"), os.getenv("LLM_MODEL")]
+        ):
+            raise RuntimeError(
+                "Missing required environment variables: LLM_API_TOKEN, LLM_URL, LLM_MODEL"
+            )
+        return cls(
+            {
+                DEFAULT_TIER: ModelTier(
+                    urls=os.getenv("LLM_URL").split(","), model=os.getenv("LLM_MODEL")
+                )
+            },
+            {},
+        )
@@ -1,13 +1,31 @@
 import os
 import json
+import hashlib
 import logging
 import datetime
+import threading
 import requests
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List, Dict, Union
+from typing import Callable, List, Dict, Optional, Union
 import uvicorn
+from contextlib import asynccontextmanager
+from observability.profiling import (
+    ProfilingMiddleware,
+    RequestProfiler,
+    create_admin_router,
+)
+from observability.telemetry import (
+    NPC_TICKS,
+    metrics_response,
+    telemetry_middleware,
+    traced_request,
+)
+
+from agents_telemetry import WORLD_TURNS, telemetry_lifespan, traced_llm_call
+from llm_routing import ModelRouter, ModelTier
+from session_store import create_session_store
 
 load_dotenv()
 
@@ -15,51 +33,94 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Environment variables
-token = os.getenv("LLM_API_TOKEN")
-llm_api_url = os.getenv("LLM_URL")
-llm_model = os.getenv("LLM_MODEL")
-
-if not all([token, llm_api_url, llm_model]):
-    raise RuntimeError(
-        "Missing required environment variables: LLM_API_TOKEN, LLM_URL, LLM_MODEL"
-    )
+# LLM tiers, from LLM_TIERS_FILE or the LLM_URL, LLM_MODEL and LLM_API_TOKEN variables
+router = ModelRouter.from_env()
+# `agents` queries every agent and then the narrator LLM, `world` asks for the NPC
+# actions and the narrator's pick in a single LLM call, falling back to `agents`.
+turn_mode = os.getenv("NARRATOR_TURN_MODE", "agents")
 
 # Load agent configurations
-with open("agents.json") as f:
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents.json")) as f:
     agents: List[str] = [agent["recipient_address"] for agent in json.load(f)]
 
-# Global state
-player_data: Dict[int, "PlayerSession"] = {}
-agent_url_to_name: Dict[str, str] = {}
-agent_name_to_id: Dict[str, int] = {}
+# Player sessions under "player:{id}", kept by SESSION_STORE
+session_store = create_session_store("narrator")
+# Locks serializing the changes to a player's session, striped by player ID
+session_locks = [threading.Lock() for _ in range(256)]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with telemetry_lifespan("narrator")(app):
+        try:
+            yield
+        finally:
+            session_store.close()
+
 
 # FastAPI app instance
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(telemetry_middleware)
+
+profiler = RequestProfiler(
+    os.getenv("PROFILING_DIR", "profiles"),
+    int(os.getenv("PROFILING_MAX_FILES", 50)),
+    float(os.getenv("PROFILING_INTERVAL", 0.005)),
+)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.include_router(
+    create_admin_router(profiler, os.getenv("PROFILING_ADMIN_TOKEN", ""))
+)
 
 
 class CharacterInitializeRequest(BaseModel):
     agent_id: int
     name: str
-    init_prompt: str
+    # Left out when unchanged, `init_prompt_hash` then names the version the session has.
+    init_prompt: Optional[str] = None
+    init_prompt_hash: Optional[str] = None
 
 
 class InitializeRequest(BaseModel):
     player_id: int
-    narrator_prompt: str
+    # Left out when unchanged, `narrator_prompt_hash` then names the version the session has.
+    narrator_prompt: Optional[str] = None
+    narrator_prompt_hash: Optional[str] = None
     characters: List[CharacterInitializeRequest]
 
 
+class InitializeResponse(BaseModel):
+    # IDs of the characters whose prompt changed, and agents sent a new context.
+    updated_characters: List[int]
+    narrator_prompt_updated: bool
+    agents_initialized: int
+
+
 class ActionRequest(BaseModel):
     player_id: int
     player_action: str
 
 
+class ReleaseRequest(BaseModel):
+    player_id: int
+
+
 class ActionResponse(BaseModel):
     agent_id: int
     message: str
 
 
+class TickRequest(BaseModel):
+    # The location, by which the backend picks the narrator worker ticking it.
+    location_id: Optional[int] = None
+    # Sessions of the players in the same location, sharing its NPCs.
+    player_ids: List[int]
+
+
+class TickResponse(BaseModel):
+    action: Optional[ActionResponse] = None
+
+
 class PlayerSession:
     def __init__(
         self,
@@ -69,59 +130,285 @@ class PlayerSession:
     ):
         self.player_id = player_id
         self.narrator_prompt = narrator_prompt
+        self.narrator_prompt_hash = content_hash(narrator_prompt)
         self.characters = characters
         self.current_dialogue: List[str] = []
+        # Released sessions keep their prompts, so that re-entering needs only hashes.
+        self.released = False
+
+    def agent_names(self) -> Dict[str, str]:
+        """Names of the session's characters by agent address."""
+        return {url: character.name for url, character in zip(agents, self.characters)}
+
+    def agent_ids(self) -> Dict[str, int]:
+        """IDs of the session's characters by name."""
+        return {character.name: character.agent_id for character in self.characters}
+
+    def to_dict(self) -> dict:
+        return {
+            "player_id": self.player_id,
+            "narrator_prompt": self.narrator_prompt,
+            "characters": [character.model_dump() for character in self.characters],
+            # Copied, the memory store keeps the dict itself.
+            "current_dialogue": list(self.current_dialogue),
+            "released": self.released,
+        }
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "PlayerSession":
+        session = cls(
+            data["player_id"],
+            data["narrator_prompt"],
+            [CharacterInitializeRequest(**c) for c in data["characters"]],
+        )
+        session.current_dialogue = list(data["current_dialogue"])
+        session.released = data["released"]
+        return session
+
+
+def content_hash(content: str) -> str:
+    """Hash naming a version of a prompt, the same as the backend's."""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def load_session(player_id: int) -> Optional[PlayerSession]:
+    """Returns the player's session from the store, released or not."""
+    data = session_store.get(f"player:{player_id}")
+    return None if data is None else PlayerSession.from_dict(data)
+
+
+def save_session(session: PlayerSession):
+    """Writes the player's session to the store."""
+    session_store.put(f"player:{session.player_id}", session.to_dict())
+
+
+def session_lock(player_id: int) -> threading.Lock:
+    """Returns the lock serializing the changes to the player's session."""
+    return session_locks[player_id % len(session_locks)]
 
-@app.post("/initialize")
-def initialize(request: InitializeRequest):
-    """Initializes a player session with characters and a narrator prompt."""
-    player_data[request.player_id] = PlayerSession(
-        request.player_id, request.narrator_prompt, request.characters
-    )
 
+def update_session(
+    player_id: int, change: Callable[[PlayerSession], None]
+) -> Optional[PlayerSession]:
+    """Changes the player's active session as stored now, under the player's lock.
+
+    Requests change the latest version rather than write back a copy read before a
+    slow LLM call, so that a tick and a turn keep each other's lines and a release is
+    not undone. Returns None, changing nothing, when there is no active session.
+    """
+    with session_lock(player_id):
+        session = load_session(player_id)
+        if session is None or session.released:
+            return None
+        change(session)
+        save_session(session)
+        return session
+
+
+def append_dialogue(player_id: int, lines: List[str]):
+    """Appends lines to the dialogue of the player's active session, if any."""
+    if lines:
+        update_session(
+            player_id, lambda session: session.current_dialogue.extend(lines)
+        )
+
+
+@app.post("/initialize")
+def initialize(request: InitializeRequest) -> InitializeResponse:
+    """Initializes a player session with characters and a narrator prompt.
+
+    Prompts left out are taken from the player's previous session when their hash
+    matches, otherwise nothing changes and a 409 lists them, to be sent in full.
+    Agents are sent the hash of their context first, and the context only when they
+    do not have it.
+    """
     if len(request.characters) != len(agents):
         raise HTTPException(
             status_code=400, detail="Mismatch between agents and characters"
         )
 
-    for agent_url, character in zip(agents, request.characters):
+    previous = load_session(request.player_id)
+    previous_characters = (
+        {c.agent_id: c for c in previous.characters} if previous else {}
+    )
+    missing = []
+
+    if request.narrator_prompt is not None:
+        narrator_prompt = request.narrator_prompt
+    elif previous and previous.narrator_prompt_hash == request.narrator_prompt_hash:
+        narrator_prompt = previous.narrator_prompt
+    else:
+        narrator_prompt = None
+        missing.append("narrator_prompt")
+
+    characters = []
+    for character in request.characters:
+        if character.init_prompt is not None:
+            init_prompt = character.init_prompt
+        else:
+            known = previous_characters.get(character.agent_id)
+            if known is None or known.init_prompt_hash != character.init_prompt_hash:
+                missing.append(character.agent_id)
+                continue
+            init_prompt = known.init_prompt
+        characters.append(
+            CharacterInitializeRequest(
+                agent_id=character.agent_id,
+                name=character.name,
+                init_prompt=init_prompt,
+                init_prompt_hash=content_hash(init_prompt),
+            )
+        )
+    if missing:
+        raise HTTPException(status_code=409, detail={"missing": missing})
+
+    session = PlayerSession(request.player_id, narrator_prompt, characters)
+    with session_lock(request.player_id):
+        save_session(session)
+
+    # Agents hold one context each, whichever session sent it last. The agents
+    # service is asked rather than a hash kept here, which goes stale when it
+    # restarts or another narrator worker initializes the agent.
+    initialized = sum(
         initialize_agent(request.player_id, agent_url, character)
-        agent_url_to_name[agent_url] = character.name
-        agent_name_to_id[character.name] = character.agent_id
+        for agent_url, character in zip(agents, characters)
+    )
+
+    return InitializeResponse(
+        updated_characters=[
+            c.agent_id
+            for c in characters
+            if c.agent_id not in previous_characters
+            or previous_characters[c.agent_id].init_prompt_hash != c.init_prompt_hash
+        ],
+        narrator_prompt_updated=previous is None
+        or previous.narrator_prompt_hash != session.narrator_prompt_hash,
+        agents_initialized=initialized,
+    )
 
 
 @app.post("/action")
 def process_action(request: ActionRequest) -> ActionResponse:
     """Processes a player action and retrieves the next response."""
-    session = player_data.get(request.player_id)
-    if not session:
+    session = update_session(
+        request.player_id,
+        lambda session: session.current_dialogue.append(request.player_action),
+    )
+    if session is None:
+        raise HTTPException(status_code=404, detail="Player session not found")
+
+    start = len(session.current_dialogue)
+    try:
+        if turn_mode == "world":
+            response = world_turn(session)
+            if response is not None:
+                return response
+        return send_message(session)
+    finally:
+        append_dialogue(request.player_id, session.current_dialogue[start:])
+
+
+@app.post("/tick")
+def tick(request: TickRequest) -> TickResponse:
+    """Lets the NPCs of a location act on their own, for all its players in one LLM call."""
+    sessions = [
+        session
+        for session in map(load_session, request.player_ids)
+        if session is not None and not session.released
+    ]
+    if not sessions:
         raise HTTPException(status_code=404, detail="Player session not found")
+    starts = [len(session.current_dialogue) for session in sessions]
+    action = npc_tick(sessions)
+    for session, start in zip(sessions, starts):
+        append_dialogue(session.player_id, session.current_dialogue[start:])
+    return TickResponse(action=action)
 
-    session.current_dialogue.append(request.player_action)
-    return send_message(request.player_id)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics with the latency histograms of requests and LLM calls."""
+    return metrics_response()
+
+
+@app.post("/release")
+def release(request: ReleaseRequest):
+    """Ends a player session when the player leaves the location, keeping its prompts."""
+    with session_lock(request.player_id):
+        session = load_session(request.player_id)
+        if session is not None:
+            session.current_dialogue = []
+            session.released = True
+            save_session(session)
+    return {"status": "released"}
 
 
 def initialize_agent(
     player_id: int, agent_url: str, character: CharacterInitializeRequest
-):
-    """Sends initialization request to an agent."""
+) -> bool:
+    """Sends initialization request to an agent, returns whether the context was sent."""
     url = "http://127.0.0.1:9080/init"
     payload = {
         "player_id": player_id,
         "agent_address": agent_url,
-        "initial_context": character.init_prompt,
+        "initial_context": None,
+        "context_hash": character.init_prompt_hash,
     }
     headers = {"Content-Type": "application/json"}
-    response = requests.post(url, headers=headers, json=payload)
+    with traced_request("POST", url) as outgoing:
+        response = requests.post(
+            url, headers={**headers, **outgoing.headers}, json=payload
+        )
+        outgoing.status = response.status_code
+
+    sent = response.status_code == 409
+    if sent:
+        # The agent does not have this version, it is sent in full.
+        payload["initial_context"] = character.init_prompt
+        with traced_request("POST", url) as outgoing:
+            response = requests.post(
+                url, headers={**headers, **outgoing.headers}, json=payload
+            )
+            outgoing.status = response.status_code
 
     if response.status_code != 200:
         logging.error(f"Failed to initialize agent {character.name} at {agent_url}")
         raise HTTPException(status_code=500, detail="Failed to initialize agent")
+    return sent
+
 
+def request_completion(tier: ModelTier, caller: str, payload: dict) -> dict:
+    """Posts a chat completion to the tier's endpoints, failing over between them."""
 
-def eval_function(player_id: int, results: Dict[str, str]) -> ActionResponse:
+    def send(url: str) -> dict:
+        with traced_llm_call(caller, tier.name, tier.model) as outgoing:
+            response = requests.post(
+                url,
+                headers={**tier.headers(), **outgoing.headers},
+                json=payload,
+                timeout=tier.timeout,
+            )
+            outgoing.status = response.status_code
+        response.raise_for_status()
+        return response.json()
+
+    data = tier.pool.request_sync(send)
+    tier.record_usage(data.get("usage"))
+    return data
+
+
+def build_eval_prompt(session: PlayerSession, actions_str: List[str]) -> str:
+    """Fills the narrator prompt with the dialogue so far and the agent responses."""
+    prompt = session.narrator_prompt.replace(
+        "{action_history}", "\n".join(session.current_dialogue)
+    )
+    return prompt.replace("{agent_responses}", "\n".join(actions_str))
+
+
+def eval_function(session: PlayerSession, results: Dict[str, str]) -> ActionResponse:
     """Evaluates agent responses using the LLM model."""
+    agent_url_to_name = session.agent_names()
+    agent_name_to_id = session.agent_ids()
     actions_str = [
         f"{agent_url_to_name[recipient]}: {message}"
         for recipient, message in results.items()
@@ -133,30 +420,19 @@ def eval_function(player_id: int, results: Dict[str, str]) -> ActionResponse:
             agent_id=-1, message="*The room became filled with silence*"
         )
 
-    session = player_data[player_id]
-    prompt = session.narrator_prompt.replace(
-        "{action_history}", "\n".join(session.current_dialogue)
-    )
-    prompt = prompt.replace("{agent_responses}", "\n".join(actions_str))
-
-    payload = json.dumps(
-        {
-            "model": llm_model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.7,
-            "stream": False,
-            "max_tokens": 8000,
-        }
-    )
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {token}",
+    prompt = build_eval_prompt(session, actions_str)
+
+    tier = router.tier("narrator_selection")
+    payload = {
+        "model": tier.model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": tier.temperature,
+        "stream": False,
+        "max_tokens": tier.max_tokens or 8000,
     }
 
     try:
-        response = requests.post(llm_api_url, headers=headers, data=payload)
-        response.raise_for_status()
-        llm_response = response.json()
+        llm_response = request_completion(tier, "narrator", payload)
         llm_content = (
             llm_response.get("choices", [{}])[0]
             .get("message", {})
@@ -190,13 +466,170 @@ def eval_function(player_id: int, results: Dict[str, str]) -> ActionResponse:
     raise HTTPException(status_code=500, detail="No valid response found")
 
 
-def send_message(player_id: int) -> ActionResponse:
+WORLD_TURN_PROMPT = """You are running one turn of a role-playing game. You play every NPC of the location, then act as the storyteller choosing whose action happens.
+
+These are the NPCs, each with the instructions of its character in an `npc` element carrying its name:
+{npcs}
+
+This is the dialogue so far:
+{dialogue}
+
+First decide, for every NPC, the one command it wants to perform according to its instructions: a line it says, or `silence`.
+Then, as the storyteller, pick the one NPC whose action will be performed: the best fitting one, most interesting, and making enjoyable and balanced gameplay.
+
+Answer with **ONLY** a JSON object of this form, and no other text:
+{{"actions": {{"<NPC name>": "<command>"}}, "chosen": "<NPC name>"}}
+If every NPC stays silent, set "chosen" to null."""
+
+
+def build_world_turn_prompt(session: PlayerSession) -> str:
+    """Fills the world turn prompt with the characters of the session and the dialogue."""
+    npcs = "\n".join(
+        f'<npc name="{character.name}">\n{character.init_prompt.strip()}\n</npc>'
+        for character in session.characters
+    )
+    return WORLD_TURN_PROMPT.format(
+        npcs=npcs, dialogue="\n".join(session.current_dialogue)
+    )
+
+
+def parse_world_turn(
+    content: str, characters: List[CharacterInitializeRequest]
+) -> Optional[ActionResponse]:
+    """Validates the world turn answer, returns None if it is unusable."""
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        answer = json.loads(content[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(answer, dict) or not isinstance(answer.get("actions"), dict):
+        return None
+
+    chosen = answer.get("chosen")
+    if chosen is None:
+        if all(
+            str(action).strip().strip("`") == "silence"
+            for action in answer["actions"].values()
+        ):
+            return ActionResponse(
+                agent_id=-1, message="*The room became filled with silence*"
+            )
+        return None
+
+    character = next((c for c in characters if c.name == chosen), None)
+    message = answer["actions"].get(chosen)
+    if character is None or not isinstance(message, str):
+        return None
+    message = message.strip()
+    if not message or message.strip("`") == "silence":
+        return None
+    return ActionResponse(agent_id=character.agent_id, message=message)
+
+
+def world_turn(session: PlayerSession) -> Optional[ActionResponse]:
+    """Plays the NPCs and the narrator in a single LLM call, None if the answer is unusable."""
+    tier = router.tier("world_turn")
+    payload = {
+        "model": tier.model,
+        "messages": [{"role": "user", "content": build_world_turn_prompt(session)}],
+        "temperature": tier.temperature,
+        "stream": False,
+        "max_tokens": tier.max_tokens or 8000,
+    }
+
+    try:
+        data = request_completion(tier, "world turn", payload)
+        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.error(f"World turn LLM call failed: {e}")
+        WORLD_TURNS.labels("error").inc()
+        return None
+
+    result = parse_world_turn(content, session.characters)
+    if result is None:
+        logging.warning("World turn answer was invalid, querying the agents")
+        WORLD_TURNS.labels("invalid").inc()
+        return None
+
+    WORLD_TURNS.labels("ok").inc()
+    if result.agent_id != -1:
+        name = next(c.name for c in session.characters if c.agent_id == result.agent_id)
+        session.current_dialogue.append(f"{name}: {result.message}")
+    return result
+
+
+NPC_TICK_PROMPT = """You are running a role-playing game. Some time passed since anything happened in the location, and nobody spoke to its NPCs.
+
+These are the NPCs, each with the instructions of its character in an `npc` element carrying its name:
+{npcs}
+
+This is what recently happened in the location:
+{dialogue}
+
+Decide, for every NPC, whether it now does or says something on its own according to its instructions: a line it says, or `silence`. Most of the time NPCs stay silent, only act when it fits the character and the situation.
+Then, as the storyteller, pick the one NPC whose action will be performed.
+
+Answer with **ONLY** a JSON object of this form, and no other text:
+{{"actions": {{"<NPC name>": "<command>"}}, "chosen": "<NPC name>"}}
+If every NPC stays silent, set "chosen" to null."""
+
+# Recent lines of every player's dialogue shown to the NPCs on a tick.
+NPC_TICK_HISTORY = 10
+
+
+def build_npc_tick_prompt(sessions: List[PlayerSession]) -> str:
+    """Fills the tick prompt with the NPCs of the location and the players' recent dialogue."""
+    npcs = "\n".join(
+        f'<npc name="{character.name}">\n{character.init_prompt.strip()}\n</npc>'
+        for character in sessions[0].characters
+    )
+    dialogue = "\n".join(
+        line
+        for session in sessions
+        for line in session.current_dialogue[-NPC_TICK_HISTORY:]
+    )
+    return NPC_TICK_PROMPT.format(npcs=npcs, dialogue=dialogue or "Nothing yet.")
+
+
+def npc_tick(sessions: List[PlayerSession]) -> Optional[ActionResponse]:
+    """Asks whether an NPC acts on its own and records its action in every session, None if none does."""
+    tier = router.tier("npc_tick")
+    payload = {
+        "model": tier.model,
+        "messages": [{"role": "user", "content": build_npc_tick_prompt(sessions)}],
+        "temperature": tier.temperature,
+        "stream": False,
+        "max_tokens": tier.max_tokens or 8000,
+    }
+
+    try:
+        data = request_completion(tier, "npc tick", payload)
+        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logging.error(f"NPC tick LLM call failed: {e}")
+        NPC_TICKS.labels("error").inc()
+        raise HTTPException(status_code=502, detail="NPC tick LLM call failed")
+
+    result = parse_world_turn(content, sessions[0].characters)
+    if result is None:
+        NPC_TICKS.labels("invalid").inc()
+        return None
+    if result.agent_id == -1:
+        NPC_TICKS.labels("silence").inc()
+        return None
+
+    NPC_TICKS.labels("action").inc()
+    name = next(c.name for c in sessions[0].characters if c.agent_id == result.agent_id)
+    for session in sessions:
+        session.current_dialogue.append(f"{name}: {result.message}")
+    return result
+
+
+def send_message(session: PlayerSession) -> ActionResponse:
     """Sends the player's current dialogue to agents and evaluates the response."""
     url = "http://127.0.0.1:9080/send-message"
-    session = player_data.get(player_id)
-
-    if not session:
-        raise HTTPException(status_code=404, detail="Player session not found")
 
     payload = {
         "sender": "narrator",
@@ -204,7 +637,11 @@ def send_message(player_id: int) -> ActionResponse:
         "message": "\n".join(session.current_dialogue),
     }
     headers = {"Content-Type": "application/json"}
-    response = requests.post(url, headers=headers, json=payload)
+    with traced_request("POST", url) as outgoing:
+        response = requests.post(
+            url, headers={**headers, **outgoing.headers}, json=payload
+        )
+        outgoing.status = response.status_code
 
     logging.info("Received response from agents")
 
@@ -212,7 +649,7 @@ def send_message(player_id: int) -> ActionResponse:
         results = {
             k: v.get("text", "") for k, v in response.json().get("results", {}).items()
         }
-        return eval_function(player_id, results)
+        return eval_function(session, results)
     else:
         raise HTTPException(status_code=500, detail=f"Error: {response.text}")
 
@@ -0,0 +1,67 @@
+"""
+Runs several narrator workers, each its own process on its own port, to be sharded
+by player in the backend:
+    python narrator_workers.py --workers 4 --port 8101
+starts workers on the ports 8101 to 8104 and prints the NARRATOR_SHARDS value of the
+backend. Workers sharing the session store (SESSION_STORE=sqlite) keep the moved
+sessions when workers are added or removed.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="narrator processes"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", type=int, default=8101, help="port of the first worker"
+    )
+    args = parser.parse_args()
+
+    ports = range(args.port, args.port + args.workers)
+    workers = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "narrator:app",
+                "--host",
+                args.host,
+                "--port",
+                str(port),
+            ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        for port in ports
+    ]
+    print(
+        "NARRATOR_SHARDS=" + ",".join(f"http://{args.host}:{port}" for port in ports),
+        flush=True,
+    )
+
+    def stop(signum, frame):
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        # The workers got the interrupt too, wait for them to shut down.
+        for worker in workers:
+            worker.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Values larger than this many bytes of JSON are compressed.
+COMPRESS_THRESHOLD = 512
+
+
+def encode(value: dict) -> bytes:
+    """Serializes a value to compact JSON, compressed when large, behind a one byte format tag."""
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+    if len(data) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+
+def decode(blob: bytes) -> dict:
+    """Deserializes a value written by `encode`."""
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(data)
+
+
+class SessionStore(ABC):
+    """Session state by key, shared by the workers of a service when persistent."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        """Returns the value of a key, None if it has none."""
+
+    @abstractmethod
+    def put(self, key: str, value: dict):
+        """Sets the value of a key."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Removes a key, if present."""
+
+    def close(self):
+        """Writes what is pending and releases the store."""
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in a dict of the process, lost on restart and not shared between workers."""
+
+    def __init__(self):
+        self._values: Dict[str, dict] = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._values.get(key)
+
+    def put(self, key: str, value: dict):
+        self._values[key] = value
+
+    def delete(self, key: str):
+        self._values.pop(key, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite database in WAL mode, written behind in batches.
+
+    Writes are kept in memory and committed together every `flush_interval` seconds,
+    or as soon as `max_pending` are waiting. Reads see the pending writes of their
+    own process at once, those of other workers once flushed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        flush_interval: float = 0.05,
+        max_pending: int = 1000,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Values waiting to be written by key, None for a deletion.
+        self._pending: Dict[str, Optional[bytes]] = {}
+        # The batch being committed, still read from until it is.
+        self._flushing: Dict[str, Optional[bytes]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+        self._writer = threading.Thread(
+            target=self._write_behind, name="session-store-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        # The WAL keeps the database consistent, a crash only loses the last commits.
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            for writes in (self._pending, self._flushing):
+                if key in writes:
+                    blob = writes[key]
+                    return None if blob is None else decode(blob)
+        row = (
+            self._reader()
+            .execute(
+                "SELECT value FROM sessions WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+            .fetchone()
+        )
+        return None if row is None else decode(row[0])
+
+    def put(self, key: str, value: dict):
+        self._queue(key, encode(value))
+
+    def delete(self, key: str):
+        self._queue(key, None)
+
+    def _queue(self, key: str, blob: Optional[bytes]):
+        with self._lock:
+            self._pending[key] = blob
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Commits the pending writes in one transaction."""
+        # Only one flush at a time, so that batches are committed in order.
+        with self._flush_lock:
+            with self._lock:
+                pending = self._flushing = self._pending
+                self._pending = {}
+            if not pending:
+                return
+            db = self._reader()
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                db.executemany(
+                    "INSERT INTO sessions (namespace, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+                    [
+                        (self.namespace, key, blob)
+                        for key, blob in pending.items()
+                        if blob is not None
+                    ],
+                )
+                db.executemany(
+                    "DELETE FROM sessions WHERE namespace = ? AND key = ?",
+                    [
+                        (self.namespace, key)
+                        for key, blob in pending.items()
+                        if blob is None
+                    ],
+                )
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                with self._lock:
+                    # Keep the writes that failed, unless they were overwritten meanwhile.
+                    self._pending = {**pending, **self._pending}
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def _write_behind(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write the sessions to {self.path}: {e}")
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+
+
+def create_session_store(namespace: str) -> SessionStore:
+    """Creates the store chosen by `SESSION_STORE`: `memory` (default) or `sqlite` at `SESSION_STORE_PATH`."""
+    kind = os.getenv("SESSION_STORE", "memory")
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore(
+            os.getenv("SESSION_STORE_PATH", "sessions.db"),
+            namespace,
+            float(os.getenv("SESSION_STORE_FLUSH_MS", 50)) / 1000,
+        )
+    raise RuntimeError(f"Unknown SESSION_STORE {kind!r}, expected memory or sqlite")
@@ -0,0 +1,267 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from telemetry import TURN_ADMISSIONS, TURNS_IN_FLIGHT
+
+
+class TurnRejected(Exception):
+    """
+    A turn refused by admission control.
+
+    Attributes:
+        status_code (int): `429` when overloaded, `503` while the narrator circuit is open.
+        detail (str): Why the turn was refused.
+        retry_after (int): Seconds after which the client should try again.
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a cooldown, then lets a single probe call
+    through to decide whether to close again.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        cooldown (float): Seconds the circuit stays open before the probe.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def check(self):
+        """
+        Raises `TurnRejected` while the circuit is open or its probe is in flight.
+        """
+        if self.opened_at is None:
+            return
+        remaining = self.opened_at + self.cooldown - time.monotonic()
+        if remaining > 0 or self.probing:
+            raise TurnRejected(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "The narrator is failing, try again later",
+                max(1, math.ceil(remaining)),
+            )
+
+    def before_call(self) -> bool:
+        """
+        Raises `TurnRejected` unless a call may go through, the first call after the
+        cooldown becomes the probe.
+
+        Returns:
+            bool: True if the call is the probe, to be ended with `end_probe`.
+        """
+        self.check()
+        if self.opened_at is not None:
+            self.probing = True
+            return True
+        return False
+
+    def end_probe(self):
+        """
+        Ends a probe that recorded neither a success nor a failure, e.g. cancelled or
+        failed on a client error, so that the next call probes again.
+        """
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class Turn:
+    """
+    Player actions sent to the narrator together, and the future of their answer.
+    """
+
+    __slots__ = ("key", "actions", "future")
+
+    def __init__(self, key: int, future: asyncio.Future):
+        self.key = key
+        self.actions: List[str] = []
+        self.future = future
+
+
+class PlayerTurns:
+    """
+    The turns of a player waiting behind the one in flight.
+    """
+
+    __slots__ = ("queue", "run", "driver")
+
+    def __init__(self):
+        self.queue: Deque[Turn] = deque()
+        self.run: Dict[int, Callable[[str], Awaitable[dict]]] = {}
+        # The task running the turns, referenced so that it is not garbage collected.
+        self.driver: Optional[asyncio.Task] = None
+
+    @property
+    def queued_actions(self) -> int:
+        return sum(len(turn.actions) for turn in self.queue)
+
+
+class TurnAdmission:
+    """
+    Admission control of the player turns sent to the narrator.
+
+    A player has at most one turn in flight. Actions arriving meanwhile are
+    coalesced into the player's next turn, and their requests share its answer.
+    The number of players with turns in flight is bounded, and turns are refused
+    while the narrator circuit is open.
+
+    Args:
+        max_in_flight (int): Players whose turns may be in flight at once.
+        max_queued (int): Actions a player may have waiting behind its turn in flight.
+        breaker (CircuitBreaker): The narrator's circuit breaker.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, breaker: CircuitBreaker):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.breaker = breaker
+        self.players: Dict[int, PlayerTurns] = {}
+        # Moving average of the turn duration, for the Retry-After estimates.
+        self.turn_duration = 1.0
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.turn_duration))
+
+    async def submit(
+        self,
+        player_id: int,
+        key: int,
+        action: str,
+        run: Callable[[str], Awaitable[dict]],
+    ) -> dict:
+        """
+        Sends a player action to the narrator in the player's next turn.
+
+        Args:
+            player_id (int): The acting player.
+            key (int): Actions are only coalesced with actions of the same key, e.g.
+                the same narrator session.
+            action (str): The player action.
+            run (Callable[[str], Awaitable[dict]]): Sends the joined actions of a turn.
+
+        Returns:
+            dict: The answer to the turn the action was sent in.
+
+        Raises:
+            TurnRejected: When the turn is refused by admission control.
+        """
+        player = self.players.get(player_id)
+        if player is None:
+            if len(self.players) >= self.max_in_flight:
+                TURN_ADMISSIONS.labels("overloaded").inc()
+                raise TurnRejected(
+                    status.HTTP_429_TOO_MANY_REQUESTS,
+                    "Too many turns in flight",
+                    self.retry_after(),
+                )
+            self.breaker.check()
+            player = self.players[player_id] = PlayerTurns()
+            turn = self._enqueue(player, key, action, run)
+            # The turn is in flight from now on, later actions go to the next one.
+            player.queue.popleft()
+            TURNS_IN_FLIGHT.inc()
+            player.driver = asyncio.create_task(self._drive(player_id, player, turn))
+            TURN_ADMISSIONS.labels("admitted").inc()
+        else:
+            if player.queued_actions >= self.max_queued:
+                TURN_ADMISSIONS.labels("queue_full").inc()
+                raise TurnRejected(
+                    status.HTTP_429_TOO_MANY_REQUESTS,
+                    "Too many messages waiting for the previous turn",
+                    self.retry_after(),
+                )
+            turn = self._enqueue(player, key, action, run)
+            TURN_ADMISSIONS.labels("coalesced").inc()
+        # The turn goes on if this request is cancelled, other requests may wait for it.
+        return await asyncio.shield(turn.future)
+
+    def _enqueue(
+        self,
+        player: PlayerTurns,
+        key: int,
+        action: str,
+        run: Callable[[str], Awaitable[dict]],
+    ) -> Turn:
+        if not player.queue or player.queue[-1].key != key:
+            player.queue.append(Turn(key, asyncio.get_running_loop().create_future()))
+        turn = player.queue[-1]
+        turn.actions.append(action)
+        player.run[key] = run
+        return turn
+
+    async def _drive(self, player_id: int, player: PlayerTurns, turn: Turn):
+        """
+        Runs the turn of a player, then the ones queued meanwhile, until none is left.
+        """
+        try:
+            while turn is not None:
+                await self._run(player.run[turn.key], turn)
+                turn = player.queue.popleft() if player.queue else None
+        finally:
+            del self.players[player_id]
+            TURNS_IN_FLIGHT.dec()
+
+    async def _run(self, run: Callable[[str], Awaitable[dict]], turn: Turn):
+        """
+        Sends a turn to the narrator through the circuit breaker, and answers its
+        waiters.
+        """
+        start = time.monotonic()
+        try:
+            probe = self.breaker.before_call()
+        except TurnRejected as e:
+            turn.future.set_exception(e)
+            return
+        try:
+            result = await run("\n".join(turn.actions))
+        except Exception as e:
+            # Client errors are the request's fault, not the narrator's.
+            if not isinstance(e, HTTPException) or e.status_code >= 500:
+                self.breaker.record_failure()
+            turn.future.set_exception(e)
+        else:
+            self.breaker.record_success()
+            self.turn_duration = 0.8 * self.turn_duration + 0.2 * (
+                time.monotonic() - start
+            )
+            turn.future.set_result(result)
+        finally:
+            # Also when cancelled, which is no `Exception`, so that the breaker
+            # does not stay half-open with no probe in flight.
+            if probe:
+                self.breaker.end_probe()
+            if not turn.future.done():
+                turn.future.cancel()
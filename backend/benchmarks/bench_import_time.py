@@ -0,0 +1,58 @@
+"""
+Measures the cold import time of the backend app and checks it against a budget.
+
+Every run imports `main` in a fresh interpreter with the blockchain node and the
+narrator pointed at unreachable addresses, so the result does not depend on
+external services. Exits with status 1 when the median is over the budget.
+
+Run from the `backend` directory:
+    python benchmarks/bench_import_time.py --budget 3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        HARDHAT_URL="http://127.0.0.1:9",
+        API_BASE_URL="http://127.0.0.1:9",
+    )
+    timings = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=BACKEND_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+
+    median = statistics.median(timings)
+    print(f"import main: median {median:.3f} s, max {max(timings):.3f} s")
+    if median > args.budget:
+        print(f"over budget of {args.budget:.3f} s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
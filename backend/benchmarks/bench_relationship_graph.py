@@ -0,0 +1,58 @@
+"""
+Benchmarks for the in-memory relationship graph on a synthetic 1M edge graph.
+
+Run from the `backend` directory:
+    python benchmarks/bench_relationship_graph.py --agents 100000 --edges 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from relationship_graph import RelationshipGraph  # noqa: E402
+
+
+def timed(label, func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<32} {elapsed * 1000:>10.3f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--agents", type=int, default=100_000)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sources = rng.integers(1, args.agents + 1, args.edges)
+    destinations = rng.integers(1, args.agents + 1, args.edges)
+    starts = rng.integers(1, args.agents + 1, args.queries)
+    print(f"{args.agents} agents, {args.edges} edges, {args.queries} queries each\n")
+
+    graph = timed("build", lambda: RelationshipGraph.from_edges(sources, destinations))
+    queries = iter(np.tile(starts, 3))
+    timed("neighbors", lambda: graph.neighbors(int(next(queries))), args.queries)
+    timed("k_hop (k=2)", lambda: graph.k_hop(int(next(queries)), 2), args.queries)
+    reached = timed(
+        "k_hop (k=3)", lambda: graph.k_hop(int(next(queries)), 3), args.queries
+    )
+    print(f"{'  agents reached at k=3':<32} {len(reached):>10}")
+    timed("bfs (full)", lambda: graph.bfs(int(starts[0])), 5)
+
+    new_edges = iter(rng.integers(1, args.agents + 1, (1000, 2)))
+    timed("add_edge", lambda: graph.add_edge(*map(int, next(new_edges))), 1000)
+    timed("k_hop (k=3) with pending edges", lambda: graph.k_hop(int(starts[0]), 3), 20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmarks of the response serialization of the list endpoints.
+
+Fills a temporary SQLite database with `--rows` agents, relationships and events,
+then compares for each table:
+- `orm`: the previous path, ORM objects validated through the `response_model`
+  and encoded with the standard JSON encoder
+- `json`: the columns read into plain dicts and encoded with orjson
+- `msgpack`: the same dicts encoded with MessagePack, when it is installed
+
+first in process, then through the endpoints with the HTTP test client:
+    python benchmarks/bench_serialization.py --rows 10000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Settings are read on import, so the environment is set up first.
+WORKDIR = tempfile.mkdtemp(prefix="bench-serialization-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}",
+    LEDGER_BACKEND="memory",
+    API_BASE_URL="http://127.0.0.1:9",
+)
+
+from fastapi import Depends  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import main  # noqa: E402
+from database import SessionLocal, get_db, run_migrations  # noqa: E402
+from models import Agent, Event, Location, Player, Relationship  # noqa: E402
+from schemas import AgentSchema, EventSchema, RelationshipSchema  # noqa: E402
+from serialization import MsgpackResponse, msgpack, select_rows  # noqa: E402
+
+TEXT = "A weathered soul who has seen many winters and tells long stories about them. "
+TABLES = [
+    ("agents", AgentSchema, Agent),
+    ("relationships", RelationshipSchema, Relationship),
+    ("events", EventSchema, Event),
+]
+
+
+def generate(rows, rng):
+    """Fills the database with `rows` agents, relationships and events."""
+    run_migrations()
+    db = SessionLocal()
+    try:
+        db.execute(insert(Location), [{"id": 0, "name": "Location 0"}])
+        db.execute(
+            insert(Player),
+            [
+                {
+                    "id": 1,
+                    "bc_address": "0x" + "42" * 20,
+                    "name": "Bench",
+                    "race": "Elf",
+                    "level": 7,
+                }
+            ],
+        )
+        db.execute(
+            insert(Agent),
+            [
+                {
+                    "id": i,
+                    "location_id": 0,
+                    "name": f"NPC {i}",
+                    "personality": TEXT,
+                    "background": TEXT * 2,
+                }
+                for i in range(rows)
+            ],
+        )
+        db.execute(
+            insert(Relationship),
+            [
+                {
+                    "agent_source": rng.randrange(rows),
+                    "agent_destination": rng.randrange(rows),
+                    "description": "old friends",
+                }
+                for _ in range(rows)
+            ],
+        )
+        db.execute(
+            insert(Event),
+            [
+                {
+                    "player_id": 1,
+                    "location_id": rng.choice([None, 0]),
+                    "description": f"Event {i}: {TEXT}",
+                }
+                for i in range(rows)
+            ],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def orm_route(model):
+    def route(db: Session = Depends(get_db)):
+        return db.query(model).all()
+
+    return route
+
+
+def add_orm_routes(app):
+    """Serves every table the previous way, under `/bench/orm`."""
+    for name, schema, model in TABLES:
+        app.get(
+            f"/bench/orm/{name}",
+            response_model=List[schema],
+            response_class=JSONResponse,
+        )(orm_route(model))
+
+
+def orm_body(schema, model):
+    db = SessionLocal()
+    try:
+        adapter = TypeAdapter(List[schema])
+        rows = adapter.validate_python(db.query(model).all(), from_attributes=True)
+        return JSONResponse(adapter.dump_python(rows, mode="json")).body
+    finally:
+        db.close()
+
+
+def column_body(schema, model, response_class):
+    db = SessionLocal()
+    try:
+        return response_class(select_rows(db, schema, model)).body
+    finally:
+        db.close()
+
+
+def measure(func, min_runs, min_time):
+    """Median seconds of `func`, run at least `min_runs` times and `min_time` seconds."""
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def report(label, results):
+    baseline = results["orm"][0]
+    for path, (seconds, size) in results.items():
+        print(
+            f"{label:<28} {path:<8} {seconds * 1000:>10.3f} ms {baseline / seconds:>7.2f}x"
+            f" {size:>10} B"
+        )
+
+
+def main_():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=10000, help="rows of every table")
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument(
+        "--min-time", type=float, default=1.0, help="seconds per benchmark"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.rows, random.Random(args.seed))
+    add_orm_routes(main.app)
+    client = TestClient(main.app)
+    if msgpack is None:
+        print("msgpack is not installed, only JSON is compared")
+    print(f"{args.rows} rows per table\n")
+
+    for name, schema, model in TABLES:
+        paths = {
+            "orm": lambda: orm_body(schema, model),
+            "json": lambda: column_body(schema, model, ORJSONResponse),
+        }
+        if msgpack is not None:
+            paths["msgpack"] = lambda: column_body(schema, model, MsgpackResponse)
+        results = {}
+        for path, func in paths.items():
+            seconds, body = measure(func, args.min_runs, args.min_time)
+            results[path] = (seconds, len(body))
+        report(f"in process /{name}", results)
+
+    for name, _, _ in TABLES:
+        requests = {
+            "orm": (f"/bench/orm/{name}", {}),
+            "json": (f"/{name}", {}),
+        }
+        if msgpack is not None:
+            requests["msgpack"] = (f"/{name}", {"Accept": "application/msgpack"})
+        results = {}
+        for path, (url, headers) in requests.items():
+            seconds, response = measure(
+                lambda: client.get(url, headers=headers), args.min_runs, args.min_time
+            )
+            results[path] = (seconds, len(response.content))
+        report(f"GET /{name}", results)
+
+
+if __name__ == "__main__":
+    try:
+        main_()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
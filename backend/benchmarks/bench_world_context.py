@@ -0,0 +1,375 @@
+"""
+Microbenchmarks of the CPU and database work on the player's hot path.
+
+Generates a synthetic world in a temporary SQLite database, with one location per
+size in `--agents`, a player with a long event history, gossip knowledge and
+relationships, then times:
+- `build_location_context`, the query and schema conversion part of `/enterLocation`
+- `generate_agent_initialization_prompt` for growing event histories
+- `generate_narrator_prompt` for growing numbers of nearby NPCs
+- `build_eval_prompt`, the narrator's prompt assembly in `eval_function`
+
+The chain is replaced by the in-memory ledger and no LLM or narrator is called.
+Results are written as JSON, and compared against an earlier run with `--compare`:
+    python benchmarks/bench_world_context.py --output before.json
+    python benchmarks/bench_world_context.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENTS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "agents")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, AGENTS_DIR)
+
+# Settings are read on import, so the environment is set up first.
+WORKDIR = tempfile.mkdtemp(prefix="bench-world-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(WORKDIR, 'world.db')}",
+    LEDGER_BACKEND="memory",
+    API_BASE_URL="http://127.0.0.1:9",
+    LLM_API_TOKEN="bench",
+    LLM_URL="http://127.0.0.1:9",
+    LLM_MODEL="bench",
+)
+
+from sqlalchemy import insert  # noqa: E402
+
+import main  # noqa: E402
+import narrator  # noqa: E402
+from database import SessionLocal, run_migrations  # noqa: E402
+from ledger import get_ledger  # noqa: E402
+from lib.prompt_util import (  # noqa: E402
+    generate_agent_initialization_prompt,
+    generate_narrator_prompt,
+)
+from models import (  # noqa: E402
+    Agent,
+    AgentKnowledge,
+    Event,
+    Location,
+    Player,
+    Relationship,
+)
+from schemas import (  # noqa: E402
+    AgentSchema,
+    EventSchema,
+    LocationSchema,
+    PlayerSchema,
+    RelationshipDescriptor,
+)
+
+PLAYER_ID = 1
+PLAYER_ADDRESS = "0x" + "42" * 20
+TEXT = "A weathered soul who has seen many winters and tells long stories about them. "
+
+
+def generate_world(sizes, events, relationships, heard, items, rng):
+    """Fills the database with one location per size, the player and its history."""
+    run_migrations()
+    db = SessionLocal()
+    try:
+        db.execute(
+            insert(Player),
+            [
+                {
+                    "id": PLAYER_ID,
+                    "bc_address": PLAYER_ADDRESS,
+                    "name": "Bench",
+                    "race": "Elf",
+                    "level": 7,
+                }
+            ],
+        )
+        db.execute(
+            insert(Location),
+            [{"id": i, "name": f"Location {i}"} for i in range(len(sizes))],
+        )
+
+        agents, edges, next_agent = [], [], 0
+        for location_id, size in enumerate(sizes):
+            ids = list(range(next_agent, next_agent + size))
+            next_agent += size
+            agents += [
+                {
+                    "id": agent_id,
+                    "location_id": location_id,
+                    "name": f"NPC {agent_id}",
+                    "personality": TEXT,
+                    "background": TEXT * 2,
+                }
+                for agent_id in ids
+            ]
+            for agent_id in ids:
+                for destination in rng.sample(ids, min(relationships, size)):
+                    edges.append(
+                        {
+                            "agent_source": agent_id,
+                            "agent_destination": destination,
+                            "description": "old friends",
+                        }
+                    )
+        db.execute(insert(Agent), agents)
+        db.execute(insert(Relationship), edges)
+
+        # Half of the history is public, the rest happened in one of the locations.
+        db.execute(
+            insert(Event),
+            [
+                {
+                    "id": event_id,
+                    "player_id": PLAYER_ID,
+                    "location_id": None if event_id % 2 else event_id % len(sizes),
+                    "description": f"Event {event_id}: the player helped a stranger",
+                }
+                for event_id in range(events)
+            ],
+        )
+        located = list(range(0, events, 2))
+        db.execute(
+            insert(AgentKnowledge),
+            [
+                {
+                    "agent_id": agent["id"],
+                    "event_id": event_id,
+                    "hops": 1,
+                    "strength": 0.5,
+                }
+                for agent in agents
+                for event_id in rng.sample(located, min(heard, len(located)))
+            ],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    ledger = get_ledger()
+    ledger.create_player(PLAYER_ADDRESS, 100)
+    for i in range(items):
+        ledger.give_item(PLAYER_ADDRESS, f"item {i}")
+
+
+def measure(func, min_runs, min_time):
+    """Runs `func` at least `min_runs` times and for at least `min_time` seconds."""
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "runs": len(timings),
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "mean_s": statistics.mean(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def location_context(location_id):
+    db = SessionLocal()
+    try:
+        main.build_location_context(db, location_id, PLAYER_ID)
+    finally:
+        db.close()
+
+
+def benchmarks(sizes, histories, relationships):
+    """Yields `(name, func)` pairs of every benchmark."""
+    for location_id, size in enumerate(sizes):
+        yield (
+            f"build_location_context[agents={size}]",
+            lambda location_id=location_id: location_context(location_id),
+        )
+
+    location = LocationSchema(id=0, name="Location 0")
+    agent = AgentSchema(
+        id=0, location_id=0, name="NPC 0", personality=TEXT, background=TEXT * 2
+    )
+    player = PlayerSchema(
+        id=PLAYER_ID, bc_address=PLAYER_ADDRESS, name="Bench", race="Elf", level=7
+    )
+    relations = [
+        RelationshipDescriptor(
+            destination_character_name=f"NPC {i}", relation_description="old friends"
+        )
+        for i in range(relationships)
+    ]
+    for count in histories:
+        events = [
+            EventSchema(id=i, player_id=PLAYER_ID, description=f"Event {i}: {TEXT}")
+            for i in range(count)
+        ]
+        yield (
+            f"generate_agent_initialization_prompt[events={count}]",
+            lambda events=events: generate_agent_initialization_prompt(
+                location, agent, relations, player, events
+            ),
+        )
+
+    for size in sizes:
+        npcs = [f"NPC {i};{TEXT};{TEXT * 2}" for i in range(size)]
+        yield (
+            f"generate_narrator_prompt[agents={size}]",
+            lambda npcs=npcs: generate_narrator_prompt("Location 0", npcs, str(player)),
+        )
+
+    for size in sizes:
+        session = narrator.PlayerSession(
+            PLAYER_ID,
+            generate_narrator_prompt(
+                "Location 0", [f"NPC {i};{TEXT}" for i in range(size)], str(player)
+            ),
+            [],
+        )
+        session.current_dialogue = [f"Player: line {i} {TEXT}" for i in range(200)]
+        actions = [f"NPC {i}: {TEXT}" for i in range(size)]
+        yield (
+            f"build_eval_prompt[agents={size}]",
+            lambda session=session, actions=actions: narrator.build_eval_prompt(
+                session, actions
+            ),
+        )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Prints the change of every benchmark against a baseline, returns the regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared to {baseline_path} ({baseline['meta'].get('commit')}):")
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<56} {'new':>10}")
+            continue
+        ratio = result["median_s"] / before["median_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<56} {ratio:>9.2f}x{flag}")
+    return regressions
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(",")]
+
+
+def main_():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--agents",
+        type=parse_sizes,
+        default=[10, 100, 1000, 10000],
+        help="comma separated agents per location",
+    )
+    parser.add_argument(
+        "--histories",
+        type=parse_sizes,
+        default=[10, 1000, 10000],
+        help="comma separated event history lengths for the agent prompt",
+    )
+    parser.add_argument(
+        "--events", type=int, default=1000, help="events of the player in the database"
+    )
+    parser.add_argument(
+        "--relationships", type=int, default=3, help="relationships per agent"
+    )
+    parser.add_argument(
+        "--heard", type=int, default=5, help="gossip events known per agent"
+    )
+    parser.add_argument("--items", type=int, default=20, help="items of the player")
+    parser.add_argument("--min-runs", type=int, default=3)
+    parser.add_argument(
+        "--min-time", type=float, default=1.0, help="seconds per benchmark"
+    )
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks containing this text"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument(
+        "--compare", help="JSON results of an earlier run to compare with"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate_world(
+        args.agents,
+        args.events,
+        args.relationships,
+        args.heard,
+        args.items,
+        random.Random(args.seed),
+    )
+    print(f"Generated the world in {time.perf_counter() - start:.1f} s\n")
+
+    results = {}
+    for name, func in benchmarks(args.agents, args.histories, args.relationships):
+        if args.filter not in name:
+            continue
+        results[name] = measure(func, args.min_runs, args.min_time)
+        print(
+            f"{name:<56} {results[name]['median_s'] * 1000:>10.3f} ms  ({results[name]['runs']} runs)"
+        )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("output", "compare")
+            },
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main_()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
@@ -1,35 +1,135 @@
 import json
+import os
+import threading
 from functools import lru_cache
+from typing import List, Tuple
 
-from eth_account import Account
-from web3 import Web3
-from web3.middleware import SignAndSendRawMiddlewareBuilder
+from eth_utils import to_checksum_address
 
+import chain_index
 from game_settings import settings
+from telemetry import traced_chain_call
+from view_cache import MISSING, ViewCache
+
+CONTRACT_ABI_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "contracts",
+    "artifacts",
+    "contracts",
+    "Immersive.sol",
+    "Immersive.json",
+)
+
+# Nothing here touches the ABI file or the node at import time. The connection and
+# contract are created on first use, so importing this module stays cheap and works
+# while the node is down.
+
+
+@lru_cache(maxsize=None)
+def get_contract_abi() -> list:
+    """
+    Loads the ABI of the `Immersive` contract from the Hardhat artifacts.
+
+    Returns:
+        The contract ABI.
+    """
+    with open(CONTRACT_ABI_PATH) as f:
+        return json.load(f)["abi"]
+
+
+@lru_cache(maxsize=None)
+def get_w3() -> "Web3":
+    """
+    Creates the web3 connection that signs transactions with the backend account.
+
+    Returns:
+        The web3 instance.
+    """
+    # web3 and eth_account take over a second to import, so they are only
+    # imported once the chain is actually used.
+    from eth_account import Account
+    from web3 import Web3
+    from web3.middleware import SignAndSendRawMiddlewareBuilder
+
+    w3 = Web3(Web3.HTTPProvider(settings.HARDHAT_URL))
+    acct = Account.from_key(settings.PRIVATE_KEY)
+    w3.middleware_onion.inject(SignAndSendRawMiddlewareBuilder.build(acct), layer=0)
+    w3.eth.default_account = acct.address
+    return w3
+
+
+@lru_cache(maxsize=None)
+def get_contract():
+    """
+    Creates the interface of the deployed `Immersive` contract.
+
+    Returns:
+        The contract interface bound to `get_w3()`.
+    """
+    return get_w3().eth.contract(
+        address=settings.CONTRACT_ADDRESS, abi=get_contract_abi()
+    )
+
+
+@lru_cache(maxsize=None)
+def get_batch_contract():
+    """
+    Creates a contract interface on its own provider for batched reads. Batching
+    switches the whole provider into batch mode, so batches are built on this one
+    under `batch_lock`, leaving `get_w3()` free for concurrent calls.
 
-CONTRACT_ABI = None
+    Returns:
+        The contract interface bound to a dedicated web3 instance.
+    """
+    from web3 import Web3
 
-with open("../contracts/artifacts/contracts/Immersive.sol/Immersive.json") as f:
-    CONTRACT_ABI = json.load(f)["abi"]
+    batch_w3 = Web3(Web3.HTTPProvider(settings.HARDHAT_URL))
+    return batch_w3.eth.contract(
+        address=settings.CONTRACT_ADDRESS, abi=get_contract_abi()
+    )
 
-w3 = Web3(Web3.HTTPProvider(settings.HARDHAT_URL))
-if w3.is_connected():
-    print("-" * 50)
-    print("Blockchain Connection Successful")
-    print("-" * 50)
-else:
-    print("Blockchain Connection Failed")
-    exit(-1)
 
-acct = Account.from_key(settings.PRIVATE_KEY)
-w3.middleware_onion.inject(SignAndSendRawMiddlewareBuilder.build(acct), layer=0)
-w3.eth.default_account = acct.address
+batch_lock = threading.Lock()
 
-contract_interface = w3.eth.contract(
-    address=settings.CONTRACT_ADDRESS, abi=CONTRACT_ABI
+view_cache = ViewCache(
+    lambda: get_w3().eth.block_number, settings.VIEW_CACHE_POLL_INTERVAL
 )
 
 
+@traced_chain_call
+def blockchain_is_connected() -> bool:
+    """
+    Checks whether the blockchain node is reachable.
+
+    Returns:
+        True if the node answers.
+    """
+    return get_w3().is_connected()
+
+
+def cached_view(function: str, *args):
+    """
+    Calls a view function of the smart contract through the block-keyed view cache.
+
+    Args:
+        function (str): The name of the view function.
+        *args: The call arguments.
+
+    Returns:
+        The result of the call at the block of the current cache epoch.
+    """
+    block = view_cache.block_number()
+    value = view_cache.get(function, args, block)
+    if value is MISSING:
+        value = getattr(get_contract().functions, function)(*args).call(
+            block_identifier=block
+        )
+        view_cache.put(function, args, block, value)
+    return value
+
+
+@traced_chain_call
 def blockchain_create_player(address: str, initialMoney: int):
     """
     Creates a new player on the blockchain by invoking the `createPlayer` function
@@ -42,9 +142,12 @@ def blockchain_create_player(address: str, initialMoney: int):
     Returns:
         Transaction hash of the smart contract interaction.
     """
-    return contract_interface.functions.createPlayer(address, initialMoney).transact()
+    tx_hash = get_contract().functions.createPlayer(address, initialMoney).transact()
+    view_cache.invalidate(addresses=[to_checksum_address(address)])
+    return tx_hash
 
 
+@traced_chain_call
 def blockchain_give_item(address: str, itemdata: str):
     """
     Assigns an item to the specified player by invoking the `giveItem` function
@@ -57,9 +160,14 @@ def blockchain_give_item(address: str, itemdata: str):
     Returns:
         Transaction hash of the smart contract interaction.
     """
-    return contract_interface.functions.giveItem(address, itemdata).transact()
+    tx_hash = get_contract().functions.giveItem(address, itemdata).transact()
+    view_cache.invalidate(
+        functions=["getItems"], addresses=[to_checksum_address(address)]
+    )
+    return tx_hash
 
 
+@traced_chain_call
 def blockchain_destroy_item(itemId: int):
     """
     Destroys an item by invoking the `destroyItem` function of the smart contract.
@@ -70,9 +178,13 @@ def blockchain_destroy_item(itemId: int):
     Returns:
         Transaction hash of the smart contract interaction.
     """
-    return contract_interface.functions.destroyItem(itemId).transact()
+    tx_hash = get_contract().functions.destroyItem(itemId).transact()
+    # The owner of the item is not known here, so every cached read may be affected.
+    view_cache.clear()
+    return tx_hash
 
 
+@traced_chain_call
 def blockchain_give_money(address: str, amount: int):
     """
     Transfers money to the specified player by invoking the `giveMoney` function
@@ -85,9 +197,12 @@ def blockchain_give_money(address: str, amount: int):
     Returns:
         Transaction hash of the smart contract interaction.
     """
-    return contract_interface.functions.giveMoney(address, amount).transact()
+    tx_hash = get_contract().functions.giveMoney(address, amount).transact()
+    view_cache.invalidate(addresses=[to_checksum_address(address)])
+    return tx_hash
 
 
+@traced_chain_call
 def blockchain_take_money(address: str, amount: int):
     """
     Takes money from the specified player by invoking the `takeMoney` function
@@ -100,9 +215,12 @@ def blockchain_take_money(address: str, amount: int):
     Returns:
         Transaction hash of the smart contract interaction.
     """
-    return contract_interface.functions.takeMoney(address, amount).transact()
+    tx_hash = get_contract().functions.takeMoney(address, amount).transact()
+    view_cache.invalidate(addresses=[to_checksum_address(address)])
+    return tx_hash
 
 
+@traced_chain_call
 def blockchain_get_item(itemId: int):
     """
     Retrieves information about a specific item by invoking the `getItem` function
@@ -114,9 +232,12 @@ def blockchain_get_item(itemId: int):
     Returns:
         The data associated with the item.
     """
-    return contract_interface.functions.getItem(itemId).call()
+    if settings.CHAIN_READ_SOURCE == "index":
+        return chain_index.index_get_item(itemId)
+    return cached_view("getItem", itemId)
 
 
+@traced_chain_call
 def blockchain_get_items():
     """
     Retrieves a list of all items available on the blockchain by invoking the `getItems`
@@ -125,9 +246,12 @@ def blockchain_get_items():
     Returns:
         A list of all items.
     """
-    return contract_interface.functions.getItems().call()
+    if settings.CHAIN_READ_SOURCE == "index":
+        return chain_index.index_get_items()
+    return cached_view("getItems")
 
 
+@traced_chain_call
 def blockchain_get_player_data(address: str):
     """
     Retrieves data for a specific player by invoking the `getPlayerData` function
@@ -139,11 +263,12 @@ def blockchain_get_player_data(address: str):
     Returns:
         The player data.
     """
-    return contract_interface.functions.getPlayerData(
-        w3.to_checksum_address(address)
-    ).call()
+    if settings.CHAIN_READ_SOURCE == "index":
+        return chain_index.index_get_player_data(to_checksum_address(address))
+    return cached_view("getPlayerData", to_checksum_address(address))
 
 
+@traced_chain_call
 def blockchain_get_player_item_ids(address: str):
     """
     Retrieves a list of item IDs that belong to a specific player by invoking the `getPlayerItemIds`
@@ -155,11 +280,12 @@ def blockchain_get_player_item_ids(address: str):
     Returns:
         A list of item IDs owned by the player.
     """
-    return contract_interface.functions.getPlayerItemIds(
-        w3.to_checksum_address(address)
-    ).call()
+    if settings.CHAIN_READ_SOURCE == "index":
+        return chain_index.index_get_player_item_ids(to_checksum_address(address))
+    return cached_view("getPlayerItemIds", to_checksum_address(address))
 
 
+@traced_chain_call
 def blockchain_get_player_items(address: str):
     """
     Retrieves a list of items owned by a specific player, combining information from
@@ -171,6 +297,59 @@ def blockchain_get_player_items(address: str):
     Returns:
         A list of tuples containing item IDs and item data for the player's items.
     """
+    if settings.CHAIN_READ_SOURCE == "index":
+        return chain_index.index_get_player_items(to_checksum_address(address))
     items = blockchain_get_items()
     item_ids = blockchain_get_player_item_ids(address)
     return [(i, items[i][0]) for i in item_ids]
+
+
+@traced_chain_call
+def blockchain_get_player_profiles(addresses: List[str]) -> List[Tuple[tuple, list]]:
+    """
+    Retrieves the data and items of many players, reading everything that is not in
+    the view cache with a single JSON-RPC batch request instead of three calls per player.
+
+    Args:
+        addresses (List[str]): The blockchain addresses of the players.
+
+    Returns:
+        A list with a `(player_data, items)` tuple per address, in the same order, where
+        `items` is a list of tuples containing item IDs and item data.
+    """
+    if not addresses:
+        return []
+    addresses = [to_checksum_address(address) for address in addresses]
+    if settings.CHAIN_READ_SOURCE == "index":
+        return chain_index.index_get_player_profiles(addresses)
+    block = view_cache.block_number()
+    reads = [("getItems", ())] + [
+        (function, (address,))
+        for address in dict.fromkeys(addresses)
+        for function in ("getPlayerData", "getPlayerItemIds")
+    ]
+    results = {read: view_cache.get(*read, block) for read in reads}
+    misses = [read for read in reads if results[read] is MISSING]
+
+    if misses:
+        batch_contract = get_batch_contract()
+        functions = batch_contract.functions
+        with batch_lock:
+            with batch_contract.w3.batch_requests() as batch:
+                for function, args in misses:
+                    batch.add(
+                        getattr(functions, function)(*args).call(block_identifier=block)
+                    )
+                values = batch.execute()
+        for read, value in zip(misses, values):
+            results[read] = value
+            view_cache.put(*read, block, value)
+
+    items = results[("getItems", ())]
+    return [
+        (
+            results[("getPlayerData", (address,))],
+            [(i, items[i][0]) for i in results[("getPlayerItemIds", (address,))]],
+        )
+        for address in addresses
+    ]
@@ -0,0 +1,125 @@
+from typing import Dict, List, Tuple
+
+from database import SessionLocal
+from models import ChainItem, ChainPlayer
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# Reads from the tables the log indexer materializes. They return the same shapes
+# as the contract view functions, so they can stand in for the RPC reads in
+# `blockchain.py`. The data is as fresh as the last block the indexer applied.
+
+
+def index_get_item(itemId: int):
+    """
+    Retrieves a specific item from the index.
+
+    Args:
+        itemId (int): The ID of the item to retrieve.
+
+    Returns:
+        The item as a `(data, owner)` tuple.
+    """
+    db = SessionLocal()
+    try:
+        item = db.get(ChainItem, itemId)
+        if item is None:
+            raise IndexError(f"Item {itemId} does not exist")
+        return (item.data, item.owner)
+    finally:
+        db.close()
+
+
+def index_get_items():
+    """
+    Retrieves every item from the index, destroyed ones included, ordered by ID.
+
+    Returns:
+        A list of `(data, owner)` tuples.
+    """
+    db = SessionLocal()
+    try:
+        return [
+            (data, owner)
+            for data, owner in db.query(ChainItem.data, ChainItem.owner).order_by(
+                ChainItem.id
+            )
+        ]
+    finally:
+        db.close()
+
+
+def index_get_player_data(address: str):
+    """
+    Retrieves a player's balance and number of owned items from the index.
+
+    Args:
+        address (str): The checksummed blockchain address of the player.
+
+    Returns:
+        A `(money, owned_items_num)` tuple, zeros for unknown players.
+    """
+    db = SessionLocal()
+    try:
+        player = db.get(ChainPlayer, address)
+        if player is None:
+            return (0, 0)
+        return (player.money, player.owned_items_num)
+    finally:
+        db.close()
+
+
+def index_get_player_items(address: str) -> List[Tuple[int, str]]:
+    """
+    Retrieves the items owned by a player from the index.
+
+    Args:
+        address (str): The checksummed blockchain address of the player.
+
+    Returns:
+        A list of tuples containing item IDs and item data.
+    """
+    return index_get_player_profiles([address])[0][1]
+
+
+def index_get_player_item_ids(address: str) -> List[int]:
+    """
+    Retrieves the IDs of the items owned by a player from the index.
+
+    Args:
+        address (str): The checksummed blockchain address of the player.
+
+    Returns:
+        A list of item IDs.
+    """
+    return [item_id for item_id, _ in index_get_player_items(address)]
+
+
+def index_get_player_profiles(addresses: List[str]) -> List[Tuple[tuple, list]]:
+    """
+    Retrieves the data and items of many players with two queries.
+
+    Args:
+        addresses (List[str]): The checksummed blockchain addresses of the players.
+
+    Returns:
+        A list with a `(player_data, items)` tuple per address, in the same order.
+    """
+    db = SessionLocal()
+    try:
+        players = {
+            player.address: (player.money, player.owned_items_num)
+            for player in db.query(ChainPlayer).filter(
+                ChainPlayer.address.in_(addresses)
+            )
+        }
+        items: Dict[str, List[Tuple[int, str]]] = {address: [] for address in addresses}
+        for item_id, owner, data in (
+            db.query(ChainItem.id, ChainItem.owner, ChainItem.data)
+            .filter(ChainItem.owner.in_(addresses), ChainItem.destroyed.is_(False))
+            .order_by(ChainItem.id)
+        ):
+            items[owner].append((item_id, data))
+    finally:
+        db.close()
+    return [(players.get(address, (0, 0)), items[address]) for address in addresses]
@@ -0,0 +1,78 @@
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from game_settings import settings
+from telemetry import instrument_engine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-connection SQLite tuning. `journal_mode=WAL` is persistent in the database
+# file and is switched on by the `0002` migration, the rest must be set on
+# every new connection.
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+    "mmap_size": 134217728,
+}
+
+engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+# A plain sessionmaker, every caller owns and closes its session. FastAPI runs the
+# `get_db` dependency and the endpoint on any threadpool worker, so thread-local
+# sessions ended up shared between concurrent requests.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_engine(engine)
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Apply the tuned pragmas to every new SQLite connection.
+
+    @param dbapi_connection: The raw DB-API connection.
+    @type dbapi_connection: sqlite3.Connection
+
+    @returns: None
+    @rtype: None
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def get_db():
+    """
+    Dependency function to get the database session.
+
+    @returns: Yields the database session.
+    @rtype: Session
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def run_migrations(revision: str = "head"):
+    """
+    Upgrade the database schema to the given Alembic revision.
+
+    @param revision: The target revision, `head` by default.
+    @type revision: str
+
+    @returns: None
+    @rtype: None
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BASE_DIR, "migrations"))
+    command.upgrade(config, revision)
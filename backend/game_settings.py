@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import os
 
@@ -7,12 +7,65 @@ load_dotenv()
 
 class GameSettings(BaseModel):
     API_BASE_URL: str = os.getenv("API_BASE_URL", "https://default.api.com")
+    # Base URLs of the narrator workers, sharing the sessions by player. Empty for
+    # the single narrator at API_BASE_URL.
+    NARRATOR_SHARDS: list[str] = [
+        url for url in os.getenv("NARRATOR_SHARDS", "").split(",") if url
+    ]
     TIMEOUT: int = int(os.getenv("TIMEOUT", 60))
     CORS_ORIGINS: list[str] = os.getenv("CORS_ORIGINS", "http://localhost").split(",")
     HARDHAT_URL: str = os.getenv("HARDHAT_URL", "n9xnx9873x1n210981nxnx098")
     CONTRACT_ADDRESS: str = os.getenv("CONTRACT_ADDRESS", "80543534378hfddshi")
-    PRIVATE_KEY: str = os.getenv("PRIVATE_KEY", "7849127421dshadhisadhisasadhsai")
+    PRIVATE_KEY: str = Field(
+        os.getenv("PRIVATE_KEY", "7849127421dshadhisadhisasadhsai"), repr=False
+    )
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+    LEDGER_BACKEND: str = os.getenv("LEDGER_BACKEND", "web3")
+    VIEW_CACHE_POLL_INTERVAL: float = float(os.getenv("VIEW_CACHE_POLL_INTERVAL", 1))
+    CHAIN_READ_SOURCE: str = os.getenv("CHAIN_READ_SOURCE", "rpc")
+    INDEXER_START_BLOCK: int = int(os.getenv("INDEXER_START_BLOCK", 0))
+    INDEXER_BLOCK_RANGE: int = int(os.getenv("INDEXER_BLOCK_RANGE", 2000))
+    INDEXER_CONFIRMATIONS: int = int(os.getenv("INDEXER_CONFIRMATIONS", 0))
+    INDEXER_POLL_INTERVAL: float = float(os.getenv("INDEXER_POLL_INTERVAL", 2))
+    GOSSIP_DECAY: float = float(os.getenv("GOSSIP_DECAY", 0.5))
+    GOSSIP_MIN_STRENGTH: float = float(os.getenv("GOSSIP_MIN_STRENGTH", 0.1))
+    GOSSIP_INTERVAL: float = float(os.getenv("GOSSIP_INTERVAL", 5))
+    GOSSIP_BATCH_SIZE: int = int(os.getenv("GOSSIP_BATCH_SIZE", 1000))
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "none")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    METRICS_FILE: str = os.getenv("METRICS_FILE", "")
+    METRICS_FILE_INTERVAL: float = float(os.getenv("METRICS_FILE_INTERVAL", 15))
+    PROFILING_ADMIN_TOKEN: str = Field(
+        os.getenv("PROFILING_ADMIN_TOKEN", ""), repr=False
+    )
+    NARRATOR_SHARDS_ADMIN_TOKEN: str = Field(
+        os.getenv("NARRATOR_SHARDS_ADMIN_TOKEN", ""), repr=False
+    )
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_MAX_FILES: int = int(os.getenv("PROFILING_MAX_FILES", 50))
+    PROFILING_INTERVAL: float = float(os.getenv("PROFILING_INTERVAL", 0.005))
+    LOCATION_SESSION_IDLE_TIMEOUT: float = float(
+        os.getenv("LOCATION_SESSION_IDLE_TIMEOUT", 1800)
+    )
+    MAX_INFLIGHT_TURNS: int = int(os.getenv("MAX_INFLIGHT_TURNS", 64))
+    MAX_QUEUED_TURN_MESSAGES: int = int(os.getenv("MAX_QUEUED_TURN_MESSAGES", 3))
+    NARRATOR_BREAKER_FAILURES: int = int(os.getenv("NARRATOR_BREAKER_FAILURES", 5))
+    NARRATOR_BREAKER_COOLDOWN: float = float(
+        os.getenv("NARRATOR_BREAKER_COOLDOWN", 30)
+    )
+    NPC_TICK_INTERVAL: float = float(os.getenv("NPC_TICK_INTERVAL", 0))
+    # Validated, as the tick scheduler's token bucket divides by it.
+    NPC_TICK_LLM_BUDGET: float = Field(
+        float(os.getenv("NPC_TICK_LLM_BUDGET", 1)), gt=0, validate_default=True
+    )
+    NPC_TICK_IDLE_AFTER: float = float(os.getenv("NPC_TICK_IDLE_AFTER", 120))
+    PREWARM_FANOUT: int = int(os.getenv("PREWARM_FANOUT", 2))
+    PREWARM_TTL: float = float(os.getenv("PREWARM_TTL", 30))
+    PREWARM_WORKERS: int = int(os.getenv("PREWARM_WORKERS", 2))
+    PREWARM_QUEUE_SIZE: int = int(os.getenv("PREWARM_QUEUE_SIZE", 256))
+    PREWARM_MAX_ENTRIES: int = int(os.getenv("PREWARM_MAX_ENTRIES", 1024))
+    NARRATOR_INIT_MAX_SESSIONS: int = int(
+        os.getenv("NARRATOR_INIT_MAX_SESSIONS", 10000)
+    )
 
 settings = GameSettings()
-print(settings)
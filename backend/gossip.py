@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from game_settings import settings
+from models import Agent, AgentKnowledge, Event, GossipCheckpoint
+from relationship_graph import RelationshipGraph, relationship_graph
+
+logger = logging.getLogger(__name__)
+
+
+def spread(
+    graph: RelationshipGraph,
+    witnesses: List[List[int]],
+    decay: float,
+    min_strength: float,
+) -> Dict[int, List[tuple]]:
+    """
+    Spread a batch of events along relationship edges.
+
+    Every event is a column of a sparse frontier matrix, so each hop advances all
+    events of the batch with a single sparse product `A.T @ F`. An agent hears
+    about an event at the first hop that reaches it, with strength `decay ** hops`.
+
+    Args:
+        graph (RelationshipGraph): The relationship graph.
+        witnesses (List[List[int]]): Agent ids that witnessed each event of the batch.
+        decay (float): Strength multiplier applied on every hop.
+        min_strength (float): News weaker than this is not spread any further.
+
+    Returns:
+        Dict[int, List[tuple]]: `(agent_id, hops, strength)` entries for each event
+        index of the batch.
+    """
+    heard = {
+        column: [(agent_id, 0, 1.0) for agent_id in set(agents)]
+        for column, agents in enumerate(witnesses)
+    }
+    max_hops = 0
+    while decay ** (max_hops + 1) >= min_strength:
+        max_hops += 1
+    if max_hops == 0 or graph.num_edges == 0:
+        return heard
+
+    transposed = graph.adjacency().T.tocsr()
+    num_nodes = transposed.shape[0]
+    rows, columns = [], []
+    for column, agents in enumerate(witnesses):
+        nodes = graph.node_indices(agents)
+        nodes = np.unique(nodes[(nodes >= 0) & (nodes < num_nodes)])
+        rows.append(nodes)
+        columns.append(np.full(len(nodes), column, dtype=np.int64))
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    frontier = sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(num_nodes, len(witnesses)),
+    )
+    known = frontier.copy()
+
+    for hops in range(1, max_hops + 1):
+        frontier = transposed @ frontier
+        frontier.data[:] = 1
+        frontier = frontier - frontier.multiply(known)
+        frontier.eliminate_zeros()
+        if frontier.nnz == 0:
+            break
+        known = known + frontier
+
+        nodes, events = frontier.nonzero()
+        strength = decay**hops
+        for agent_id, column in zip(graph.ids[nodes].tolist(), events.tolist()):
+            heard[column].append((agent_id, hops, strength))
+    return heard
+
+
+def propagate_new_events(
+    db: Session, on_propagated: Optional[Callable[[Set[int]], None]] = None
+) -> int:
+    """
+    Propagate the next batch of events that have not been spread yet.
+
+    Witnesses are the agents of the event's location. The resulting knowledge rows
+    and the advanced checkpoint are written in one transaction.
+
+    Args:
+        db (Session): The database session.
+        on_propagated (Optional[Callable[[Set[int]], None]]): Called after the commit
+            with the players of the events some agents heard of.
+
+    Returns:
+        int: The number of events processed.
+    """
+    checkpoint = db.get(GossipCheckpoint, 1) or GossipCheckpoint(id=1, last_event_id=-1)
+    events = db.execute(
+        select(Event.id, Event.location_id, Event.player_id)
+        .where(Event.id > checkpoint.last_event_id)
+        .order_by(Event.id)
+        .limit(settings.GOSSIP_BATCH_SIZE)
+    ).all()
+    if not events:
+        return 0
+
+    location_ids = {
+        location_id for _, location_id, _ in events if location_id is not None
+    }
+    agents_at: Dict[int, List[int]] = {location_id: [] for location_id in location_ids}
+    for agent_id, location_id in db.execute(
+        select(Agent.id, Agent.location_id).where(Agent.location_id.in_(location_ids))
+    ):
+        agents_at[location_id].append(agent_id)
+
+    heard = spread(
+        relationship_graph,
+        [agents_at.get(location_id, []) for _, location_id, _ in events],
+        settings.GOSSIP_DECAY,
+        settings.GOSSIP_MIN_STRENGTH,
+    )
+    rows = [
+        {"agent_id": agent_id, "event_id": event_id, "hops": hops, "strength": strength}
+        for column, (event_id, _, _) in enumerate(events)
+        for agent_id, hops, strength in heard[column]
+    ]
+    if rows:
+        db.execute(insert(AgentKnowledge), rows)
+    checkpoint.last_event_id = events[-1][0]
+    db.merge(checkpoint)
+    db.commit()
+    if rows and on_propagated is not None:
+        on_propagated(
+            {
+                player_id
+                for column, (_, _, player_id) in enumerate(events)
+                if heard[column]
+            }
+        )
+    return len(events)
+
+
+def propagate_pending_events(
+    on_propagated: Optional[Callable[[Set[int]], None]] = None,
+) -> int:
+    """
+    Run one propagation batch in its own database session.
+
+    Args:
+        on_propagated (Optional[Callable[[Set[int]], None]]): Called with the players
+            of the events some agents heard of.
+
+    Returns:
+        int: The number of events processed.
+    """
+    db = SessionLocal()
+    try:
+        return propagate_new_events(db, on_propagated)
+    except Exception as e:
+        logger.error(f"Gossip propagation failed: {e}")
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+
+
+async def run_gossip_worker(on_propagated: Optional[Callable[[Set[int]], None]] = None):
+    """
+    Background loop that keeps the agent knowledge table up to date with new events.
+
+    Args:
+        on_propagated (Optional[Callable[[Set[int]], None]]): Called with the players
+            of the events some agents heard of.
+
+    Returns:
+        None
+    """
+    while True:
+        processed = await asyncio.to_thread(propagate_pending_events, on_propagated)
+        # A full batch means there is a backlog, keep going without waiting.
+        if processed < settings.GOSSIP_BATCH_SIZE:
+            await asyncio.sleep(settings.GOSSIP_INTERVAL)
@@ -1,6 +1,7 @@
 import httpx
 from typing import Optional, Dict, Any
 from fastapi import HTTPException
+from observability.telemetry import traced_request
 
 
 class HttpClient:
@@ -17,12 +18,16 @@ class HttpClient:
     async def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> dict:
         full_url = f"{self.base_url}{url}"
         try:
-            async with httpx.AsyncClient(
-                timeout=self.timeout, headers=self.headers
-            ) as client:
-                response = await client.get(full_url, params=params)
-                response.raise_for_status()
-                return response.json()
+            with traced_request("GET", full_url) as outgoing:
+                async with httpx.AsyncClient(
+                    timeout=self.timeout, headers=self.headers
+                ) as client:
+                    response = await client.get(
+                        full_url, params=params, headers=outgoing.headers
+                    )
+                    outgoing.status = response.status_code
+                    response.raise_for_status()
+                    return response.json()
         except httpx.RequestError as e:
             raise HTTPException(status_code=502, detail=f"HTTP request error: {e}")
         except httpx.HTTPStatusError as e:
@@ -38,12 +43,16 @@ class HttpClient:
     ) -> dict:
         full_url = f"{self.base_url}{url}"
         try:
-            async with httpx.AsyncClient(
-                timeout=self.timeout, headers=self.headers
-            ) as client:
-                response = await client.post(full_url, data=data, json=json)
-                response.raise_for_status()
-                return response.json()
+            with traced_request("POST", full_url) as outgoing:
+                async with httpx.AsyncClient(
+                    timeout=self.timeout, headers=self.headers
+                ) as client:
+                    response = await client.post(
+                        full_url, data=data, json=json, headers=outgoing.headers
+                    )
+                    outgoing.status = response.status_code
+                    response.raise_for_status()
+                    return response.json()
         except httpx.RequestError as e:
             raise HTTPException(status_code=502, detail=f"HTTP request error: {e}")
         except httpx.HTTPStatusError as e:
@@ -0,0 +1,148 @@
+"""
+Off-chain indexer for the `Immersive` contract.
+
+Tails the contract logs from the node in checkpointed block ranges and
+materializes players, items and balances into the backend database. Run it
+next to the backend from the `backend` directory:
+    python indexer.py
+"""
+
+import logging
+import time
+from functools import lru_cache
+
+from eth_utils import to_hex
+from sqlalchemy.orm import Session
+
+from blockchain import get_contract, get_w3
+from chain_index import ZERO_ADDRESS
+from database import SessionLocal, run_migrations
+from game_settings import settings
+from models import ChainItem, ChainPlayer, IndexerCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_events() -> dict:
+    """Indexed contract events by their topic."""
+    events = get_contract().events
+    return {
+        event.topic: event
+        for event in (
+            events.PlayerCreated(),
+            events.ItemGiven(),
+            events.ItemDestroyed(),
+            events.MoneyChanged(),
+        )
+    }
+
+
+def get_player(db: Session, address: str) -> ChainPlayer:
+    """Get the indexed player, adding an empty one on first sight."""
+    player = db.get(ChainPlayer, address)
+    if player is None:
+        player = ChainPlayer(address=address, money=0, owned_items_num=0)
+        db.add(player)
+    return player
+
+
+def apply_event(db: Session, name: str, args):
+    """
+    Apply a decoded contract event to the index tables, mirroring the contract state.
+
+    Args:
+        db (Session): The database session.
+        name (str): The event name.
+        args: The decoded event arguments.
+    """
+    if name == "PlayerCreated":
+        player = get_player(db, args.player)
+        player.money = args.initialMoney
+        player.owned_items_num = 0
+    elif name == "MoneyChanged":
+        get_player(db, args.player).money = args.balance
+    elif name == "ItemGiven":
+        db.merge(
+            ChainItem(id=args.itemId, owner=args.to, data=args.data, destroyed=False)
+        )
+        get_player(db, args.to).owned_items_num += 1
+    elif name == "ItemDestroyed":
+        db.merge(ChainItem(id=args.itemId, owner=ZERO_ADDRESS, data="", destroyed=True))
+        get_player(db, args.owner).owned_items_num -= 1
+
+
+def index_block_range(db: Session, from_block: int, to_block: int) -> int:
+    """
+    Fetch and apply the contract logs of a block range, then advance the checkpoint,
+    all in one transaction.
+
+    Args:
+        db (Session): The database session.
+        from_block (int): The first block of the range.
+        to_block (int): The last block of the range.
+
+    Returns:
+        int: The number of applied events.
+    """
+    events = get_events()
+    logs = get_w3().eth.get_logs(
+        {
+            "address": get_contract().address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [list(events)],
+        }
+    )
+    logs = sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+    for log in logs:
+        event = events[to_hex(log["topics"][0])].process_log(log)
+        apply_event(db, event.event, event.args)
+        # The session does not autoflush, make earlier rows visible to `db.get`.
+        db.flush()
+
+    db.merge(IndexerCheckpoint(id=1, last_block=to_block))
+    db.commit()
+    return len(logs)
+
+
+def index_new_blocks(db: Session) -> int:
+    """
+    Index every block between the checkpoint and the latest confirmed block.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        int: The number of applied events.
+    """
+    checkpoint = db.get(IndexerCheckpoint, 1)
+    start = checkpoint.last_block + 1 if checkpoint else settings.INDEXER_START_BLOCK
+    latest = get_w3().eth.block_number - settings.INDEXER_CONFIRMATIONS
+    applied = 0
+    while start <= latest:
+        end = min(start + settings.INDEXER_BLOCK_RANGE - 1, latest)
+        applied += index_block_range(db, start, end)
+        logger.info(f"Indexed blocks {start}-{end}")
+        start = end + 1
+    return applied
+
+
+def main():
+    """Runs the indexer until interrupted."""
+    logging.basicConfig(level=logging.INFO)
+    run_migrations()
+    while True:
+        db = SessionLocal()
+        try:
+            index_new_blocks(db)
+        except Exception as e:
+            logger.error(f"Indexing failed: {e}")
+            db.rollback()
+        finally:
+            db.close()
+        time.sleep(settings.INDEXER_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from eth_utils import to_checksum_address
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+import blockchain
+from chain_index import ZERO_ADDRESS
+from database import engine
+from game_settings import settings
+from models import LedgerItem, LedgerPlayer
+
+
+class LedgerError(Exception):
+    """
+    Raised by the in-process ledgers where the contract would revert.
+    """
+
+
+class Ledger(ABC):
+    """
+    Player balances and items, as kept by the `Immersive` contract.
+
+    Reads return the same shapes as the contract view functions: items are
+    `(data, owner)` tuples and player data is a `(money, owned_items_num)` tuple.
+    """
+
+    def start(self):
+        """
+        Start background work the ledger needs, called from the app lifespan.
+        """
+
+    def stop(self):
+        """
+        Stop the background work started by `start`.
+        """
+
+    @abstractmethod
+    def is_connected(self) -> bool:
+        """
+        Checks whether the ledger can serve requests.
+
+        Returns:
+            True if the ledger is reachable.
+        """
+
+    @abstractmethod
+    def create_player(self, address: str, initialMoney: int):
+        """
+        Creates a player, resetting its balance and item count if it already exists.
+
+        Args:
+            address (str): The blockchain address of the player.
+            initialMoney (int): The initial amount of money to assign to the player.
+        """
+
+    @abstractmethod
+    def give_money(self, address: str, amount: int):
+        """
+        Adds money to a player's balance.
+
+        Args:
+            address (str): The blockchain address of the player.
+            amount (int): The amount of money to give.
+        """
+
+    @abstractmethod
+    def take_money(self, address: str, amount: int):
+        """
+        Takes money from a player's balance, failing if the balance is too low.
+
+        Args:
+            address (str): The blockchain address of the player.
+            amount (int): The amount of money to take.
+        """
+
+    @abstractmethod
+    def give_item(self, address: str, itemdata: str):
+        """
+        Creates a new item owned by the player.
+
+        Args:
+            address (str): The blockchain address of the player.
+            itemdata (str): The item data.
+        """
+
+    @abstractmethod
+    def destroy_item(self, itemId: int):
+        """
+        Destroys an item, failing if it does not exist.
+
+        Args:
+            itemId (int): The ID of the item to destroy.
+        """
+
+    @abstractmethod
+    def get_item(self, itemId: int) -> Tuple[str, str]:
+        """
+        Retrieves a specific item.
+
+        Args:
+            itemId (int): The ID of the item to retrieve.
+
+        Returns:
+            The item as a `(data, owner)` tuple.
+        """
+
+    @abstractmethod
+    def get_items(self) -> List[Tuple[str, str]]:
+        """
+        Retrieves every item, destroyed ones included, ordered by ID.
+
+        Returns:
+            A list of `(data, owner)` tuples.
+        """
+
+    @abstractmethod
+    def get_player_data(self, address: str) -> Tuple[int, int]:
+        """
+        Retrieves a player's balance and number of owned items.
+
+        Args:
+            address (str): The blockchain address of the player.
+
+        Returns:
+            A `(money, owned_items_num)` tuple, zeros for unknown players.
+        """
+
+    @abstractmethod
+    def get_player_item_ids(self, address: str) -> List[int]:
+        """
+        Retrieves the IDs of the items owned by a player.
+
+        Args:
+            address (str): The blockchain address of the player.
+
+        Returns:
+            A list of item IDs in ascending order.
+        """
+
+    def get_player_items(self, address: str) -> List[Tuple[int, str]]:
+        """
+        Retrieves the items owned by a player.
+
+        Args:
+            address (str): The blockchain address of the player.
+
+        Returns:
+            A list of tuples containing item IDs and item data.
+        """
+        return [(i, self.get_item(i)[0]) for i in self.get_player_item_ids(address)]
+
+    def get_player_profiles(self, addresses: List[str]) -> List[Tuple[tuple, list]]:
+        """
+        Retrieves the data and items of many players.
+
+        Args:
+            addresses (List[str]): The blockchain addresses of the players.
+
+        Returns:
+            A list with a `(player_data, items)` tuple per address, in the same order.
+        """
+        return [
+            (self.get_player_data(address), self.get_player_items(address))
+            for address in addresses
+        ]
+
+
+class Web3Ledger(Ledger):
+    """
+    The deployed `Immersive` contract, through the functions of `blockchain.py`.
+    """
+
+    def start(self):
+        blockchain.view_cache.start_watcher()
+
+    def stop(self):
+        blockchain.view_cache.stop_watcher()
+
+    def is_connected(self) -> bool:
+        return blockchain.blockchain_is_connected()
+
+    def create_player(self, address: str, initialMoney: int):
+        return blockchain.blockchain_create_player(address, initialMoney)
+
+    def give_money(self, address: str, amount: int):
+        return blockchain.blockchain_give_money(address, amount)
+
+    def take_money(self, address: str, amount: int):
+        return blockchain.blockchain_take_money(address, amount)
+
+    def give_item(self, address: str, itemdata: str):
+        return blockchain.blockchain_give_item(address, itemdata)
+
+    def destroy_item(self, itemId: int):
+        return blockchain.blockchain_destroy_item(itemId)
+
+    def get_item(self, itemId: int) -> Tuple[str, str]:
+        return blockchain.blockchain_get_item(itemId)
+
+    def get_items(self) -> List[Tuple[str, str]]:
+        return blockchain.blockchain_get_items()
+
+    def get_player_data(self, address: str) -> Tuple[int, int]:
+        return blockchain.blockchain_get_player_data(address)
+
+    def get_player_item_ids(self, address: str) -> List[int]:
+        return blockchain.blockchain_get_player_item_ids(address)
+
+    def get_player_items(self, address: str) -> List[Tuple[int, str]]:
+        return blockchain.blockchain_get_player_items(address)
+
+    def get_player_profiles(self, addresses: List[str]) -> List[Tuple[tuple, list]]:
+        return blockchain.blockchain_get_player_profiles(addresses)
+
+
+class MemoryLedger(Ledger):
+    """
+    In-process ledger kept in dictionaries, for load tests and local development.
+    The state is lost when the process exits.
+    """
+
+    def __init__(self):
+        self._players: Dict[str, List[int]] = {}
+        self._items: List[Tuple[str, str]] = []
+        # Item IDs per owner. IDs only grow, so insertion order is ascending order.
+        self._owned: Dict[str, Dict[int, None]] = {}
+        self._lock = threading.Lock()
+
+    def is_connected(self) -> bool:
+        return True
+
+    def create_player(self, address: str, initialMoney: int):
+        address = to_checksum_address(address)
+        with self._lock:
+            self._players[address] = [initialMoney, 0]
+
+    def give_money(self, address: str, amount: int):
+        address = to_checksum_address(address)
+        with self._lock:
+            self._players.setdefault(address, [0, 0])[0] += amount
+
+    def take_money(self, address: str, amount: int):
+        address = to_checksum_address(address)
+        with self._lock:
+            player = self._players.setdefault(address, [0, 0])
+            if player[0] < amount:
+                raise LedgerError(f"Balance of {address} is lower than {amount}")
+            player[0] -= amount
+
+    def give_item(self, address: str, itemdata: str):
+        address = to_checksum_address(address)
+        with self._lock:
+            item_id = len(self._items)
+            self._items.append((itemdata, address))
+            self._players.setdefault(address, [0, 0])[1] += 1
+            self._owned.setdefault(address, {})[item_id] = None
+
+    def destroy_item(self, itemId: int):
+        with self._lock:
+            if (
+                not 0 <= itemId < len(self._items)
+                or self._items[itemId][1] == ZERO_ADDRESS
+            ):
+                raise LedgerError(f"Item {itemId} does not exist")
+            owner = self._items[itemId][1]
+            player = self._players.setdefault(owner, [0, 0])
+            if player[1] == 0:
+                raise LedgerError(f"Item count of {owner} is already zero")
+            player[1] -= 1
+            self._items[itemId] = ("", ZERO_ADDRESS)
+            del self._owned[owner][itemId]
+
+    def get_item(self, itemId: int) -> Tuple[str, str]:
+        if not 0 <= itemId < len(self._items):
+            raise LedgerError(f"Item {itemId} does not exist")
+        return self._items[itemId]
+
+    def get_items(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._items)
+
+    def get_player_data(self, address: str) -> Tuple[int, int]:
+        return tuple(self._players.get(to_checksum_address(address), (0, 0)))
+
+    def get_player_item_ids(self, address: str) -> List[int]:
+        with self._lock:
+            return list(self._owned.get(to_checksum_address(address), ()))
+
+    def get_player_items(self, address: str) -> List[Tuple[int, str]]:
+        with self._lock:
+            return [
+                (i, self._items[i][0])
+                for i in self._owned.get(to_checksum_address(address), ())
+            ]
+
+
+class DatabaseLedger(Ledger):
+    """
+    In-process ledger persisted in the `ledger_players` and `ledger_items` tables of
+    the backend database (SQLite by default). Writes are serialized within the process.
+    """
+
+    def __init__(self):
+        # Own sessions, so ledger calls never close or commit the request's session.
+        self._sessions = sessionmaker(bind=engine, autoflush=False)
+        self._lock = threading.Lock()
+
+    def is_connected(self) -> bool:
+        with self._sessions() as db:
+            db.query(LedgerPlayer.address).limit(1).all()
+        return True
+
+    def create_player(self, address: str, initialMoney: int):
+        address = to_checksum_address(address)
+        with self._lock, self._sessions() as db:
+            db.merge(
+                LedgerPlayer(address=address, money=initialMoney, owned_items_num=0)
+            )
+            db.commit()
+
+    def give_money(self, address: str, amount: int):
+        address = to_checksum_address(address)
+        with self._lock, self._sessions() as db:
+            self._get_player(db, address).money += amount
+            db.commit()
+
+    def take_money(self, address: str, amount: int):
+        address = to_checksum_address(address)
+        with self._lock, self._sessions() as db:
+            player = self._get_player(db, address)
+            if player.money < amount:
+                raise LedgerError(f"Balance of {address} is lower than {amount}")
+            player.money -= amount
+            db.commit()
+
+    def give_item(self, address: str, itemdata: str):
+        address = to_checksum_address(address)
+        with self._lock, self._sessions() as db:
+            last_id = db.query(func.max(LedgerItem.id)).scalar()
+            item_id = 0 if last_id is None else last_id + 1
+            db.add(LedgerItem(id=item_id, owner=address, data=itemdata))
+            self._get_player(db, address).owned_items_num += 1
+            db.commit()
+
+    def destroy_item(self, itemId: int):
+        with self._lock, self._sessions() as db:
+            item = db.get(LedgerItem, itemId)
+            if item is None or item.owner == ZERO_ADDRESS:
+                raise LedgerError(f"Item {itemId} does not exist")
+            player = self._get_player(db, item.owner)
+            if player.owned_items_num == 0:
+                raise LedgerError(f"Item count of {item.owner} is already zero")
+            player.owned_items_num -= 1
+            item.owner = ZERO_ADDRESS
+            item.data = ""
+            db.commit()
+
+    def get_item(self, itemId: int) -> Tuple[str, str]:
+        with self._sessions() as db:
+            item = db.get(LedgerItem, itemId)
+            if item is None:
+                raise LedgerError(f"Item {itemId} does not exist")
+            return (item.data, item.owner)
+
+    def get_items(self) -> List[Tuple[str, str]]:
+        with self._sessions() as db:
+            return [
+                (data, owner)
+                for data, owner in db.query(LedgerItem.data, LedgerItem.owner).order_by(
+                    LedgerItem.id
+                )
+            ]
+
+    def get_player_data(self, address: str) -> Tuple[int, int]:
+        with self._sessions() as db:
+            player = db.get(LedgerPlayer, to_checksum_address(address))
+            if player is None:
+                return (0, 0)
+            return (player.money, player.owned_items_num)
+
+    def get_player_item_ids(self, address: str) -> List[int]:
+        return [item_id for item_id, _ in self.get_player_items(address)]
+
+    def get_player_items(self, address: str) -> List[Tuple[int, str]]:
+        return self.get_player_profiles([address])[0][1]
+
+    def get_player_profiles(self, addresses: List[str]) -> List[Tuple[tuple, list]]:
+        addresses = [to_checksum_address(address) for address in addresses]
+        with self._sessions() as db:
+            players = {
+                player.address: (player.money, player.owned_items_num)
+                for player in db.query(LedgerPlayer).filter(
+                    LedgerPlayer.address.in_(addresses)
+                )
+            }
+            items: Dict[str, List[Tuple[int, str]]] = {
+                address: [] for address in addresses
+            }
+            for item_id, owner, data in (
+                db.query(LedgerItem.id, LedgerItem.owner, LedgerItem.data)
+                .filter(LedgerItem.owner.in_(addresses))
+                .order_by(LedgerItem.id)
+            ):
+                items[owner].append((item_id, data))
+        return [(players.get(address, (0, 0)), items[address]) for address in addresses]
+
+    @staticmethod
+    def _get_player(db, address: str) -> LedgerPlayer:
+        # Like the contract mapping, unknown players read as an empty account.
+        player = db.get(LedgerPlayer, address)
+        if player is None:
+            player = LedgerPlayer(address=address, money=0, owned_items_num=0)
+            db.add(player)
+        return player
+
+
+LEDGER_BACKENDS = {
+    "web3": Web3Ledger,
+    "memory": MemoryLedger,
+    "database": DatabaseLedger,
+}
+
+
+@lru_cache(maxsize=None)
+def get_ledger() -> Ledger:
+    """
+    Creates the ledger selected by the `LEDGER_BACKEND` setting.
+
+    Returns:
+        The ledger shared by the whole process.
+    """
+    try:
+        return LEDGER_BACKENDS[settings.LEDGER_BACKEND]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown LEDGER_BACKEND {settings.LEDGER_BACKEND!r}, "
+            f"expected one of {', '.join(LEDGER_BACKENDS)}"
+        ) from None
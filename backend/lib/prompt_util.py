@@ -1,7 +1,7 @@
 from string import Template
 from models import *
 from schemas import *
-from blockchain import blockchain_get_player_items
+from ledger import get_ledger
 from typing import List
 
 
@@ -19,7 +19,7 @@ def generate_agent_initialization_prompt(
     )
     
     # Generate player items and actions
-    player_items = "\n".join(item[1] for item in blockchain_get_player_items(player.bc_address)) or "No items available"
+    player_items = "\n".join(item[1] for item in get_ledger().get_player_items(player.bc_address)) or "No items available"
     player_actions = "\n".join(event.description for event in events) or "No actions available"
     
     # Prepare prompt using Template
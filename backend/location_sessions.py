@@ -0,0 +1,140 @@
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from schemas import PlayerSchema
+
+
+class LocationSession:
+    """
+    Everything a player's turns need while they stay in one location.
+
+    Attributes:
+        player (PlayerSchema): The resolved player.
+        location_id (int): The location the player is in.
+        agent_names (Dict[int, str]): Names of the agents in the location by agent ID.
+        narrator_session_id (int): The ID the narrator session was initialized with.
+        last_active (float): Monotonic time of the last use of the session.
+    """
+
+    __slots__ = (
+        "player",
+        "location_id",
+        "agent_names",
+        "narrator_session_id",
+        "last_active",
+    )
+
+    def __init__(
+        self,
+        player: PlayerSchema,
+        location_id: int,
+        agent_names: Dict[int, str],
+        narrator_session_id: int,
+    ):
+        self.player = player
+        self.location_id = location_id
+        self.agent_names = agent_names
+        self.narrator_session_id = narrator_session_id
+        self.last_active = time.monotonic()
+
+
+class LocationSessionStore:
+    """
+    In-memory location sessions keyed by player ID, released after an idle timeout.
+    """
+
+    def __init__(self, idle_timeout: float):
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[int, LocationSession] = {}
+        # Player IDs by location ID, for the locations with at least one session.
+        self._by_location: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def open(self, session: LocationSession):
+        """
+        Start a session, replacing the player's previous one.
+
+        Args:
+            session (LocationSession): The new session.
+        """
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            self._remove(session.player.id)
+            self._sessions[session.player.id] = session
+            self._by_location.setdefault(session.location_id, set()).add(
+                session.player.id
+            )
+
+    def get(self, player_id: int) -> Optional[LocationSession]:
+        """
+        Get the player's session and mark it as active.
+
+        Args:
+            player_id (int): The player ID.
+
+        Returns:
+            Optional[LocationSession]: The session, or None if there is none or it expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(player_id)
+            if session is None:
+                return None
+            if now - session.last_active > self.idle_timeout:
+                self._remove(player_id)
+                return None
+            session.last_active = now
+            return session
+
+    def release(self, player_id: int) -> Optional[LocationSession]:
+        """
+        End the player's session.
+
+        Args:
+            player_id (int): The player ID.
+
+        Returns:
+            Optional[LocationSession]: The released session, if there was one.
+        """
+        with self._lock:
+            return self._remove(player_id)
+
+    def in_location(self, location_id: int) -> List[LocationSession]:
+        """
+        Get the sessions of the players in a location, without marking them as active.
+
+        Args:
+            location_id (int): The location ID.
+
+        Returns:
+            List[LocationSession]: The sessions that have not expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                self._sessions[player_id]
+                for player_id in self._by_location.get(location_id, ())
+                if now - self._sessions[player_id].last_active <= self.idle_timeout
+            ]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict_idle(self, now: float):
+        expired = [
+            player_id
+            for player_id, session in self._sessions.items()
+            if now - session.last_active > self.idle_timeout
+        ]
+        for player_id in expired:
+            self._remove(player_id)
+
+    def _remove(self, player_id: int) -> Optional[LocationSession]:
+        session = self._sessions.pop(player_id, None)
+        if session is not None:
+            players = self._by_location[session.location_id]
+            players.discard(player_id)
+            if not players:
+                del self._by_location[session.location_id]
+        return session
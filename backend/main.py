@@ -1,63 +1,193 @@
+import asyncio
+import logging
 import uvicorn
-from typing import List
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
 from fastapi import HTTPException
-from fastapi import status, FastAPI, Depends
+from fastapi import status, FastAPI, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session, scoped_session
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from observability.profiling import (
+    ProfilingMiddleware,
+    RequestProfiler,
+    create_admin_router,
+)
+from observability.telemetry import (
+    metrics_response,
+    setup_tracing,
+    shutdown_tracing,
+    start_metrics_file_writer,
+    telemetry_middleware,
+)
 
-import models
-from http_client import HttpClient
+from admission import CircuitBreaker, TurnAdmission, TurnRejected
+from database import SessionLocal, get_db, run_migrations
 from lib.prompt_util import (
     generate_agent_initialization_prompt,
     generate_narrator_prompt,
 )
-from models import Player, Location, Quest, Agent, Relationship, Event
-from schemas import *
-from blockchain import (
-    blockchain_create_player,
-    blockchain_give_item,
-    blockchain_get_player_data,
-    blockchain_get_player_items,
+from models import (
+    Player,
+    Location,
+    LocationLink,
+    Quest,
+    Agent,
+    Relationship,
+    Event,
+    AgentKnowledge,
 )
+from schemas import *
 from game_settings import settings
-
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = scoped_session(
-    sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from gossip import run_gossip_worker
+from ledger import get_ledger
+from location_sessions import LocationSession, LocationSessionStore
+from narrator_init import NarratorInitializer
+from narrator_shards import ShardedHttpClient, create_shards_router
+from npc_ticks import TickScheduler
+from prewarm import LocationPredictor, PrewarmCache, Prewarmer
+from relationship_graph import relationship_graph
+from serialization import (
+    construct_all,
+    negotiated_response,
+    schema_columns,
+    select_rows,
 )
+from session_channels import SessionChannel, SessionChannelHub
+
+# Seconds a readiness check waits for a dependency before reporting it as down.
+READINESS_TIMEOUT = 2
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
 
-def get_db():
+def log_worker_failure(task: asyncio.Task):
     """
-    Dependency function to get the database session.
+    Done callback of the background workers, which only end when cancelled, logging
+    the exception a worker died of instead of leaving it to the garbage collector.
 
-    @returns: Yields the database session.
-    @rtype: Session
+    @param task: The worker task.
+    @type task: asyncio.Task
+    @returns: None
+    @rtype: None
+    """
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            f"Background worker {task.get_name()} stopped", exc_info=task.exception()
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    FastAPI lifespan handler. Brings the database schema up to date, loads the
+    in-memory relationship graph and starts the background workers. Nothing here
+    waits for the ledger or the narrator, they are connected lazily.
+
+    @returns: None
+    @rtype: None
     """
+    app.state.ready = False
+    setup_tracing("backend", settings.TRACE_EXPORTER, settings.TRACE_FILE)
+    metrics_writer = (
+        start_metrics_file_writer(settings.METRICS_FILE, settings.METRICS_FILE_INTERVAL)
+        if settings.METRICS_FILE
+        else None
+    )
+    run_migrations()
     db = SessionLocal()
     try:
-        yield db
+        relationship_graph.load(db)
+        location_predictor.load(db)
     finally:
         db.close()
+    get_ledger().start()
+    gossip_task = asyncio.create_task(
+        run_gossip_worker(on_propagated=invalidate_heard_events), name="gossip"
+    )
+    prewarm_task = asyncio.create_task(prewarmer.run(), name="prewarm")
+    tick_task = (
+        asyncio.create_task(npc_ticks.run(), name="npc-ticks")
+        if npc_ticks is not None
+        else None
+    )
+    for task in (gossip_task, prewarm_task, tick_task):
+        if task is not None:
+            task.add_done_callback(log_worker_failure)
+    app.state.ready = True
 
+    yield
 
-@app.on_event("startup")
-def startup():
-    """
-    FastAPI event handler to initialize the database.
+    app.state.ready = False
+    gossip_task.cancel()
+    prewarm_task.cancel()
+    if tick_task is not None:
+        tick_task.cancel()
+    get_ledger().stop()
+    if metrics_writer is not None:
+        metrics_writer.set()
+    shutdown_tracing()
 
-    @returns: None
-    @rtype: None
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+httpClient = ShardedHttpClient(settings.NARRATOR_SHARDS or [settings.API_BASE_URL])
+narrator_initializer = NarratorInitializer(
+    httpClient, settings.NARRATOR_INIT_MAX_SESSIONS
+)
+location_sessions = LocationSessionStore(settings.LOCATION_SESSION_IDLE_TIMEOUT)
+session_channels = SessionChannelHub()
+turn_admission = TurnAdmission(
+    settings.MAX_INFLIGHT_TURNS,
+    settings.MAX_QUEUED_TURN_MESSAGES,
+    CircuitBreaker(
+        settings.NARRATOR_BREAKER_FAILURES, settings.NARRATOR_BREAKER_COOLDOWN
+    ),
+)
+
+
+async def run_npc_tick(
+    location_id: int, narrator_session_ids: List[int]
+) -> Optional[dict]:
     """
-    print("Debug: Models loaded in Base.metadata.tables:")
-    print(models.Base.metadata.tables.keys())  # Check if models are registered
-    models.Base.metadata.create_all(bind=engine)
+    Ask the narrator whether an NPC acts on its own in a location.
+
+    The location is ticked once, on the narrator worker owning it, which reads the
+    sessions of the other workers' players from the shared session store. So a tick
+    is a single LLM call and every player of the location gets the same action.
 
+    @param location_id: The location.
+    @type location_id: int
 
-httpClient = HttpClient(base_url=settings.API_BASE_URL)
+    @param narrator_session_ids: The narrator sessions of the players in the location.
+    @type narrator_session_ids: List[int]
+
+    @returns: The NPC action, None if every NPC stays silent.
+    @rtype: Optional[dict]
+    """
+    response = await httpClient.post(
+        "/tick",
+        json={"location_id": location_id, "player_ids": narrator_session_ids},
+    )
+    return response["action"]
+
+
+npc_ticks = (
+    TickScheduler(
+        settings.NPC_TICK_INTERVAL,
+        settings.NPC_TICK_LLM_BUDGET,
+        settings.NPC_TICK_IDLE_AFTER,
+        location_sessions,
+        session_channels,
+        turn_admission,
+        run_npc_tick,
+    )
+    if settings.NPC_TICK_INTERVAL > 0
+    else None
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -66,6 +196,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.middleware("http")(telemetry_middleware)
+
+profiler = RequestProfiler(
+    settings.PROFILING_DIR, settings.PROFILING_MAX_FILES, settings.PROFILING_INTERVAL
+)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.include_router(create_admin_router(profiler, settings.PROFILING_ADMIN_TOKEN))
+app.include_router(
+    create_shards_router(httpClient, settings.NARRATOR_SHARDS_ADMIN_TOKEN)
+)
 
 
 @app.get("/")
@@ -79,15 +219,78 @@ def read_root():
     return {"message": "Welcome to the FastAPI RPG API!"}
 
 
+@app.get("/health", status_code=status.HTTP_200_OK)
+def health():
+    """
+    Liveness endpoint, answers as long as the process is serving requests.
+
+    @returns: The liveness status.
+    @rtype: dict
+    """
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics endpoint with the latency histograms of requests, outgoing
+    calls, database queries and blockchain calls.
+
+    @returns: The metrics in the Prometheus text format.
+    @rtype: Response
+    """
+    return metrics_response()
+
+
+def check_database() -> bool:
+    """Runs a trivial query to check that the database answers."""
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return True
+    finally:
+        db.close()
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness endpoint, checks that startup has finished and that the database
+    and the ledger are reachable.
+
+    @returns: The status of every dependency, with status code 503 if any is down.
+    @rtype: JSONResponse
+    """
+    checks = {"startup": getattr(app.state, "ready", False)}
+    for name, check in (
+        ("database", check_database),
+        ("ledger", get_ledger().is_connected),
+    ):
+        try:
+            checks[name] = await asyncio.wait_for(
+                asyncio.to_thread(check), READINESS_TIMEOUT
+            )
+        except Exception:
+            checks[name] = False
+
+    is_ready = all(checks.values())
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK if is_ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content={"status": "ready" if is_ready else "not ready", "checks": checks},
+    )
+
+
 @app.get("/players", response_model=List[PlayerSchema])
-def get_players(db: Session = Depends(get_db)):
+def get_players(request: Request, db: Session = Depends(get_db)):
     """
     Retrieve all players from the database.
 
-    @returns: A list of players.
-    @rtype: List[PlayerSchema]
+    @returns: A list of players, in MessagePack when the client accepts it.
+    @rtype: Response
     """
-    return db.query(Player).all()
+    return negotiated_response(request, select_rows(db, PlayerSchema, Player))
 
 
 @app.post("/players", response_model=PlayerSchema)
@@ -102,31 +305,41 @@ def create_player(player: PlayerSchema, db: Session = Depends(get_db)):
     @rtype: PlayerSchema
     """
     try:
-        with db.begin():
-            db_player = Player(**player.dict())
-            db.add(db_player)
-            db.commit()
-            db.refresh(db_player)
-
-            blockchain_create_player(db_player.bc_address, 100)
-            blockchain_give_item(db_player.bc_address, "bow")
-            blockchain_give_item(db_player.bc_address, "health potion")
-
+        db_player = Player(**player.dict())
+        db.add(db_player)
+        db.commit()
+        db.refresh(db_player)
     except Exception as e:
         db.rollback()
+        raise HTTPException(
+            status_code=500, detail=f"Error creating the player: {str(e)}"
+        )
+
+    # The player is committed before the ledger is called, the database ledger
+    # shares the SQLite database and could not write while this session does.
+    try:
+        ledger = get_ledger()
+        ledger.create_player(db_player.bc_address, 100)
+        ledger.give_item(db_player.bc_address, "bow")
+        ledger.give_item(db_player.bc_address, "health potion")
+    except Exception as e:
+        db.delete(db_player)
+        db.commit()
         raise HTTPException(status_code=500, detail=f"Error during blockchain operation: {str(e)}")
-    
+
+    # Prewarmed location contexts hold the player's items from the ledger.
+    prewarm_cache.invalidate_player(db_player.id)
     return db_player
 
 @app.get("/locations", response_model=List[LocationSchema])
-def get_locations(db: Session = Depends(get_db)):
+def get_locations(request: Request, db: Session = Depends(get_db)):
     """
     Retrieve all locations from the database.
 
-    @returns: A list of locations.
-    @rtype: List[LocationSchema]
+    @returns: A list of locations, in MessagePack when the client accepts it.
+    @rtype: Response
     """
-    return db.query(Location).all()
+    return negotiated_response(request, select_rows(db, LocationSchema, Location))
 
 
 @app.post("/locations", response_model=LocationSchema)
@@ -147,16 +360,50 @@ def create_location(location: LocationSchema, db: Session = Depends(get_db)):
     return db_location
 
 
+@app.get("/locations/links", response_model=List[LocationLinkSchema])
+def get_location_links(request: Request, db: Session = Depends(get_db)):
+    """
+    Retrieve all links between locations from the database.
+
+    @returns: A list of location links, in MessagePack when the client accepts it.
+    @rtype: Response
+    """
+    return negotiated_response(
+        request, select_rows(db, LocationLinkSchema, LocationLink)
+    )
+
+
+@app.post("/locations/links", response_model=LocationLinkSchema)
+def create_location_link(link: LocationLinkSchema, db: Session = Depends(get_db)):
+    """
+    Create a link from a location to another, a way players can take.
+
+    @param link: The link data.
+    @type link: LocationLinkSchema
+
+    @returns: The created link.
+    @rtype: LocationLinkSchema
+    """
+    db_link = LocationLink(**link.dict())
+    db.add(db_link)
+    db.commit()
+    db.refresh(db_link)
+    location_predictor.add_link(
+        db_link.source_location_id, db_link.destination_location_id
+    )
+    return db_link
+
+
 @app.get("/quests", response_model=List[QuestSchema])
-def get_quests(db: Session = Depends(get_db)):
+def get_quests(request: Request, db: Session = Depends(get_db)):
     """
     Retrieve all quests from the database.
 
 
-    @returns: A list of quests.
-    @rtype: List[QuestSchema]
+    @returns: A list of quests, in MessagePack when the client accepts it.
+    @rtype: Response
     """
-    return db.query(Quest).all()
+    return negotiated_response(request, select_rows(db, QuestSchema, Quest))
 
 
 @app.post("/quests", response_model=QuestSchema)
@@ -178,15 +425,15 @@ def create_quest(quest: QuestSchema, db: Session = Depends(get_db)):
 
 
 @app.get("/agents", response_model=List[AgentSchema])
-def get_agents(db: Session = Depends(get_db)):
+def get_agents(request: Request, db: Session = Depends(get_db)):
     """
     Retrieve all agents from the database.
 
 
-    @returns: A list of agents.
-    @rtype: List[AgentSchema]
+    @returns: A list of agents, in MessagePack when the client accepts it.
+    @rtype: Response
     """
-    return db.query(Agent).all()
+    return negotiated_response(request, select_rows(db, AgentSchema, Agent))
 
 
 @app.post("/agents", response_model=AgentSchema)
@@ -204,18 +451,22 @@ def create_agent(agent: AgentSchema, db: Session = Depends(get_db)):
     db.add(db_agent)
     db.commit()
     db.refresh(db_agent)
+    # Prewarmed location contexts hold the prompts of the location's agents.
+    prewarm_cache.invalidate_location(db_agent.location_id)
     return db_agent
 
 
 @app.get("/relationships", response_model=List[RelationshipSchema])
-def get_relationships(db: Session = Depends(get_db)):
+def get_relationships(request: Request, db: Session = Depends(get_db)):
     """
     Retrieve all relationships between agents from the database.
 
-    @returns: A list of relationships.
-    @rtype: List[RelationshipSchema]
+    @returns: A list of relationships, in MessagePack when the client accepts it.
+    @rtype: Response
     """
-    return db.query(Relationship).all()
+    return negotiated_response(
+        request, select_rows(db, RelationshipSchema, Relationship)
+    )
 
 
 @app.post("/relationships", response_model=RelationshipSchema)
@@ -235,53 +486,132 @@ def create_relationship(
     db.add(db_relationship)
     db.commit()
     db.refresh(db_relationship)
+    relationship_graph.add_edge(
+        db_relationship.agent_source, db_relationship.agent_destination
+    )
+    # The prompt of the source agent lists its relationships.
+    source = db.get(Agent, db_relationship.agent_source)
+    if source is not None:
+        prewarm_cache.invalidate_location(source.location_id)
     return db_relationship
 
 
-@app.post("/enterLocation", status_code=status.HTTP_200_OK)
-async def enter_location(model: EnterLocationSchema, db: Session = Depends(get_db)):
+@app.get("/relationships/reach", status_code=status.HTTP_200_OK)
+def get_relationship_reach(agent_id: int, hops: int = 3):
     """
-    Handle player entering a location.
+    Retrieve the agents reachable from an agent within a number of relationship hops.
 
-    @param model: The location entry data.
-    @type model: EnterLocationSchema
+    @param agent_id: The agent ID to start from.
+    @type agent_id: int
 
-    @returns: A list of agent IDs present in the location.
+    @param hops: The maximum number of hops.
+    @type hops: int
+
+    @returns: The reached agent IDs with their hop distance.
     @rtype: dict
     """
-    location = db.query(Location).filter(Location.id == model.location_id).first()
-    if not location:
-        raise HTTPException(status_code=404, detail="Location not found")
+    agent_ids, depths = relationship_graph.bfs(agent_id, max_depth=hops)
+    return {
+        "agents": [
+            {"agent_id": int(reached), "hops": int(depth)}
+            for reached, depth in zip(agent_ids[1:], depths[1:])
+        ]
+    }
 
-    location_schema = LocationSchema.from_orm(location)  # Convert to Schema
 
-    player = db.query(Player).filter(Player.id == model.player_id).first()
-    if not player:
+def build_location_context(db: Session, location_id: int, player_id: int) -> tuple:
+    """
+    Load a location, the player and the agents there, and build the agent prompts.
+
+    This is the database and prompt building part of entering a location, without
+    the call to the narrator.
+
+    @param db: The database session.
+    @type db: Session
+    @param location_id: The ID of the location.
+    @type location_id: int
+    @param player_id: The ID of the player.
+    @type player_id: int
+
+    @returns: The location, player and agent schemas, the agent prompts and the agent
+        descriptions for the narrator.
+    @rtype: tuple
+    """
+    # Columns are read straight into schemas, built without validation.
+    locations = select_rows(db, LocationSchema, Location, Location.id == location_id)
+    if not locations:
+        raise HTTPException(status_code=404, detail="Location not found")
+    location_schema = LocationSchema.model_construct(**locations[0])
+
+    players = select_rows(db, PlayerSchema, Player, Player.id == player_id)
+    if not players:
         raise HTTPException(status_code=404, detail="Player not found")
+    player_schema = PlayerSchema.model_construct(**players[0])
+
+    # Events without a location are known to everyone.
+    event_schemas = construct_all(
+        EventSchema,
+        select_rows(
+            db,
+            EventSchema,
+            Event,
+            Event.player_id == player_id,
+            Event.location_id.is_(None),
+        ),
+    )
 
-    player_schema = PlayerSchema.from_orm(player)  # Convert to Schema
+    agent_schemas = construct_all(
+        AgentSchema,
+        select_rows(
+            db,
+            AgentSchema,
+            Agent,
+            Agent.location_id == location_id,
+            order_by=[Agent.id],
+        ),
+    )
+    agents_by_id = {agent.id: agent for agent in agent_schemas}
+
+    # What each NPC has witnessed or heard as gossip, precomputed by the gossip worker.
+    event_fields = list(EventSchema.model_fields)
+    heard_events: Dict[int, List[EventSchema]] = defaultdict(list)
+    for agent_id, *event in db.execute(
+        select(AgentKnowledge.agent_id, *schema_columns(EventSchema, Event))
+        .join(Event, Event.id == AgentKnowledge.event_id)
+        .where(
+            AgentKnowledge.agent_id.in_(list(agents_by_id)),
+            Event.player_id == player_id,
+        )
+        .order_by(AgentKnowledge.strength.desc(), Event.id)
+    ):
+        heard_events[agent_id].append(
+            EventSchema.model_construct(**dict(zip(event_fields, event)))
+        )
 
-    player_events = db.query(Event).filter(Event.player_id == model.player_id).all()
-    event_schemas = [EventSchema.from_orm(event) for event in player_events]
+    relationships: Dict[int, List[RelationshipSchema]] = defaultdict(list)
+    for r in construct_all(
+        RelationshipSchema,
+        select_rows(
+            db,
+            RelationshipSchema,
+            Relationship,
+            Relationship.agent_source.in_(list(agents_by_id)),
+            # The order of the index, in which the relations were always listed.
+            order_by=[Relationship.agent_destination, Relationship.id],
+        ),
+    ):
+        relationships[r.agent_source].append(r)
 
-    agents = db.query(Agent).filter(Agent.location_id == model.location_id).all()
-    agent_schemas = [AgentSchema.from_orm(agent) for agent in agents]
     agent_descriptions = []
     agent_prompts = []
     for agent in agent_schemas:
-        agent_relationships = (
-            db.query(Relationship).filter(Relationship.agent_source == agent.id).all()
-        )
-        relationship_schemas = [
-            RelationshipSchema.from_orm(r) for r in agent_relationships
-        ]
         relations: List[RelationshipDescriptor] = []
-        for r in relationship_schemas:
-            schema = next((s for s in agent_schemas if s.id == r.agent_destination), None)
-            
+        for r in relationships[agent.id]:
+            schema = agents_by_id.get(r.agent_destination)
+
             if schema is None:
                 raise ValueError(f"agent_destination {r.agent_destination} not found in agent_schemas")
-            
+
             relations.append(
                 RelationshipDescriptor(
                     destination_character_name=schema.name,
@@ -290,40 +620,240 @@ async def enter_location(model: EnterLocationSchema, db: Session = Depends(get_d
             )
 
         agent_prompt = generate_agent_initialization_prompt(
-            location_schema, agent, relations, player_schema, event_schemas
+            location_schema,
+            agent,
+            relations,
+            player_schema,
+            event_schemas + heard_events[agent.id],
         )
         agent_prompts.append(agent_prompt)
         agent_descriptions.append(
             f"{agent.name};{agent.personality};{agent.background}"
         )
+    return (
+        location_schema,
+        player_schema,
+        agent_schemas,
+        agent_prompts,
+        agent_descriptions,
+    )
+
+
+location_predictor = LocationPredictor()
+prewarm_cache = PrewarmCache(settings.PREWARM_TTL, settings.PREWARM_MAX_ENTRIES)
+
+
+def invalidate_heard_events(player_ids: Set[int]):
+    """
+    Drop the prewarmed location contexts of players whose events NPCs just heard of.
+
+    @param player_ids: The players of the propagated events.
+    @type player_ids: Set[int]
+    """
+    for player_id in player_ids:
+        prewarm_cache.invalidate_player(player_id)
+
+
+prewarmer = Prewarmer(
+    prewarm_cache,
+    location_predictor,
+    build_location_context,
+    settings.PREWARM_FANOUT,
+    settings.PREWARM_WORKERS,
+    settings.PREWARM_QUEUE_SIZE,
+)
+
+
+# Async, the prewarm queue belongs to the event loop.
+@app.post("/prewarm", status_code=status.HTTP_202_ACCEPTED)
+async def prewarm(model: PrewarmSchema):
+    """
+    Build the contexts of the locations a player may enter next in the background,
+    so that `/enterLocation` does not wait for the database, the ledger and the
+    prompt generation.
+
+    @param model: The player, and optionally the locations to prewarm.
+    @type model: PrewarmSchema
+
+    @returns: The locations queued for prewarming.
+    @rtype: dict
+    """
+    location_ids = model.location_ids
+    if location_ids is None:
+        current = location_predictor.current_location(model.player_id)
+        location_ids = (
+            []
+            if current is None
+            else location_predictor.predict(current, settings.PREWARM_FANOUT)
+        )
+    return {"queued": prewarmer.request(model.player_id, location_ids)}
+
+
+@app.post("/enterLocation", status_code=status.HTTP_200_OK)
+async def enter_location(model: EnterLocationSchema, db: Session = Depends(get_db)):
+    """
+    Handle player entering a location.
+
+    @param model: The location entry data.
+    @type model: EnterLocationSchema
+
+    @returns: A list of agent IDs present in the location.
+    @rtype: dict
+    """
+    context = prewarm_cache.pop(model.player_id, model.location_id)
+    if context is None:
+        context = build_location_context(db, model.location_id, model.player_id)
+    location_schema, player_schema, agent_schemas, _, _ = context
+
     try:
-        await httpClient.post(
-            "/initialize",
-            json={
-                "player_id": 0,
-                "narrator_prompt": generate_narrator_prompt(
-                    location_name=location_schema.name,
-                    nearby_npcs=agent_descriptions,
-                    character_description=player_schema,
-                ),
-                "characters": [
-                    {
-                        "agent_id": agent_schema.id,
-                        "name": agent_schema.name,
-                        "init_prompt": agent_prompt,
-                    }
-                    for agent_schema, agent_prompt in zip(agent_schemas, agent_prompts)
-                ],
-            },
+        await initialize_narrator(context)
+    except HTTPException as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error with external API: {e.detail}"
         )
-    except:
-        raise HTTPException(status_code=500, detail=f"Error with external API: {str(e)}")
+
+    location_sessions.open(
+        LocationSession(
+            player=player_schema,
+            location_id=location_schema.id,
+            agent_names={agent.id: agent.name for agent in agent_schemas},
+            narrator_session_id=player_schema.id,
+        )
+    )
+    if npc_ticks is not None:
+        npc_ticks.activate(location_schema.id)
+    prewarmer.entered(player_schema.id, location_schema.id)
 
     return {"agents_ids": [ag.id for ag in agent_schemas]}
 
 
+async def initialize_narrator(context: tuple):
+    """
+    Initialize the player's narrator session for a location.
+
+    @param context: The result of `build_location_context`.
+    @type context: tuple
+
+    @raises HTTPException: When the narrator fails.
+    """
+    (
+        location_schema,
+        player_schema,
+        agent_schemas,
+        agent_prompts,
+        agent_descriptions,
+    ) = context
+    await narrator_initializer.initialize(
+        player_schema.id,
+        generate_narrator_prompt(
+            location_name=location_schema.name,
+            nearby_npcs=agent_descriptions,
+            character_description=player_schema,
+        ),
+        [
+            {
+                "agent_id": agent_schema.id,
+                "name": agent_schema.name,
+                "init_prompt": agent_prompt,
+            }
+            for agent_schema, agent_prompt in zip(agent_schemas, agent_prompts)
+        ],
+    )
+
+
+def load_location_context(location_id: int, player_id: int) -> tuple:
+    """
+    Build a location context in its own database session, off the request's.
+
+    @param location_id: The location ID.
+    @type location_id: int
+
+    @param player_id: The player ID.
+    @type player_id: int
+
+    @returns: The result of `build_location_context`.
+    @rtype: tuple
+    """
+    db = SessionLocal()
+    try:
+        return build_location_context(db, location_id, player_id)
+    finally:
+        db.close()
+
+
+async def take_turn(player_id: int, agent_id: int, message: str) -> dict:
+    """
+    Send a player's message to an agent through the narrator.
+
+    Works against the location session opened by `/enterLocation`, so no
+    database access is needed. Messages sent while the player's previous turn is
+    narrated are coalesced into their next turn, and share its response.
+
+    @param player_id: The player sending the message.
+    @type player_id: int
+
+    @param agent_id: The agent the message is addressed to.
+    @type agent_id: int
+
+    @param message: The message.
+    @type message: str
+
+    @returns: The responding agent's ID and message.
+    @rtype: dict
+    """
+    session = location_sessions.get(player_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Player is not in a location")
+
+    agent_name = session.agent_names.get(agent_id)
+    if agent_name is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if npc_ticks is not None:
+        npc_ticks.activate(session.location_id)
+
+    async def run_turn(player_action: str) -> dict:
+        if npc_ticks is not None:
+            await npc_ticks.wait_for_tick(session.location_id)
+        action = {
+            "player_id": session.narrator_session_id,
+            "player_action": player_action,
+        }
+        try:
+            return await httpClient.post("/action", json=action)
+        except HTTPException as e:
+            if e.status_code != status.HTTP_404_NOT_FOUND:
+                raise
+        # The narrator lost the session: it restarted, or the player's session
+        # moved to another narrator worker. It is initialized there again.
+        await initialize_narrator(
+            await asyncio.to_thread(
+                load_location_context, session.location_id, player_id
+            )
+        )
+        return await httpClient.post("/action", json=action)
+
+    try:
+        response = await turn_admission.submit(
+            player_id,
+            session.narrator_session_id,
+            f"Player says to {agent_name}: {message}",
+            run_turn,
+        )
+    except TurnRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    return {
+        "responder_id": response["agent_id"],
+        "message": response["message"],
+    }
+
+
 @app.post("/say", status_code=status.HTTP_200_OK)
-async def say(model: SaySchema, db: Session = Depends(get_db)):
+async def say(model: SaySchema):
     """
     Handle player interaction with an agent (say a message).
 
@@ -333,33 +863,116 @@ async def say(model: SaySchema, db: Session = Depends(get_db)):
     @returns: The agent's response message.
     @rtype: dict
     """
-    agent = db.query(Agent).filter(Agent.id == model.agent_id).first()
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
+    return await take_turn(model.player_id, model.agent_id, model.message)
 
-    player = db.query(Player).filter(Player.id == model.player_id).first()
-    if not player:
-        raise HTTPException(status_code=404, detail="Player not found")
 
-    agent_schema = AgentSchema.from_orm(agent)  # Convert to Schema
-    response = await httpClient.post(
-        "/action",
-        json={
-            "player_id": model.player_id,
-            "player_action": f"Player says to {agent_schema.name}: {model.message}",
-        },
-    )
+@app.websocket("/ws/{player_id}")
+async def session_channel(websocket: WebSocket, player_id: int):
+    """
+    The player's session channel. It carries the player's messages in and pushes
+    NPC actions out, including the ones nobody asked for.
 
-    return {
-        "responder_id": response["agent_id"],
-        "message": response["message"],
-    }
+    The client sends `{"type": "say", "agent_id", "message", "id"}`. The server
+    answers each with `{"type": "npc_action", "responder_id", "message",
+    "reply_to"}` or `{"type": "error", "status", "detail", "retry_after",
+    "reply_to"}`, `reply_to` being the `id` of the message. Messages of other types
+    are answered with an `error`. NPC actions pushed by the server have no
+    `reply_to`.
+
+    @param websocket: The socket.
+    @type websocket: WebSocket
+
+    @param player_id: The player the channel belongs to.
+    @type player_id: int
+    """
+    # Browsers do not apply CORS to WebSockets, so the origin is checked here.
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in settings.CORS_ORIGINS:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    channel = SessionChannel(player_id, websocket)
+    session_channels.connect(channel)
+    turns = set()
+    try:
+        while True:
+            event = None
+            try:
+                event = await websocket.receive_json()
+                if not isinstance(event, dict):
+                    raise ValueError("not a JSON object")
+                if event.get("type") != "say":
+                    raise ValueError(f"unknown type {event.get('type')!r}")
+                request = SaySchema(
+                    player_id=player_id,
+                    agent_id=event["agent_id"],
+                    message=event["message"],
+                )
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await channel.send(
+                    {
+                        "type": "error",
+                        "status": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        "detail": f"Expected a say message: {e}",
+                        "reply_to": (
+                            event.get("id") if isinstance(event, dict) else None
+                        ),
+                    }
+                )
+                continue
+
+            # Turns run concurrently with the reading of the next messages, so
+            # that they can be coalesced.
+            turn = asyncio.create_task(
+                channel_turn(channel, request, event.get("id"))
+            )
+            turns.add(turn)
+            turn.add_done_callback(turns.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session_channels.disconnect(channel)
+
+
+async def channel_turn(channel: SessionChannel, request: SaySchema, reply_to):
+    """
+    Take a turn for a message received on a session channel and send the answer
+    back to it.
+
+    @param channel: The channel the message came from.
+    @type channel: SessionChannel
+
+    @param request: The message.
+    @type request: SaySchema
+
+    @param reply_to: The client's ID of the message.
+    """
+    try:
+        response = await take_turn(
+            request.player_id, request.agent_id, request.message
+        )
+    except HTTPException as e:
+        retry_after = (e.headers or {}).get("Retry-After")
+        await channel.send(
+            {
+                "type": "error",
+                "status": e.status_code,
+                "detail": e.detail,
+                "retry_after": int(retry_after) if retry_after else None,
+                "reply_to": reply_to,
+            }
+        )
+        return
+    await channel.send({"type": "npc_action", **response, "reply_to": reply_to})
 
 
 @app.post("/leaveLocation", status_code=status.HTTP_200_OK)
-def leave_location(model: LeaveLocationSchema):
+async def leave_location(model: LeaveLocationSchema):
     """
-    Handle player leaving a location.
+    Handle player leaving a location, releasing their location session.
 
     @param model: The player data.
     @type model: LeaveLocationSchema
@@ -367,6 +980,15 @@ def leave_location(model: LeaveLocationSchema):
     @returns: A message indicating the player has left.
     @rtype: dict
     """
+    session = location_sessions.release(model.player_id)
+    if session is not None:
+        try:
+            await httpClient.post(
+                "/release", json={"player_id": session.narrator_session_id}
+            )
+        except HTTPException:
+            # The narrator drops the session on the next `/initialize` anyway.
+            pass
     return {"message": f"Player {model.player_id} left location"}
 
 
@@ -382,7 +1004,7 @@ def get_player_data(id: int, db: Session = Depends(get_db)):
     @rtype: dict
     """
     db_player = db.query(Player).filter(Player.id == id).first()
-    playerData = blockchain_get_player_data(db_player.bc_address)
+    playerData = get_ledger().get_player_data(db_player.bc_address)
     return {"db": db_player, "bc": {"money": playerData[0], "items": playerData[1]}}
 
 
@@ -400,19 +1022,57 @@ def get_player_items(id: int, db: Session = Depends(get_db)):
     db_player = db.query(Player).filter(Player.id == id).first()
     return [
         {"id": item[0], "data": item[1]}
-        for item in blockchain_get_player_items(db_player.bc_address)
+        for item in get_ledger().get_player_items(db_player.bc_address)
+    ]
+
+
+@app.post("/players/profiles", status_code=status.HTTP_200_OK)
+def get_player_profiles(model: PlayerProfilesSchema, db: Session = Depends(get_db)):
+    """
+    Retrieve the database and blockchain data of many players at once.
+
+    All players are loaded with one query and all their blockchain data with one
+    batched RPC request.
+
+    @param model: The player IDs.
+    @type model: PlayerProfilesSchema
+
+    @returns: The profiles of the found players and the IDs that were not found.
+    @rtype: dict
+    """
+    players = db.query(Player).filter(Player.id.in_(model.player_ids)).all()
+    players_by_id = {player.id: player for player in players}
+    found = [
+        players_by_id[id]
+        for id in dict.fromkeys(model.player_ids)
+        if id in players_by_id
     ]
 
+    chain_data = get_ledger().get_player_profiles(
+        [player.bc_address for player in found]
+    )
+    return {
+        "profiles": [
+            {
+                "db": player,
+                "bc": {"money": player_data[0], "items": player_data[1]},
+                "items": [{"id": item[0], "data": item[1]} for item in items],
+            }
+            for player, (player_data, items) in zip(found, chain_data)
+        ],
+        "missing_ids": [id for id in model.player_ids if id not in players_by_id],
+    }
+
 
 @app.get("/events", response_model=List[EventSchema])
-def get_events(db: Session = Depends(get_db)):
+def get_events(request: Request, db: Session = Depends(get_db)):
     """
     Retrieve all events from the database.
 
-    @returns: A list of events.
-    @rtype: List[EventSchema]
+    @returns: A list of events, in MessagePack when the client accepts it.
+    @rtype: Response
     """
-    return db.query(Event).all()
+    return negotiated_response(request, select_rows(db, EventSchema, Event))
 
 
 @app.post("/events", response_model=EventSchema)
@@ -426,10 +1086,14 @@ def create_event(event: EventSchema, db: Session = Depends(get_db)):
     @returns: The created event.
     @rtype: EventSchema
     """
-    db_event = Event(**event.dict())
+    # The gossip worker propagates the events by increasing ID, so an ID picked by
+    # the client could fall behind its checkpoint and never be propagated.
+    db_event = Event(**event.dict(exclude={"id"}))
     db.add(db_event)
     db.commit()
     db.refresh(db_event)
+    # Prewarmed location contexts tell the NPCs about the player's events.
+    prewarm_cache.invalidate_player(db_event.player_id)
     return db_event
 
 
@@ -0,0 +1,79 @@
+"""Baseline schema as previously created by `create_all`
+
+Databases created before migrations were introduced already contain these
+tables, so every table is only created when it is missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-03-29
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create_table(name, *columns, indexes=()):
+    if sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns)
+    for column in indexes:
+        op.create_index(f"ix_{name}_{column}", name, [column])
+
+
+def upgrade():
+    _create_table(
+        "players",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("bc_address", sa.String()),
+        sa.Column("name", sa.String()),
+        sa.Column("race", sa.String()),
+        sa.Column("level", sa.Integer()),
+        indexes=("id", "bc_address", "name", "race", "level"),
+    )
+    _create_table(
+        "locations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        indexes=("id", "name"),
+    )
+    _create_table(
+        "quests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("description", sa.String()),
+        sa.Column("reward", sa.String()),
+        indexes=("id", "name", "description", "reward"),
+    )
+    _create_table(
+        "agents",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("location_id", sa.Integer(), sa.ForeignKey("locations.id")),
+        sa.Column("personality", sa.String()),
+        sa.Column("background", sa.String()),
+        sa.Column("name", sa.String()),
+        indexes=("id", "location_id", "personality", "background", "name"),
+    )
+    _create_table(
+        "events",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("player_id", sa.Integer(), sa.ForeignKey("players.id")),
+        sa.Column("description", sa.String()),
+        indexes=("id", "player_id", "description"),
+    )
+    _create_table(
+        "relationships",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("agent_source", sa.Integer()),
+        sa.Column("agent_destination", sa.Integer()),
+        sa.Column("description", sa.String()),
+        indexes=("id", "agent_source", "agent_destination", "description"),
+    )
+
+
+def downgrade():
+    for name in ("relationships", "events", "agents", "quests", "locations", "players"):
+        op.drop_table(name)
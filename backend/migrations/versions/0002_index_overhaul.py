@@ -0,0 +1,72 @@
+"""Drop write-only indexes, add composite indexes, switch SQLite to WAL
+
+The single-column indexes on primary keys duplicate the rowid index and the
+ones on free-text or low-cardinality columns are never used by a query, they
+only slow down writes. The composite indexes match the lookups done by the
+`/enterLocation` handler in `main.py`.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-03-29
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+DROPPED_INDEXES = {
+    "players": ("id", "race", "level"),
+    "locations": ("id",),
+    "quests": ("id", "description", "reward"),
+    "agents": ("id", "location_id", "personality", "background"),
+    "events": ("id", "player_id", "description"),
+    "relationships": ("id", "agent_source", "description"),
+}
+
+# Leftovers of an early `events` table that was copied from `agents`.
+LEGACY_INDEXES = (
+    "ix_events_location_id",
+    "ix_events_personality",
+    "ix_events_background",
+    "ix_events_name",
+)
+
+COMPOSITE_INDEXES = {
+    "ix_agents_location_id_name": ("agents", ["location_id", "name"]),
+    "ix_events_player_id_id": ("events", ["player_id", "id"]),
+    "ix_relationships_agent_source_agent_destination": (
+        "relationships",
+        ["agent_source", "agent_destination"],
+    ),
+}
+
+
+def upgrade():
+    for table, columns in DROPPED_INDEXES.items():
+        for column in columns:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}")
+    for name in LEGACY_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    for name, (table, columns) in COMPOSITE_INDEXES.items():
+        op.create_index(name, table, columns)
+
+    if op.get_bind().dialect.name == "sqlite":
+        # The journal mode cannot be changed inside a transaction.
+        with op.get_context().autocommit_block():
+            op.execute("PRAGMA journal_mode=WAL")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        with op.get_context().autocommit_block():
+            op.execute("PRAGMA journal_mode=DELETE")
+
+    for name, (table, _) in COMPOSITE_INDEXES.items():
+        op.drop_index(name, table_name=table)
+
+    for table, columns in DROPPED_INDEXES.items():
+        for column in columns:
+            op.create_index(f"ix_{table}_{column}", table, [column])
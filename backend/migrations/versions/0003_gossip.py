@@ -0,0 +1,54 @@
+"""Event locations and precomputed agent knowledge for gossip propagation
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-03-30
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("events")}
+    # Some early databases already have this column on `events`.
+    if "location_id" not in columns:
+        with op.batch_alter_table("events") as batch_op:
+            batch_op.add_column(sa.Column("location_id", sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(
+                "fk_events_location_id", "locations", ["location_id"], ["id"]
+            )
+
+    op.create_table(
+        "agent_knowledge",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("agent_id", sa.Integer(), sa.ForeignKey("agents.id"), nullable=False),
+        sa.Column("event_id", sa.Integer(), sa.ForeignKey("events.id"), nullable=False),
+        sa.Column("hops", sa.Integer(), nullable=False),
+        sa.Column("strength", sa.Float(), nullable=False),
+    )
+    op.create_index(
+        "ix_agent_knowledge_agent_id_event_id",
+        "agent_knowledge",
+        ["agent_id", "event_id"],
+        unique=True,
+    )
+
+    op.create_table(
+        "gossip_checkpoint",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("last_event_id", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("gossip_checkpoint")
+    op.drop_index("ix_agent_knowledge_agent_id_event_id", table_name="agent_knowledge")
+    op.drop_table("agent_knowledge")
+    with op.batch_alter_table("events") as batch_op:
+        batch_op.drop_constraint("fk_events_location_id", type_="foreignkey")
+        batch_op.drop_column("location_id")
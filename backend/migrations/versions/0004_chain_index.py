@@ -0,0 +1,42 @@
+"""Tables materialized from contract logs by the indexer
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-03-31
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "chain_players",
+        sa.Column("address", sa.String(), primary_key=True),
+        sa.Column("money", sa.Integer(), nullable=False),
+        sa.Column("owned_items_num", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "chain_items",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("owner", sa.String(), nullable=False),
+        sa.Column("data", sa.String(), nullable=False),
+        sa.Column("destroyed", sa.Boolean(), nullable=False),
+    )
+    op.create_index("ix_chain_items_owner_id", "chain_items", ["owner", "id"])
+    op.create_table(
+        "indexer_checkpoint",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("last_block", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("indexer_checkpoint")
+    op.drop_index("ix_chain_items_owner_id", table_name="chain_items")
+    op.drop_table("chain_items")
+    op.drop_table("chain_players")
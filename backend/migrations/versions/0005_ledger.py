@@ -0,0 +1,35 @@
+"""Tables of the database ledger backend
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-04-02
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ledger_players",
+        sa.Column("address", sa.String(), primary_key=True),
+        sa.Column("money", sa.Integer(), nullable=False),
+        sa.Column("owned_items_num", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "ledger_items",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("owner", sa.String(), nullable=False),
+        sa.Column("data", sa.String(), nullable=False),
+    )
+    op.create_index("ix_ledger_items_owner_id", "ledger_items", ["owner", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_ledger_items_owner_id", table_name="ledger_items")
+    op.drop_table("ledger_items")
+    op.drop_table("ledger_players")
@@ -0,0 +1,43 @@
+"""Links between locations, used to prewarm the locations players enter next
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-04-04
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "location_links",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "source_location_id",
+            sa.Integer(),
+            sa.ForeignKey("locations.id"),
+            nullable=False,
+        ),
+        sa.Column(
+            "destination_location_id",
+            sa.Integer(),
+            sa.ForeignKey("locations.id"),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        "ix_location_links_source_destination",
+        "location_links",
+        ["source_location_id", "destination_location_id"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_location_links_source_destination", table_name="location_links")
+    op.drop_table("location_links")
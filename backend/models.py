@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -16,11 +16,11 @@ class Player(Base):
         level (int): The level of the player, which indicates their progress in the game.
     """
     __tablename__ = "players"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     bc_address = Column(String, index=True)
     name = Column(String, index=True)
-    race = Column(String, index=True)
-    level = Column(Integer, index=True)
+    race = Column(String)
+    level = Column(Integer)
 
 
 class Location(Base):
@@ -32,10 +32,36 @@ class Location(Base):
         name (str): The name of the location.
     """
     __tablename__ = "locations"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
 
 
+class LocationLink(Base):
+    """
+    Represents a way from one location to another, used to predict where a player
+    goes next.
+
+    Attributes:
+        id (int): The unique identifier for the link.
+        source_location_id (int): The ID of the location the way starts from.
+        destination_location_id (int): The ID of the location the way leads to.
+    """
+    __tablename__ = "location_links"
+    __table_args__ = (
+        Index(
+            "ix_location_links_source_destination",
+            "source_location_id",
+            "destination_location_id",
+            unique=True,
+        ),
+    )
+    id = Column(Integer, primary_key=True)
+    source_location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
+    destination_location_id = Column(
+        Integer, ForeignKey("locations.id"), nullable=False
+    )
+
+
 class Quest(Base):
     """
     Represents a quest in the game.
@@ -47,10 +73,10 @@ class Quest(Base):
         reward (str): The reward given upon completing the quest.
     """
     __tablename__ = "quests"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
-    description = Column(String, index=True)
-    reward = Column(String, index=True)
+    description = Column(String)
+    reward = Column(String)
 
 
 class Agent(Base):
@@ -65,10 +91,11 @@ class Agent(Base):
         name (str): The name of the agent.
     """
     __tablename__ = "agents"
-    id = Column(Integer, primary_key=True, index=True)
-    location_id = Column(Integer, ForeignKey("locations.id"), index=True)
-    personality = Column(String, index=True)
-    background = Column(String, index=True)
+    __table_args__ = (Index("ix_agents_location_id_name", "location_id", "name"),)
+    id = Column(Integer, primary_key=True)
+    location_id = Column(Integer, ForeignKey("locations.id"))
+    personality = Column(String)
+    background = Column(String)
     name = Column(String, index=True)
 
 
@@ -79,12 +106,17 @@ class Event(Base):
     Attributes:
         id (int): The unique identifier for the event.
         player_id (int): The foreign key linking the event to a specific player.
+        location_id (int): The location where the event happened. Agents there
+            witness it and spread it as gossip, events without a location are known
+            to everyone.
         description (str): A description of the event.
     """
     __tablename__ = "events"
-    id = Column(Integer, primary_key=True, index=True)
-    player_id = Column(Integer, ForeignKey("players.id"), index=True)
-    description = Column(String, index=True)
+    __table_args__ = (Index("ix_events_player_id_id", "player_id", "id"),)
+    id = Column(Integer, primary_key=True)
+    player_id = Column(Integer, ForeignKey("players.id"))
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True)
+    description = Column(String)
 
 
 class Relationship(Base):
@@ -98,7 +130,132 @@ class Relationship(Base):
         description (str): A description of the nature of the relationship.
     """
     __tablename__ = "relationships"
-    id = Column(Integer, primary_key=True, index=True)
-    agent_source = Column(Integer, index=True)
+    __table_args__ = (
+        Index(
+            "ix_relationships_agent_source_agent_destination",
+            "agent_source",
+            "agent_destination",
+        ),
+    )
+    id = Column(Integer, primary_key=True)
+    agent_source = Column(Integer)
     agent_destination = Column(Integer, index=True)
-    description = Column(String, index=True)
+    description = Column(String)
+
+
+class AgentKnowledge(Base):
+    """
+    Represents an event that an agent has heard about, precomputed by gossip
+    propagation.
+
+    Attributes:
+        id (int): The unique identifier for the knowledge entry.
+        agent_id (int): The agent that knows about the event.
+        event_id (int): The event the agent knows about.
+        hops (int): How many relationships the news travelled through, 0 for witnesses.
+        strength (float): How reliable the news is, decaying with every hop.
+    """
+    __tablename__ = "agent_knowledge"
+    __table_args__ = (
+        Index(
+            "ix_agent_knowledge_agent_id_event_id", "agent_id", "event_id", unique=True
+        ),
+    )
+    id = Column(Integer, primary_key=True)
+    agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
+    event_id = Column(Integer, ForeignKey("events.id"), nullable=False)
+    hops = Column(Integer, nullable=False)
+    strength = Column(Float, nullable=False)
+
+
+class GossipCheckpoint(Base):
+    """
+    Tracks how far gossip propagation has processed the events table.
+
+    Attributes:
+        id (int): The unique identifier, there is a single row.
+        last_event_id (int): The highest event ID that has been propagated.
+    """
+    __tablename__ = "gossip_checkpoint"
+    id = Column(Integer, primary_key=True)
+    last_event_id = Column(Integer, nullable=False, default=-1)
+
+
+class ChainPlayer(Base):
+    """
+    Represents a player's state on the blockchain, materialized by the log indexer.
+
+    Attributes:
+        address (str): The checksummed blockchain address of the player.
+        money (int): The player's balance.
+        owned_items_num (int): The number of items the player owns.
+    """
+    __tablename__ = "chain_players"
+    address = Column(String, primary_key=True)
+    money = Column(Integer, nullable=False, default=0)
+    owned_items_num = Column(Integer, nullable=False, default=0)
+
+
+class ChainItem(Base):
+    """
+    Represents an item on the blockchain, materialized by the log indexer.
+
+    Attributes:
+        id (int): The item ID in the contract.
+        owner (str): The checksummed address of the owner, the zero address once
+            destroyed.
+        data (str): The item data, empty once destroyed.
+        destroyed (bool): Whether the item has been destroyed.
+    """
+    __tablename__ = "chain_items"
+    __table_args__ = (Index("ix_chain_items_owner_id", "owner", "id"),)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String, nullable=False)
+    data = Column(String, nullable=False)
+    destroyed = Column(Boolean, nullable=False, default=False)
+
+
+class IndexerCheckpoint(Base):
+    """
+    Tracks up to which block the contract logs have been indexed.
+
+    Attributes:
+        id (int): The unique identifier, there is a single row.
+        last_block (int): The last block whose logs have been applied.
+    """
+    __tablename__ = "indexer_checkpoint"
+    id = Column(Integer, primary_key=True)
+    last_block = Column(Integer, nullable=False)
+
+
+class LedgerPlayer(Base):
+    """
+    Represents a player's account in the database ledger, used instead of the
+    contract when `LEDGER_BACKEND` is `database`.
+
+    Attributes:
+        address (str): The checksummed blockchain address of the player.
+        money (int): The player's balance.
+        owned_items_num (int): The number of items the player owns.
+    """
+    __tablename__ = "ledger_players"
+    address = Column(String, primary_key=True)
+    money = Column(Integer, nullable=False, default=0)
+    owned_items_num = Column(Integer, nullable=False, default=0)
+
+
+class LedgerItem(Base):
+    """
+    Represents an item in the database ledger. Like in the contract, a destroyed
+    item keeps its ID with empty data and the zero address as owner.
+
+    Attributes:
+        id (int): The item ID, assigned sequentially from 0.
+        owner (str): The checksummed address of the owner.
+        data (str): The item data.
+    """
+    __tablename__ = "ledger_items"
+    __table_args__ = (Index("ix_ledger_items_owner_id", "owner", "id"),)
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String, nullable=False)
+    data = Column(String, nullable=False)
@@ -0,0 +1,139 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List
+
+from fastapi import HTTPException, status
+
+from http_client import HttpClient
+from telemetry import NARRATOR_INITS
+
+NARRATOR_PROMPT_KEY = "narrator"
+
+
+def content_hash(content: str) -> str:
+    """
+    Hash naming a version of a prompt, the same as the narrator's.
+
+    Args:
+        content (str): The prompt.
+
+    Returns:
+        str: The SHA-256 of the prompt, in hexadecimal.
+    """
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class NarratorInitializer:
+    """
+    Initializes narrator sessions, sending only the prompts that changed since the
+    session last accepted them. Re-entering a location where nothing changed sends
+    hashes only, and the narrator initializes no agent.
+
+    When the narrator does not have a version left out, e.g. after a restart, it
+    answers `409` and the prompts are sent again in full. The hashes of the least
+    recently initialized sessions are dropped beyond `max_sessions`, these sessions
+    are then initialized in full.
+
+    Args:
+        client (HttpClient): The client of the narrator.
+        max_sessions (int): The number of sessions whose hashes are kept.
+    """
+
+    def __init__(self, client: HttpClient, max_sessions: int = 10000):
+        self.client = client
+        self.max_sessions = max_sessions
+        # Hashes of the prompts each narrator session accepted, by session ID, the
+        # most recently initialized last.
+        self._accepted: "OrderedDict[int, Dict[str, str]]" = OrderedDict()
+
+    async def initialize(
+        self, session_id: int, narrator_prompt: str, characters: List[dict]
+    ) -> dict:
+        """
+        Initialize a narrator session.
+
+        Args:
+            session_id (int): The narrator session ID.
+            narrator_prompt (str): The narrator prompt.
+            characters (List[dict]): The characters, with their `agent_id`, `name`
+                and `init_prompt`.
+
+        Returns:
+            dict: The narrator's answer.
+
+        Raises:
+            HTTPException: When the narrator fails.
+        """
+        hashes = {NARRATOR_PROMPT_KEY: content_hash(narrator_prompt)}
+        for character in characters:
+            hashes[str(character["agent_id"])] = content_hash(character["init_prompt"])
+        accepted = self._accepted.get(session_id, {})
+
+        unchanged = {key for key, value in hashes.items() if accepted.get(key) == value}
+        try:
+            try:
+                response = await self.client.post(
+                    "/initialize",
+                    json=self.payload(
+                        session_id, narrator_prompt, characters, hashes, unchanged
+                    ),
+                )
+            except HTTPException as e:
+                if e.status_code != status.HTTP_409_CONFLICT or not unchanged:
+                    raise
+                NARRATOR_INITS.labels("resent").inc()
+                unchanged = set()
+                response = await self.client.post(
+                    "/initialize",
+                    json=self.payload(
+                        session_id, narrator_prompt, characters, hashes, unchanged
+                    ),
+                )
+        except HTTPException:
+            # The session may be half initialized, the next time everything is sent.
+            self._accepted.pop(session_id, None)
+            raise
+
+        if len(unchanged) == len(hashes):
+            NARRATOR_INITS.labels("unchanged").inc()
+        elif unchanged:
+            NARRATOR_INITS.labels("partial").inc()
+        else:
+            NARRATOR_INITS.labels("full").inc()
+        self._accepted[session_id] = hashes
+        self._accepted.move_to_end(session_id)
+        while len(self._accepted) > self.max_sessions:
+            self._accepted.popitem(last=False)
+        return response
+
+    @staticmethod
+    def payload(
+        session_id: int,
+        narrator_prompt: str,
+        characters: List[dict],
+        hashes: Dict[str, str],
+        unchanged: set,
+    ) -> dict:
+        """
+        Build the `/initialize` request, leaving out the unchanged prompts.
+        """
+        return {
+            "player_id": session_id,
+            "narrator_prompt": (
+                None if NARRATOR_PROMPT_KEY in unchanged else narrator_prompt
+            ),
+            "narrator_prompt_hash": hashes[NARRATOR_PROMPT_KEY],
+            "characters": [
+                {
+                    "agent_id": character["agent_id"],
+                    "name": character["name"],
+                    "init_prompt": (
+                        None
+                        if str(character["agent_id"]) in unchanged
+                        else character["init_prompt"]
+                    ),
+                    "init_prompt_hash": hashes[str(character["agent_id"])],
+                }
+                for character in characters
+            ],
+        }
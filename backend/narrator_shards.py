@@ -0,0 +1,165 @@
+import bisect
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends
+from observability.profiling import admin_token_dependency
+from pydantic import BaseModel, Field
+
+from http_client import HttpClient
+from telemetry import NARRATOR_SHARD_REQUESTS
+
+# Points of each member on the ring, more spread the sessions more evenly.
+RING_REPLICAS = 160
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring of members. Each member owns the keys hashing between its
+    points and the previous ones, so adding a member moves only the keys it takes
+    over, about `1 / len(members)` of them, and removing one moves only its own.
+
+    Args:
+        members (List[str]): The members.
+        replicas (int): The points of each member on the ring.
+    """
+
+    def __init__(self, members: List[str], replicas: int = RING_REPLICAS):
+        if not members:
+            raise ValueError("A hash ring needs at least one member")
+        self.members = list(dict.fromkeys(members))
+        points = sorted(
+            (ring_hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: str) -> str:
+        """
+        Get the member owning a key.
+
+        Args:
+            key (str): The key.
+
+        Returns:
+            str: The member of the first point after the key's hash.
+        """
+        i = bisect.bisect(self._hashes, ring_hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+class ShardedHttpClient:
+    """
+    Client of narrator workers each owning a slice of the player sessions, with the
+    interface of `HttpClient`.
+
+    A request goes to the worker owning the `player_id` of its body. A request for
+    a location, such as `/tick`, goes to the worker owning its `location_id`, which
+    reads the sessions of the other workers' players from the shared session store.
+    Other requests go to the first worker.
+
+    Changing the members rebuilds the ring, moving the sessions of about
+    `1 / len(members)` of the players. A worker answers `404` to the turns of the
+    sessions it does not have, and the backend then initializes them there again.
+    With the narrators on a shared session store, the moved sessions keep their
+    dialogue.
+
+    Args:
+        urls (List[str]): The base URLs of the narrator workers.
+        timeout (int): The request timeout in seconds.
+    """
+
+    def __init__(self, urls: List[str], timeout: int = 60):
+        self.timeout = timeout
+        self.set_members(urls)
+
+    @property
+    def members(self) -> List[str]:
+        return self._shards[0].members
+
+    def set_members(self, urls: List[str]):
+        """
+        Replace the narrator workers, for this client only: other backend processes
+        keep their own.
+
+        Args:
+            urls (List[str]): The base URLs of the narrator workers.
+        """
+        ring = HashRing(urls)
+        clients = {
+            url: HttpClient(base_url=url, timeout=self.timeout) for url in ring.members
+        }
+        # Swapped at once, requests in flight keep the members they started with.
+        self._shards = (ring, clients)
+
+    def shard(self, json: Optional[Dict[str, Any]] = None) -> HttpClient:
+        """
+        Get the client of the worker a request body goes to.
+
+        Args:
+            json (Optional[Dict[str, Any]]): The request body.
+
+        Returns:
+            HttpClient: The client of the worker.
+        """
+        ring, clients = self._shards
+        json = json or {}
+        if "player_id" in json:
+            member = ring.owner(str(json["player_id"]))
+        elif "location_id" in json:
+            member = ring.owner(f"location:{json['location_id']}")
+        else:
+            member = ring.members[0]
+        NARRATOR_SHARD_REQUESTS.labels(member).inc()
+        return clients[member]
+
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> dict:
+        return await self.shard().get(url, params=params)
+
+    async def post(
+        self,
+        url: str,
+        data: Optional[Dict[str, Any]] = None,
+        json: Optional[Dict[str, Any]] = None,
+    ) -> dict:
+        return await self.shard(json).post(url, data=data, json=json)
+
+
+class NarratorShards(BaseModel):
+    urls: List[str] = Field(min_length=1)
+
+
+def create_shards_router(client: ShardedHttpClient, admin_token: str) -> APIRouter:
+    """
+    Creates the endpoints changing the narrator workers, under `/admin/narrator/shards`.
+
+    They require the `X-Admin-Token` header to match `admin_token`, and answer
+    `404` when no token is configured.
+    """
+    router = APIRouter(
+        prefix="/admin/narrator/shards",
+        dependencies=[Depends(admin_token_dependency(admin_token))],
+    )
+
+    @router.get("", response_model=NarratorShards)
+    def get_shards():
+        """
+        Returns the narrator workers.
+        """
+        return NarratorShards(urls=client.members)
+
+    @router.put("", response_model=NarratorShards)
+    async def set_shards(shards: NarratorShards):
+        """
+        Replaces the narrator workers of this backend process, rebalancing the sessions.
+        """
+        client.set_members(shards.urls)
+        return NarratorShards(urls=client.members)
+
+    return router
@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from observability.telemetry import NPC_TICKS
+
+from admission import TurnAdmission
+from location_sessions import LocationSession, LocationSessionStore
+from session_channels import SessionChannelHub
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Rate limit of `rate` tokens per second, allowing bursts of `capacity` tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take a token.
+
+        Returns:
+            float: 0 if the token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class TickScheduler:
+    """
+    Lets the NPCs of the active locations act on their own, every `interval` seconds.
+
+    Locations are kept in a priority queue by the time of their next tick. A location
+    enters it when a player enters or speaks in it, and leaves it at its first tick
+    without active players: players with an open session channel who spoke or entered
+    within `idle_after` seconds. Idle locations cost nothing, and a tick is a single
+    narrator call for all the players of a location, so the cost follows the active
+    locations, not the size of the world. The ticks of all locations share a budget of
+    `budget` LLM calls per second.
+
+    Args:
+        interval (float): Seconds between the ticks of a location.
+        budget (float): LLM calls per second spent on ticks, over all locations.
+        idle_after (float): Seconds without player activity after which a location
+            stops ticking.
+        sessions (LocationSessionStore): The location sessions.
+        channels (SessionChannelHub): Where the NPC actions are pushed.
+        admission (TurnAdmission): Locations are not ticked while a player's turn
+            is in flight there.
+        tick (Callable[[int, List[int]], Awaitable[Optional[dict]]]): Runs a tick of
+            a location for the given narrator sessions and returns the NPC action,
+            None when there is none. Every tick takes one token of the budget.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        budget: float,
+        idle_after: float,
+        sessions: LocationSessionStore,
+        channels: SessionChannelHub,
+        admission: TurnAdmission,
+        tick: Callable[[int, List[int]], Awaitable[Optional[dict]]],
+    ):
+        self.interval = interval
+        self.idle_after = idle_after
+        self.sessions = sessions
+        self.channels = channels
+        self.admission = admission
+        self.tick = tick
+        self.budget = TokenBucket(budget, max(1.0, budget))
+        self._queue: List[Tuple[float, int]] = []
+        # Locations in the queue or ticking.
+        self._scheduled: Set[int] = set()
+        # Ticks in flight by location.
+        self._ticks: Dict[int, asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+
+    def activate(self, location_id: int):
+        """
+        Schedule the first tick of a location, unless it is already scheduled.
+
+        Args:
+            location_id (int): The location a player entered or spoke in.
+        """
+        if location_id in self._scheduled:
+            return
+        self._schedule(location_id, time.monotonic() + self.interval)
+
+    async def wait_for_tick(self, location_id: int):
+        """
+        Wait for the tick of a location in flight, if any. Player turns wait for it,
+        so that the narrator does not take a turn and a tick of the same players at
+        once, and no new tick starts while a turn is admitted.
+
+        Args:
+            location_id (int): The location of the player taking a turn.
+        """
+        task = self._ticks.get(location_id)
+        if task is not None:
+            # Not cancelled along with the turn, and never raising.
+            await asyncio.wait({task})
+
+    def _schedule(self, location_id: int, due: float):
+        self._scheduled.add(location_id)
+        heapq.heappush(self._queue, (due, location_id))
+        self._wakeup.set()
+
+    def active_players(self, location_id: int) -> List[LocationSession]:
+        now = time.monotonic()
+        return [
+            session
+            for session in self.sessions.in_location(location_id)
+            if now - session.last_active <= self.idle_after
+            and self.channels.is_connected(session.player.id)
+        ]
+
+    async def run(self):
+        """
+        Runs the due ticks until cancelled.
+        """
+        while True:
+            self._wakeup.clear()
+            if not self._queue:
+                await self._wakeup.wait()
+                continue
+            due, location_id = self._queue[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._queue)
+            players = self.active_players(location_id)
+            if not players:
+                self._scheduled.discard(location_id)
+                NPC_TICKS.labels("idle").inc()
+                continue
+            if any(session.player.id in self.admission.players for session in players):
+                # The NPCs are answering a player already.
+                self._schedule(location_id, time.monotonic() + self.interval)
+                NPC_TICKS.labels("busy").inc()
+                continue
+            wait = self.budget.take()
+            if wait:
+                # Out of budget, the location keeps its place so that the most
+                # overdue one goes first when the budget refills.
+                heapq.heappush(self._queue, (due, location_id))
+                NPC_TICKS.labels("deferred").inc()
+                await asyncio.sleep(wait)
+                continue
+            task = asyncio.create_task(self._tick(location_id, players))
+            self._ticks[location_id] = task
+            task.add_done_callback(
+                lambda _, location_id=location_id: self._ticks.pop(location_id, None)
+            )
+
+    async def _tick(self, location_id: int, players: List[LocationSession]):
+        try:
+            action = await self.tick(
+                location_id, [session.narrator_session_id for session in players]
+            )
+        except Exception as e:
+            logger.warning(f"NPC tick of location {location_id} failed: {e}")
+            NPC_TICKS.labels("error").inc()
+        else:
+            NPC_TICKS.labels("action" if action else "silence").inc()
+            if action:
+                event = {
+                    "type": "npc_action",
+                    "responder_id": action["agent_id"],
+                    "message": action["message"],
+                }
+                await asyncio.gather(
+                    *(
+                        self.channels.push(session.player.id, event)
+                        for session in players
+                    )
+                )
+        # The next tick is counted from the end of this one, so that a slow narrator
+        # does not pile up ticks of the same location.
+        self._schedule(location_id, time.monotonic() + self.interval)
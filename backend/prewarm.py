@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import LocationLink
+from telemetry import PREWARM_LOOKUPS, PREWARM_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class LocationPredictor:
+    """
+    Predicts the locations a player enters next, from the links between locations
+    and the moves players made so far.
+    """
+
+    def __init__(self):
+        self._links: Dict[int, Set[int]] = defaultdict(set)
+        self._moves: Dict[int, Counter] = defaultdict(Counter)
+        self._last_location: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def load(self, db: Session):
+        """
+        Load the links between locations from the database.
+
+        Args:
+            db (Session): The database session.
+        """
+        links = defaultdict(set)
+        for source, destination in db.query(
+            LocationLink.source_location_id, LocationLink.destination_location_id
+        ):
+            links[source].add(destination)
+        with self._lock:
+            self._links = links
+
+    def add_link(self, source: int, destination: int):
+        with self._lock:
+            self._links[source].add(destination)
+
+    def observe(self, player_id: int, location_id: int):
+        """
+        Record that a player entered a location, counting the move from the previous one.
+
+        Args:
+            player_id (int): The player ID.
+            location_id (int): The location the player entered.
+        """
+        with self._lock:
+            previous = self._last_location.get(player_id)
+            self._last_location[player_id] = location_id
+            if previous is not None and previous != location_id:
+                self._moves[previous][location_id] += 1
+
+    def current_location(self, player_id: int) -> Optional[int]:
+        return self._last_location.get(player_id)
+
+    def predict(self, location_id: int, limit: int) -> List[int]:
+        """
+        Get the locations most likely entered next from a location.
+
+        Args:
+            location_id (int): The location the player is in.
+            limit (int): The number of locations to return.
+
+        Returns:
+            List[int]: The linked and previously reached locations, the most taken
+            moves first.
+        """
+        with self._lock:
+            moves = self._moves.get(location_id, Counter())
+            candidates = self._links.get(location_id, set()) | set(moves)
+            candidates.discard(location_id)
+            return sorted(candidates, key=lambda l: (-moves[l], l))[:limit]
+
+
+class PrewarmCache:
+    """
+    Location contexts built ahead of `/enterLocation`, by player and location.
+
+    Entries expire after `ttl` seconds, which bounds how stale a prewarmed context
+    can be, and the least recently built are dropped beyond `max_entries`.
+
+    Args:
+        ttl (float): Seconds an entry stays usable.
+        max_entries (int): The number of entries kept.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[float, tuple]]" = (
+            OrderedDict()
+        )
+        # Bumped when the data of a player or a location changes, so that builds
+        # started before are dropped.
+        self._player_generations: Dict[int, int] = defaultdict(int)
+        self._location_generations: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def generation(self, player_id: int, location_id: int) -> Tuple[int, int]:
+        return (
+            self._player_generations[player_id],
+            self._location_generations[location_id],
+        )
+
+    def contains(self, player_id: int, location_id: int) -> bool:
+        with self._lock:
+            entry = self._entries.get((player_id, location_id))
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    def put(
+        self,
+        player_id: int,
+        location_id: int,
+        generation: Tuple[int, int],
+        context: tuple,
+    ):
+        """
+        Store a built context, unless the data of the player or the location changed
+        since the build started.
+
+        Args:
+            player_id (int): The player ID.
+            location_id (int): The location ID.
+            generation (Tuple[int, int]): The generation when the build started.
+            context (tuple): The result of `build_location_context`.
+        """
+        with self._lock:
+            if self.generation(player_id, location_id) != generation:
+                return
+            self._entries[(player_id, location_id)] = (time.monotonic(), context)
+            self._entries.move_to_end((player_id, location_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, player_id: int, location_id: int) -> Optional[tuple]:
+        """
+        Take the context of a location, counting the lookup as a hit, miss or stale.
+
+        Args:
+            player_id (int): The player ID.
+            location_id (int): The location ID.
+
+        Returns:
+            Optional[tuple]: The context, or None if there is no fresh one.
+        """
+        with self._lock:
+            entry = self._entries.pop((player_id, location_id), None)
+        if entry is None:
+            PREWARM_LOOKUPS.labels("miss").inc()
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            PREWARM_LOOKUPS.labels("stale").inc()
+            return None
+        PREWARM_LOOKUPS.labels("hit").inc()
+        return entry[1]
+
+    def invalidate_player(self, player_id: int):
+        """
+        Drop the contexts of a player, whose data changed.
+
+        Args:
+            player_id (int): The player ID.
+        """
+        with self._lock:
+            self._player_generations[player_id] += 1
+            for key in [key for key in self._entries if key[0] == player_id]:
+                del self._entries[key]
+
+    def invalidate_location(self, location_id: int):
+        """
+        Drop the contexts of a location, whose NPCs changed.
+
+        Args:
+            location_id (int): The location ID.
+        """
+        with self._lock:
+            self._location_generations[location_id] += 1
+            for key in [key for key in self._entries if key[1] == location_id]:
+                del self._entries[key]
+
+
+class Prewarmer:
+    """
+    Builds the contexts of the locations players are likely to enter next in the
+    background, so that `/enterLocation` finds them in the cache.
+
+    Args:
+        cache (PrewarmCache): Where the contexts are stored.
+        predictor (LocationPredictor): Predicts the next locations.
+        build (Callable[[Session, int, int], tuple]): Builds the context of a location
+            for a player, `build_location_context`.
+        fanout (int): The number of predicted locations prewarmed after each move.
+        workers (int): The number of contexts built at once.
+        queue_size (int): Prewarm requests waiting beyond this are dropped.
+    """
+
+    def __init__(
+        self,
+        cache: PrewarmCache,
+        predictor: LocationPredictor,
+        build: Callable[[Session, int, int], tuple],
+        fanout: int,
+        workers: int,
+        queue_size: int,
+    ):
+        self.cache = cache
+        self.predictor = predictor
+        self.build = build
+        self.fanout = fanout
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._pending: Set[Tuple[int, int]] = set()
+
+    def request(self, player_id: int, location_ids: Iterable[int]) -> List[int]:
+        """
+        Queue the contexts of locations to be built for a player, from the event loop.
+
+        Args:
+            player_id (int): The player ID.
+            location_ids (Iterable[int]): The locations.
+
+        Returns:
+            List[int]: The locations queued, without the ones already cached or queued.
+        """
+        queued = []
+        for location_id in location_ids:
+            key = (player_id, location_id)
+            if key in self._pending or self.cache.contains(*key):
+                PREWARM_REQUESTS.labels("cached").inc()
+                continue
+            try:
+                self._queue.put_nowait(key)
+            except asyncio.QueueFull:
+                PREWARM_REQUESTS.labels("dropped").inc()
+                continue
+            self._pending.add(key)
+            PREWARM_REQUESTS.labels("queued").inc()
+            queued.append(location_id)
+        return queued
+
+    def entered(self, player_id: int, location_id: int) -> List[int]:
+        """
+        Record that a player entered a location and prewarm where they may go next.
+
+        Args:
+            player_id (int): The player ID.
+            location_id (int): The location entered.
+
+        Returns:
+            List[int]: The locations queued.
+        """
+        self.predictor.observe(player_id, location_id)
+        if self.fanout <= 0:
+            return []
+        return self.request(player_id, self.predictor.predict(location_id, self.fanout))
+
+    async def run(self):
+        """
+        Runs the workers building the queued contexts until cancelled.
+        """
+        await asyncio.gather(*(self._work() for _ in range(self.workers)))
+
+    async def _work(self):
+        while True:
+            player_id, location_id = await self._queue.get()
+            try:
+                await asyncio.to_thread(self._build, player_id, location_id)
+            except Exception as e:
+                logger.warning(
+                    f"Prewarming location {location_id} for player {player_id} failed: {e}"
+                )
+                PREWARM_REQUESTS.labels("error").inc()
+            finally:
+                self._pending.discard((player_id, location_id))
+
+    def _build(self, player_id: int, location_id: int):
+        generation = self.cache.generation(player_id, location_id)
+        db = SessionLocal()
+        try:
+            context = self.build(db, location_id, player_id)
+        finally:
+            db.close()
+        self.cache.put(player_id, location_id, generation, context)
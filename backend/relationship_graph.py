@@ -0,0 +1,258 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Relationship
+
+# Edges added after the last build are kept in a small side buffer and merged
+# into the CSR arrays once the buffer grows past this size.
+PENDING_EDGES_LIMIT = 4096
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+class RelationshipGraph:
+    """
+    In-memory directed graph of agent relationships in compressed sparse row form.
+
+    Agents are mapped to dense node indices. The out-edges of node `i` are
+    `indices[indptr[i]:indptr[i + 1]]`, which keeps neighbor lookups O(degree)
+    and lets BFS expand a whole frontier with vectorized NumPy operations.
+
+    Attributes:
+        ids (np.ndarray): Agent id of every dense node index.
+        indptr (np.ndarray): Row offsets into `indices`, one per built node plus one.
+        indices (np.ndarray): Destination node indices, sorted within each row.
+    """
+
+    # `indptr` and `indices` are swapped together so that readers running next
+    # to a writer always see a consistent pair.
+    indptr = property(lambda self: self._csr[0])
+    indices = property(lambda self: self._csr[1])
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._node_of: Dict[int, int] = {}
+        self.ids = EMPTY
+        self._csr = (np.zeros(1, dtype=np.int64), EMPTY)
+        self._pending: List[Tuple[int, int]] = []
+
+    @classmethod
+    def from_edges(cls, sources: Iterable[int], destinations: Iterable[int]):
+        """
+        Build a graph from parallel sequences of source and destination agent ids.
+
+        Args:
+            sources (Iterable[int]): Source agent id of every edge.
+            destinations (Iterable[int]): Destination agent id of every edge.
+
+        Returns:
+            RelationshipGraph: The built graph.
+        """
+        graph = cls()
+        graph._build(
+            np.asarray(sources, dtype=np.int64),
+            np.asarray(destinations, dtype=np.int64),
+        )
+        return graph
+
+    def load(self, db: Session):
+        """
+        Rebuild the graph from the `relationships` table.
+
+        Args:
+            db (Session): The database session.
+        """
+        rows = db.execute(
+            select(Relationship.agent_source, Relationship.agent_destination).where(
+                Relationship.agent_source.is_not(None),
+                Relationship.agent_destination.is_not(None),
+            )
+        ).all()
+        edges = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        self._build(edges[:, 0], edges[:, 1])
+
+    @property
+    def num_agents(self) -> int:
+        return len(self._node_of)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices) + len(self._pending)
+
+    def add_edge(self, source: int, destination: int):
+        """
+        Add a single relationship edge without rebuilding the whole graph.
+
+        Args:
+            source (int): The source agent id.
+            destination (int): The destination agent id.
+        """
+        with self._lock:
+            self._pending.append((self._node(source), self._node(destination)))
+            if len(self._pending) >= PENDING_EDGES_LIMIT:
+                self._compact()
+
+    def neighbors(self, agent_id: int) -> np.ndarray:
+        """
+        Get the agents that the given agent has a relationship with.
+
+        Args:
+            agent_id (int): The agent id.
+
+        Returns:
+            np.ndarray: Agent ids of the direct neighbors.
+        """
+        node = self._node_of.get(agent_id)
+        if node is None:
+            return EMPTY
+        return self.ids[np.unique(self._expand(np.array([node], dtype=np.int64)))]
+
+    def bfs(
+        self, agent_id: int, max_depth: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Breadth-first traversal along relationship edges.
+
+        Args:
+            agent_id (int): The agent id to start from.
+            max_depth (Optional[int]): Stop after this many hops, unbounded if None.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Agent ids of every reached agent, including
+            the start, and their hop distance from the start.
+        """
+        node = self._node_of.get(agent_id)
+        if node is None:
+            return EMPTY, EMPTY
+
+        # Agents added by a concurrent writer are not visited by this traversal.
+        visited = np.zeros(len(self.ids), dtype=bool)
+        visited[node] = True
+        frontier = np.array([node], dtype=np.int64)
+        levels = [frontier]
+        depth = 0
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            reached = np.unique(self._expand(frontier))
+            reached = reached[reached < len(visited)]
+            frontier = reached[~visited[reached]]
+            visited[frontier] = True
+            levels.append(frontier)
+            depth += 1
+
+        nodes = np.concatenate(levels)
+        depths = np.repeat(
+            np.arange(len(levels), dtype=np.int64), [len(level) for level in levels]
+        )
+        return self.ids[nodes], depths
+
+    def k_hop(self, agent_id: int, k: int) -> np.ndarray:
+        """
+        Get every agent reachable from the given agent within `k` hops.
+
+        Args:
+            agent_id (int): The agent id to start from.
+            k (int): The maximum number of hops.
+
+        Returns:
+            np.ndarray: Agent ids of the reached agents, excluding the start.
+        """
+        reached, depths = self.bfs(agent_id, max_depth=k)
+        return reached[depths > 0]
+
+    def node_indices(self, agent_ids: Iterable[int]) -> np.ndarray:
+        """
+        Map agent ids to dense node indices, -1 for agents without relationships.
+
+        Args:
+            agent_ids (Iterable[int]): The agent ids.
+
+        Returns:
+            np.ndarray: The node index of every agent.
+        """
+        return np.array(
+            [self._node_of.get(agent_id, -1) for agent_id in agent_ids], dtype=np.int64
+        )
+
+    def adjacency(self) -> sp.csr_matrix:
+        """
+        Get the graph as a SciPy sparse matrix with `A[i, j] = 1` for an edge i -> j.
+
+        Pending edges are merged first so the matrix covers every known edge.
+
+        Returns:
+            sp.csr_matrix: The square adjacency matrix over dense node indices.
+        """
+        with self._lock:
+            if self._pending:
+                self._compact()
+            indptr, indices = self._csr
+            num_nodes = len(indptr) - 1
+        return sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(num_nodes, num_nodes),
+        )
+
+    def _node(self, agent_id: int) -> int:
+        node = self._node_of.get(agent_id)
+        if node is None:
+            node = len(self._node_of)
+            self._node_of[agent_id] = node
+            self.ids = np.append(self.ids, agent_id)
+        return node
+
+    def _expand(self, frontier: np.ndarray) -> np.ndarray:
+        """Destination nodes of every out-edge of the frontier, with duplicates."""
+        indptr, indices = self._csr
+        built = frontier[frontier < len(indptr) - 1]
+        starts = indptr[built]
+        counts = indptr[built + 1] - starts
+        total = int(counts.sum())
+        # Offsets of every edge of every frontier row, without a Python loop.
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(
+            total
+        )
+        reached = indices[offsets]
+
+        if self._pending:
+            pending = np.array(self._pending, dtype=np.int64)
+            mask = np.isin(pending[:, 0], frontier)
+            reached = np.concatenate((reached, pending[mask, 1]))
+        return reached
+
+    def _build(self, sources: np.ndarray, destinations: np.ndarray):
+        ids, inverse = np.unique(
+            np.concatenate((sources, destinations)), return_inverse=True
+        )
+        with self._lock:
+            self._node_of = {int(agent_id): node for node, agent_id in enumerate(ids)}
+            self.ids = ids
+            self._set_edges(inverse[: len(sources)], inverse[len(sources) :])
+            self._pending = []
+
+    def _compact(self):
+        """Merge the pending edges into the CSR arrays. Caller holds the lock."""
+        counts = np.diff(self.indptr)
+        sources = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        pending = np.array(self._pending, dtype=np.int64).reshape(-1, 2)
+        self._set_edges(
+            np.concatenate((sources, pending[:, 0])),
+            np.concatenate((self.indices, pending[:, 1])),
+        )
+        self._pending = []
+
+    def _set_edges(self, sources: np.ndarray, destinations: np.ndarray):
+        num_nodes = max(len(self.ids), 1)
+        # Sorting by (source, destination) groups rows and drops duplicate edges.
+        keys = np.unique(sources.astype(np.int64) * num_nodes + destinations)
+        sources, destinations = np.divmod(keys, num_nodes)
+        indptr = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self.ids)), out=indptr[1:])
+        self._csr = (indptr, destinations)
+
+
+relationship_graph = RelationshipGraph()
@@ -1,3 +1,5 @@
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 class PlayerSchema(BaseModel):
@@ -88,6 +90,39 @@ class AgentSchema(BaseModel):
         from_attributes = True
 
 
+class LocationLinkSchema(BaseModel):
+    """
+    Schema for LocationLink data transfer object (DTO).
+    
+    Attributes:
+        id (Optional[int]): The unique identifier for the link.
+        source_location_id (int): The ID of the location the way starts from.
+        destination_location_id (int): The ID of the location the way leads to.
+    
+    Config:
+        from_attributes (bool): Automatically populate attributes from database models.
+    """
+    id: Optional[int] = None
+    source_location_id: int
+    destination_location_id: int
+
+    class Config:
+        from_attributes = True
+
+
+class PrewarmSchema(BaseModel):
+    """
+    Schema for prewarming the locations a player may enter next.
+    
+    Attributes:
+        player_id (int): The ID of the player.
+        location_ids (Optional[List[int]]): The locations to prewarm, by default the
+            ones predicted from the player's current location.
+    """
+    player_id: int
+    location_ids: Optional[List[int]] = None
+
+
 class RelationshipSchema(BaseModel):
     """
     Schema for Relationship data transfer object (DTO).
@@ -136,6 +171,16 @@ class SaySchema(BaseModel):
     message: str
 
 
+class PlayerProfilesSchema(BaseModel):
+    """
+    Schema for requesting the profiles of many players at once.
+    
+    Attributes:
+        player_ids (List[int]): The IDs of the players.
+    """
+    player_ids: List[int]
+
+
 class LeaveLocationSchema(BaseModel):
     """
     Schema for a player leaving a location.
@@ -163,15 +208,18 @@ class EventSchema(BaseModel):
     Schema for Event data transfer object (DTO).
     
     Attributes:
-        id (int): The unique identifier for the event.
+        id (Optional[int]): The unique identifier for the event, assigned by the
+            database. Gossip propagation follows it, so it is ignored on creation.
         player_id (int): The ID of the player associated with the event.
+        location_id (Optional[int]): The ID of the location where the event happened.
         description (str): A description of the event.
     
     Config:
         from_attributes (bool): Automatically populate attributes from database models.
     """
-    id: int
+    id: Optional[int] = None
     player_id: int
+    location_id: Optional[int] = None
     description: str
 
     class Config:
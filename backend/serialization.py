@@ -0,0 +1,116 @@
+from typing import Any, Iterable, List, Sequence, Type
+
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def schema_columns(schema: Type[BaseModel], model: type) -> list:
+    """
+    Get the columns of a model holding the fields of a schema.
+
+    Args:
+        schema (Type[BaseModel]): The schema, whose fields are named after the columns.
+        model (type): The SQLAlchemy model.
+
+    Returns:
+        list: The columns, in the order of the schema's fields.
+    """
+    return [model.__table__.c[name] for name in schema.model_fields]
+
+
+def select_rows(
+    db: Session,
+    schema: Type[BaseModel],
+    model: type,
+    *criteria,
+    order_by: Sequence = (),
+) -> List[dict]:
+    """
+    Read the rows of a model as plain dicts of the schema's fields.
+
+    Only the schema's columns are selected, and no ORM object or schema is built,
+    so this is the fast path for rows that are only serialized.
+
+    Args:
+        db (Session): The database session.
+        schema (Type[BaseModel]): The schema, whose fields are named after the columns.
+        model (type): The SQLAlchemy model.
+        *criteria: The filters of the rows.
+        order_by (Sequence): The order of the rows, by default the order of the
+            database.
+
+    Returns:
+        List[dict]: The rows.
+    """
+    statement = (
+        select(*schema_columns(schema, model)).where(*criteria).order_by(*order_by)
+    )
+    fields = list(schema.model_fields)
+    return [dict(zip(fields, row)) for row in db.execute(statement)]
+
+
+def construct_all(schema: Type[BaseModel], rows: Iterable[dict]) -> list:
+    """
+    Build schemas from database rows without validating them, the database's
+    types already match the schema's.
+
+    Args:
+        schema (Type[BaseModel]): The schema.
+        rows (Iterable[dict]): The rows, from `select_rows`.
+
+    Returns:
+        list: The schemas.
+    """
+    return [schema.model_construct(**row) for row in rows]
+
+
+class MsgpackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+def accepts_msgpack(request: Request) -> bool:
+    """
+    Whether the client asked for MessagePack, and it is installed.
+
+    Args:
+        request (Request): The request.
+
+    Returns:
+        bool: True if the `Accept` header names a MessagePack media type.
+    """
+    if msgpack is None:
+        return False
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def negotiated_response(request: Request, content: Any) -> Response:
+    """
+    Serialize plain data with MessagePack when the client accepts it, otherwise
+    as JSON with orjson.
+
+    Args:
+        request (Request): The request.
+        content (Any): Dicts, lists and scalars.
+
+    Returns:
+        Response: The serialized response.
+    """
+    # Caches keep the encodings apart.
+    headers = {"Vary": "Accept"}
+    if accepts_msgpack(request):
+        return MsgpackResponse(content, headers=headers)
+    return ORJSONResponse(content, headers=headers)
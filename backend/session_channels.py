@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from typing import Dict, Set
+
+from fastapi import WebSocket
+
+from telemetry import SESSION_CHANNELS
+
+logger = logging.getLogger(__name__)
+
+
+class SessionChannel:
+    """
+    A player's open WebSocket, serializing the events sent to it.
+
+    Args:
+        player_id (int): The player the socket belongs to.
+        websocket (WebSocket): The accepted socket.
+    """
+
+    def __init__(self, player_id: int, websocket: WebSocket):
+        self.player_id = player_id
+        self.websocket = websocket
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, event: dict) -> bool:
+        """
+        Send an event to the client.
+
+        Args:
+            event (dict): The JSON event, with its `type`.
+
+        Returns:
+            bool: Whether the event was sent, False once the socket is closed.
+        """
+        async with self._send_lock:
+            try:
+                await self.websocket.send_json(event)
+            except Exception as e:
+                logger.debug(f"Dropping an event for player {self.player_id}: {e}")
+                return False
+        return True
+
+
+class SessionChannelHub:
+    """
+    The open session channels by player ID, through which the server pushes events
+    to players without them asking, e.g. NPC actions.
+    """
+
+    def __init__(self):
+        self._channels: Dict[int, Set[SessionChannel]] = {}
+
+    def connect(self, channel: SessionChannel):
+        self._channels.setdefault(channel.player_id, set()).add(channel)
+        SESSION_CHANNELS.inc()
+
+    def disconnect(self, channel: SessionChannel):
+        channels = self._channels.get(channel.player_id)
+        if channels is None or channel not in channels:
+            return
+        channels.discard(channel)
+        if not channels:
+            del self._channels[channel.player_id]
+        SESSION_CHANNELS.dec()
+
+    def is_connected(self, player_id: int) -> bool:
+        return player_id in self._channels
+
+    async def push(self, player_id: int, event: dict) -> int:
+        """
+        Send an event to every open channel of a player.
+
+        Args:
+            player_id (int): The player ID.
+            event (dict): The JSON event, with its `type`.
+
+        Returns:
+            int: The number of channels the event was sent to.
+        """
+        channels = list(self._channels.get(player_id, ()))
+        if not channels:
+            return 0
+        sent = await asyncio.gather(*(channel.send(event) for channel in channels))
+        return sum(sent)
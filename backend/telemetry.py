@@ -0,0 +1,125 @@
+import time
+from functools import wraps
+
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+
+# Metrics and instrumentation of the backend only, the HTTP ones and the tracing
+# setup shared with the narrator are in `observability.telemetry`.
+
+# Spans are no-ops until `setup_tracing` installs a tracer provider, so with
+# tracing off the instrumentation below costs a few attribute lookups.
+tracer = trace.get_tracer("backend")
+
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Latency of the database queries.",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+CHAIN_CALL_LATENCY = Histogram(
+    "chain_call_duration_seconds",
+    "Latency of the blockchain calls.",
+    ["function", "status"],
+)
+TURN_ADMISSIONS = Counter(
+    "turn_admissions_total",
+    "Player actions by admission outcome: admitted, coalesced, overloaded, queue_full.",
+    ["outcome"],
+)
+TURNS_IN_FLIGHT = Gauge(
+    "turns_in_flight",
+    "Players whose turns are being narrated.",
+)
+PREWARM_LOOKUPS = Counter(
+    "prewarm_lookups_total",
+    "Location contexts looked up by /enterLocation, by result: hit, miss or stale.",
+    ["result"],
+)
+PREWARM_REQUESTS = Counter(
+    "prewarm_requests_total",
+    "Location contexts asked to be prewarmed, by outcome: queued, cached, dropped or error.",
+    ["outcome"],
+)
+NARRATOR_INITS = Counter(
+    "narrator_initializations_total",
+    "Narrator session initializations by what was sent: full, partial, unchanged, "
+    "or resent in full after the narrator missed a version.",
+    ["kind"],
+)
+NARRATOR_SHARD_REQUESTS = Counter(
+    "narrator_shard_requests_total",
+    "Requests sent to the narrator, by the worker owning their player.",
+    ["shard"],
+)
+SESSION_CHANNELS = Gauge(
+    "session_channels_open",
+    "Open player session WebSockets.",
+)
+
+
+def traced_chain_call(func):
+    """
+    Decorator adding a span and a latency measurement to a blockchain call.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        with tracer.start_as_current_span(
+            f"chain {func.__name__}", kind=SpanKind.CLIENT
+        ):
+            try:
+                result = func(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                CHAIN_CALL_LATENCY.labels(func.__name__, status).observe(
+                    time.perf_counter() - start
+                )
+
+    return wrapper
+
+
+def instrument_engine(engine):
+    """
+    Adds a span and a latency measurement to every query run on the engine.
+
+    Args:
+        engine: The SQLAlchemy engine.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        span = tracer.start_span(
+            f"db {operation}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": engine.dialect.name, "db.operation": operation},
+        )
+        conn.info.setdefault("telemetry_queries", []).append(
+            (span, operation, time.perf_counter())
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span, operation, start = conn.info["telemetry_queries"].pop()
+        DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - start)
+        span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        queries = (
+            exception_context.connection
+            and exception_context.connection.info.get("telemetry_queries")
+        )
+        if queries:
+            span, operation, start = queries.pop()
+            DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - start)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class ViewCache:
+    """
+    Cache for contract view call results keyed by (function, args, block number).
+
+    Every read is pinned to the block number of the current epoch, so a cached value
+    is exactly what the chain returned at that block. The epoch advances when a new
+    block is seen, either by the background watcher or lazily on read, and entries
+    of older blocks are dropped. Writes made by the backend itself invalidate the
+    affected entries right away.
+
+    Attributes:
+        poll_interval (float): Seconds between block number checks, 0 to check on
+            every read.
+        hits (int): Number of reads served from the cache.
+        misses (int): Number of reads that went to the node.
+    """
+
+    def __init__(self, fetch_block_number: Callable[[], int], poll_interval: float):
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self._fetch_block_number = fetch_block_number
+        self._block: Optional[int] = None
+        self._checked_at = 0.0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def block_number(self) -> int:
+        """
+        Get the block number of the current epoch, checking the node if it may be outdated.
+
+        Returns:
+            int: The block number reads should be pinned to.
+        """
+        # With a running watcher the node is only asked directly when the watcher
+        # has fallen behind, e.g. because it could not reach the node.
+        max_age = self.poll_interval * (2 if self._watcher is not None else 1)
+        if self._block is None or time.monotonic() - self._checked_at >= max_age:
+            return self.advance()
+        return self._block
+
+    def advance(self) -> int:
+        """
+        Fetch the latest block number and start a new epoch if it changed.
+
+        Returns:
+            int: The latest block number.
+        """
+        block = self._fetch_block_number()
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if block != self._block:
+                self._block = block
+                self._entries.clear()
+        return block
+
+    def get(self, function: str, args: Tuple[Hashable, ...], block: int) -> Any:
+        """
+        Look up a cached result.
+
+        Args:
+            function (str): The contract function name.
+            args (Tuple[Hashable, ...]): The call arguments.
+            block (int): The block number the read is pinned to.
+
+        Returns:
+            The cached result, or `MISSING`.
+        """
+        value = self._entries.get((function, args, block), MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, function: str, args: Tuple[Hashable, ...], block: int, value: Any):
+        """
+        Store a result read at the given block, unless the epoch has moved on meanwhile.
+
+        Args:
+            function (str): The contract function name.
+            args (Tuple[Hashable, ...]): The call arguments.
+            block (int): The block number the value was read at.
+            value: The result of the call.
+        """
+        with self._lock:
+            if block == self._block:
+                self._entries[(function, args, block)] = value
+
+    def invalidate(self, functions: Iterable[str] = (), addresses: Iterable[str] = ()):
+        """
+        Drop the entries a write may have changed and re-check the block number.
+
+        Args:
+            functions (Iterable[str]): Functions whose every entry is dropped.
+            addresses (Iterable[str]): Addresses whose entries are dropped, by argument.
+        """
+        functions, addresses = set(functions), set(addresses)
+        with self._lock:
+            for key in list(self._entries):
+                function, args, _ = key
+                if function in functions or addresses.intersection(args):
+                    del self._entries[key]
+        self.advance()
+
+    def clear(self):
+        """
+        Drop every entry and re-check the block number.
+        """
+        with self._lock:
+            self._entries.clear()
+        self.advance()
+
+    def start_watcher(self):
+        """
+        Start a daemon thread that advances the epoch every `poll_interval` seconds.
+        """
+        if self._watcher is not None or self.poll_interval <= 0:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, name="block-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """
+        Stop the block watcher thread.
+        """
+        if self._watcher is None:
+            return
+        self._stop.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.advance()
+            except Exception as e:
+                logger.warning(f"Block watcher failed to fetch the block number: {e}")
@@ -23,36 +23,47 @@ contract Immersive {
 
     mapping(address => Player) public addressToPlayer;
 
+    event PlayerCreated(address indexed player, uint256 initialMoney);
+    event ItemGiven(uint256 indexed itemId, address indexed to, string data);
+    event ItemDestroyed(uint256 indexed itemId, address indexed owner);
+    event MoneyChanged(address indexed player, uint256 balance);
+
     function createPlayer(
         address addr,
         uint256 initialMoney
     ) public {
         require(msg.sender == ownerAddr, "Only owner can create player");
         addressToPlayer[addr] = Player(initialMoney, 0);
+        emit PlayerCreated(addr, initialMoney);
     }
 
     function giveMoney(address to, uint256 amount) public {
         require(msg.sender == ownerAddr, "Only owner can give money");
         addressToPlayer[to].money += amount;
+        emit MoneyChanged(to, addressToPlayer[to].money);
     }
 
     function takeMoney(address from, uint256 amount) public {
         require(msg.sender == ownerAddr, "Only owner can take money");
         addressToPlayer[from].money -= amount;
+        emit MoneyChanged(from, addressToPlayer[from].money);
     }
 
     function giveItem(address to, string memory data) public {
         require(msg.sender == ownerAddr, "Only owner can give item");
         items.push(Item(data, to));
         addressToPlayer[to].ownedItemsNum++;
+        emit ItemGiven(nextitemId, to, data);
         nextitemId++;
     }
 
     function destroyItem(uint256 itemId) public {
         require(msg.sender == ownerAddr, "Only owner can destroy item");
         require(items[itemId].owner != address(0), "Item does not exist");
-        addressToPlayer[items[itemId].owner].ownedItemsNum--;
+        address owner = items[itemId].owner;
+        addressToPlayer[owner].ownedItemsNum--;
         delete items[itemId];
+        emit ItemDestroyed(itemId, owner);
     }
 
     function getItem(uint256 itemId) public view returns (Item memory) {
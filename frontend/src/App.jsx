@@ -1,8 +1,9 @@
-import { useEffect, useState, useCallback } from "react";
+import { useEffect, useState, useCallback, useRef } from "react";
 import './styles.css';
 
 const LOCATION_NAMES = ["inn", "fairy_village"];
 const PLAYER_ID = 0;
+const RECONNECT_DELAY_MS = 2000;
 
 export default function App() {
     const [message, setMessage] = useState("");
@@ -14,11 +15,70 @@ export default function App() {
 
     const API_URL = import.meta.env.VITE_BACKEND_API_URL;
 
+    const socketRef = useRef(null);
+    const nextMessageIdRef = useRef(0);
+
     const locationIdToResourceName = useCallback((id) => LOCATION_NAMES[id], []);
 
+    const showNpcAction = useCallback((data) => {
+        setDialogue(data.message);
+        setActiveCharacter(data.responder_id);
+    }, []);
+
+    // The session channel carries the messages in and pushes the NPC actions out,
+    // including the ones the player did not ask for.
+    useEffect(() => {
+        let closed = false;
+        let reconnectTimer;
+
+        const connect = () => {
+            const socket = new WebSocket(`${API_URL.replace(/^http/, "ws")}/ws/${PLAYER_ID}`);
+            socketRef.current = socket;
+
+            socket.onmessage = (e) => {
+                const data = JSON.parse(e.data);
+                if (data.type === "npc_action") {
+                    showNpcAction(data);
+                } else if (data.type === "error") {
+                    console.error(`Error: ${data.status} ${data.detail}`);
+                }
+                if (data.reply_to !== undefined && data.reply_to !== null) {
+                    setIsSending(false);
+                }
+            };
+            socket.onclose = () => {
+                if (socketRef.current === socket) socketRef.current = null;
+                // Answers to messages sent on this socket are lost with it.
+                setIsSending(false);
+                if (!closed) reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+            };
+        };
+
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(reconnectTimer);
+            socketRef.current?.close();
+        };
+    }, [API_URL, showNpcAction]);
+
     const sendMessage = async (e) => {
         if (e.key === "Enter" && message.trim()) {
+            e.preventDefault();
             setIsSending(true);
+
+            const socket = socketRef.current;
+            if (socket && socket.readyState === WebSocket.OPEN) {
+                socket.send(JSON.stringify({
+                    type: "say",
+                    id: nextMessageIdRef.current++,
+                    agent_id: activeCharacter,
+                    message: message,
+                }));
+                setMessage("");
+                return;
+            }
+
             try {
                 const response = await fetch(`${API_URL}/say`, {
                     method: "POST",
@@ -28,10 +88,7 @@ export default function App() {
 
                 if (!response.ok) throw new Error(`Error: ${response.status}`);
 
-                const data = await response.json();
-
-                setDialogue(data.message);
-                setActiveCharacter(data.responder_id);
+                showNpcAction(await response.json());
                 setMessage("");
             } catch (error) {
                 console.error(error);
@@ -0,0 +1,224 @@
+"""
+Mock OpenAI-compatible chat completions server for load tests.
+
+Every completion waits for a sampled time to first token, then for the
+generated tokens at a fixed token rate, and returns filler text, or the JSON asked
+for by the narrator's world turn prompt. The prompts of a multi-prompt
+`/v1/completions` request are generated together, in the time of one:
+    python mock_llm.py --port 8099 --latency lognormal --latency-ms 400 --tokens-per-second 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+WORDS = "the tavern is quiet tonight traveler ale road old friend".split()
+# NPCs of a narrator world turn prompt, answered with the JSON it asks for.
+WORLD_TURN_NPC = re.compile(r'<npc name="([^"]+)">')
+
+
+class MockLLM:
+    """Latency model and counters of the mock server."""
+
+    def __init__(
+        self,
+        latency: str,
+        latency_ms: float,
+        jitter: float,
+        tokens_per_second: float,
+        completion_tokens: int,
+    ):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.requests = 0
+        self.prompts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, max_tokens) -> int:
+        """Waits for the simulated generation time, returns the generated tokens."""
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            tokens = min(max_tokens or self.completion_tokens, self.completion_tokens)
+            delay = self.time_to_first_token()
+            if self.tokens_per_second > 0:
+                delay += tokens / self.tokens_per_second
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+        return tokens
+
+    def time_to_first_token(self) -> float:
+        """Samples the time to first token in seconds."""
+        mean = self.latency_ms / 1000
+        if self.latency == "fixed":
+            return mean
+        if self.latency == "uniform":
+            return random.uniform(mean * (1 - self.jitter), mean * (1 + self.jitter))
+        if self.latency == "exponential":
+            return random.expovariate(1 / mean) if mean > 0 else 0
+        # lognormal, `latency_ms` is the median and `jitter` the sigma
+        return random.lognormvariate(0, self.jitter) * mean
+
+
+def create_app(llm: MockLLM) -> FastAPI:
+    """Creates the FastAPI app serving the mock."""
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        """Answers a chat completion after the simulated generation time."""
+        body = await request.json()
+        llm.prompts += 1
+        tokens = await llm.generate(body.get("max_tokens"))
+
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        content = " ".join(random.choices(WORDS, k=tokens))
+        npcs = WORLD_TURN_NPC.findall(prompt)
+        if npcs:
+            content = json.dumps(
+                {
+                    "actions": {
+                        npc: " ".join(
+                            random.choices(WORDS, k=max(1, tokens // len(npcs)))
+                        )
+                        for npc in npcs
+                    },
+                    "chosen": random.choice(npcs),
+                }
+            )
+
+        prompt_tokens = len(prompt.split())
+        return {
+            "id": f"mock-{llm.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": tokens,
+                "total_tokens": prompt_tokens + tokens,
+            },
+        }
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        """Answers a completion of one or more prompts, generated as one batch."""
+        body = await request.json()
+        prompts = body.get("prompt", "")
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        llm.prompts += len(prompts)
+        tokens = await llm.generate(body.get("max_tokens"))
+
+        prompt_tokens = sum(len(prompt.split()) for prompt in prompts)
+        return {
+            "id": f"mock-{llm.requests}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [
+                {
+                    "index": index,
+                    "text": " ".join(random.choices(WORDS, k=tokens)),
+                    "finish_reason": "stop",
+                }
+                for index in range(len(prompts))
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": tokens * len(prompts),
+                "total_tokens": prompt_tokens + tokens * len(prompts),
+            },
+        }
+
+    @app.get("/health")
+    async def health():
+        """Liveness endpoint."""
+        return {"status": "ok"}
+
+    @app.get("/stats")
+    async def stats():
+        """Request counters since startup."""
+        return {
+            "requests": llm.requests,
+            "prompts": llm.prompts,
+            "in_flight": llm.in_flight,
+            "max_in_flight": llm.max_in_flight,
+        }
+
+    return app
+
+
+def add_latency_arguments(parser: argparse.ArgumentParser):
+    """Adds the latency model options, shared with the load test runner."""
+    parser.add_argument(
+        "--latency",
+        choices=["fixed", "uniform", "exponential", "lognormal"],
+        default="lognormal",
+        help="distribution of the time to first token",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=300,
+        help="mean (median for lognormal) time to first token in milliseconds",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.5,
+        help="relative spread for uniform, sigma for lognormal",
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=100,
+        help="generation speed, 0 to return all tokens at once",
+    )
+    parser.add_argument(
+        "--completion-tokens",
+        type=int,
+        default=40,
+        help="tokens per completion, capped by the request's max_tokens",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=8099)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    llm = MockLLM(
+        args.latency,
+        args.latency_ms,
+        args.jitter,
+        args.tokens_per_second,
+        args.completion_tokens,
+    )
+    uvicorn.run(create_app(llm), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+End-to-end load test of the backend -> narrator -> agents -> LLM chain.
+
+Starts the mock LLM, the agents service, the narrator and the backend on a copy of
+`backend/test.db` with the in-memory ledger, then drives synthetic players through
+`/players`, `/enterLocation`, `/say` and `/leaveLocation` and reports throughput
+and latency percentiles per endpoint. Everything runs locally, no network access
+or blockchain node is needed:
+    python run.py --players 20 --visits 2 --turns 5 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from mock_llm import add_latency_arguments
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+AGENTS_DIR = os.path.join(ROOT_DIR, "agents")
+LOADTEST_DIR = os.path.join(ROOT_DIR, "loadtest")
+
+# Ports the services listen on. The narrator and the agents service expect each
+# other on these.
+LLM_PORT = 8099
+AGENTS_PORT = 9080
+NARRATOR_PORT = 7999
+# First port of the narrator workers when there are several.
+NARRATOR_WORKERS_PORT = 8101
+BACKEND_PORT = 8000
+
+# Locations of `test.db` with as many NPCs as `agents/agents.json` has agents.
+LOCATION_IDS = [0, 1]
+# Player IDs of the synthetic players start here, clear of the seeded ones.
+FIRST_PLAYER_ID = 1000
+
+
+class Recorder:
+    """Latencies and failures of the driven requests, by endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(
+        self, client: httpx.AsyncClient, method: str, endpoint: str, **kwargs
+    ):
+        """Sends a request and records its latency, or an error."""
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, endpoint, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        return response.json()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values`, `q` between 0 and 100."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, round(q / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    """Per-endpoint throughput and latency percentiles in milliseconds."""
+    endpoints = {}
+    for endpoint in sorted(set(recorder.latencies) | set(recorder.errors)):
+        latencies = recorder.latencies[endpoint]
+        endpoints[endpoint] = {
+            "requests": len(latencies) + recorder.errors[endpoint],
+            "errors": recorder.errors[endpoint],
+            "throughput": len(latencies) / duration,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return {"duration_s": duration, "endpoints": endpoints}
+
+
+def print_report(summary: dict):
+    print(f"\nDuration: {summary['duration_s']:.1f} s")
+    print(
+        f"{'endpoint':<16}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    )
+    for endpoint, stats in summary["endpoints"].items():
+        print(
+            f"{endpoint:<16}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput']:>9.2f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+    if "llm" in summary:
+        llm = summary["llm"]
+        print(
+            f"LLM calls: {llm['requests']} for {llm['prompts']} prompts, "
+            f"max concurrent: {llm['max_in_flight']}"
+        )
+
+
+async def play(client: httpx.AsyncClient, recorder: Recorder, index: int, args):
+    """Drives one synthetic player through its visits."""
+    rng = random.Random(args.seed + index)
+    player_id = FIRST_PLAYER_ID + index
+    player = {
+        "id": player_id,
+        "bc_address": "0x" + secrets.token_hex(20),
+        "name": f"Player {player_id}",
+        "race": rng.choice(["Human", "Elf", "Dwarf"]),
+        "level": rng.randint(1, 20),
+    }
+    if await recorder.request(client, "POST", "/players", json=player) is None:
+        return
+
+    for visit in range(args.visits):
+        location_id = LOCATION_IDS[(index + visit) % len(LOCATION_IDS)]
+        entered = await recorder.request(
+            client,
+            "POST",
+            "/enterLocation",
+            json={"location_id": location_id, "player_id": player_id},
+        )
+        if entered is None:
+            continue
+        for turn in range(args.turns):
+            await recorder.request(
+                client,
+                "POST",
+                "/say",
+                json={
+                    "player_id": player_id,
+                    "agent_id": rng.choice(entered["agents_ids"]),
+                    "message": f"Turn {turn}, what news from the road?",
+                },
+            )
+            await asyncio.sleep(rng.uniform(0, args.think_time))
+        await recorder.request(
+            client, "POST", "/leaveLocation", json={"player_id": player_id}
+        )
+
+
+async def drive(args) -> dict:
+    """Runs all synthetic players and summarizes the results."""
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.players)
+    async with httpx.AsyncClient(
+        base_url=args.backend_url, timeout=args.timeout, limits=limits
+    ) as client:
+        start = time.perf_counter()
+        tasks = []
+        for index in range(args.players):
+            tasks.append(asyncio.create_task(play(client, recorder, index, args)))
+            if args.ramp_up:
+                await asyncio.sleep(args.ramp_up / args.players)
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+    return summarize(recorder, duration)
+
+
+def wait_for(url: str, timeout: float, process: subprocess.Popen):
+    """Polls `url` until it answers with a non-server-error status."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not come up in {timeout} s")
+
+
+def start_services(args, workdir: str) -> List[subprocess.Popen]:
+    """Starts the mock LLM, agents, narrator and backend, waiting for each to come up."""
+    database = os.path.join(workdir, "loadtest.db")
+    # A WAL left over from an earlier run in the same workdir would not match the copy.
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    shutil.copy(os.path.join(BACKEND_DIR, "test.db"), database)
+    llm_url = f"http://127.0.0.1:{LLM_PORT}"
+    llm_env = dict(
+        os.environ,
+        LLM_API_TOKEN="mock",
+        LLM_URL=f"{llm_url}/v1/chat/completions",
+        LLM_MODEL="mock",
+    )
+    narrator_ports = (
+        range(NARRATOR_WORKERS_PORT, NARRATOR_WORKERS_PORT + args.narrator_workers)
+        if args.narrator_workers > 1
+        else [NARRATOR_PORT]
+    )
+    backend_env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{database}",
+        LEDGER_BACKEND="memory",
+        API_BASE_URL=f"http://127.0.0.1:{NARRATOR_PORT}",
+        NARRATOR_SHARDS=",".join(f"http://127.0.0.1:{port}" for port in narrator_ports),
+    )
+    services = [
+        (
+            "mock_llm",
+            [
+                sys.executable,
+                "mock_llm.py",
+                "--port",
+                str(LLM_PORT),
+                "--latency",
+                args.latency,
+                "--latency-ms",
+                str(args.latency_ms),
+                "--jitter",
+                str(args.jitter),
+                "--tokens-per-second",
+                str(args.tokens_per_second),
+                "--completion-tokens",
+                str(args.completion_tokens),
+            ],
+            LOADTEST_DIR,
+            os.environ,
+            f"{llm_url}/health",
+        ),
+        (
+            "agents",
+            [sys.executable, "agents.py"],
+            AGENTS_DIR,
+            llm_env,
+            f"http://127.0.0.1:{AGENTS_PORT}/docs",
+        ),
+        *(
+            (
+                "narrator" if port == NARRATOR_PORT else f"narrator-{port}",
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "narrator:app",
+                    "--port",
+                    str(port),
+                ],
+                AGENTS_DIR,
+                llm_env,
+                f"http://127.0.0.1:{port}/docs",
+            )
+            for port in narrator_ports
+        ),
+        (
+            "backend",
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(BACKEND_PORT)],
+            BACKEND_DIR,
+            backend_env,
+            f"http://127.0.0.1:{BACKEND_PORT}/ready",
+        ),
+    ]
+
+    processes = []
+    try:
+        for name, command, cwd, env, ready_url in services:
+            log = open(os.path.join(workdir, f"{name}.log"), "w")
+            process = subprocess.Popen(
+                command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+            processes.append(process)
+            wait_for(ready_url, args.startup_timeout, process)
+            print(f"{name} is up, logging to {log.name}")
+    except BaseException:
+        stop_services(processes)
+        raise
+    return processes
+
+
+def stop_services(processes: List[subprocess.Popen]):
+    for process in reversed(processes):
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--players", type=int, default=10, help="concurrent synthetic players"
+    )
+    parser.add_argument(
+        "--visits", type=int, default=2, help="locations each player enters"
+    )
+    parser.add_argument("--turns", type=int, default=3, help="`/say` calls per visit")
+    parser.add_argument(
+        "--think-time", type=float, default=0.5, help="max seconds between turns"
+    )
+    parser.add_argument(
+        "--ramp-up", type=float, default=0, help="seconds over which players join"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="request timeout in seconds"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--narrator-workers",
+        type=int,
+        default=1,
+        help="narrator processes, sharing the sessions by player",
+    )
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument(
+        "--no-start",
+        action="store_true",
+        help="drive services that are already running instead of starting them",
+    )
+    parser.add_argument("--backend-url", default=f"http://127.0.0.1:{BACKEND_PORT}")
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    parser.add_argument(
+        "--workdir", help="keep the database and service logs in this directory"
+    )
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmpdir:
+        workdir = args.workdir or tmpdir
+        os.makedirs(workdir, exist_ok=True)
+        processes = [] if args.no_start else start_services(args, workdir)
+        try:
+            summary = asyncio.run(drive(args))
+            if not args.no_start:
+                summary["llm"] = httpx.get(f"http://127.0.0.1:{LLM_PORT}/stats").json()
+        finally:
+            stop_services(processes)
+
+    summary["config"] = {
+        key: value
+        for key, value in vars(args).items()
+        if key not in ("output", "workdir", "backend_url", "no_start")
+    }
+    print_report(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
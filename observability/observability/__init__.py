@@ -0,0 +1,4 @@
+"""
+Profiling and telemetry shared by the backend and the narrator, installed in both
+with `pip install -e ../observability`.
+"""
@@ -0,0 +1,385 @@
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+# Endpoints run on the event loop or in the threadpool, the other threads
+# (gossip worker, session store writer, ...) are not sampled.
+WORKER_THREAD_PREFIX = "AnyIO worker thread"
+# Innermost frames of a thread waiting for work, stripped before deciding
+# whether the thread is idle.
+WAIT_FILES = ("threading.py", "queue.py", "selectors.py")
+IDLE_FUNCTIONS = {"run", "run_forever", "run_until_complete", "_run_once"}
+
+Frame = Tuple[str, str, int]
+
+
+class ProfilingRule(BaseModel):
+    """
+    Which requests to profile. Every given condition has to match.
+    """
+
+    path: Optional[str] = Field(None, description="Prefix of the request path")
+    header: Optional[str] = Field(
+        None, description="Header the request has to carry, `name` or `name: value`"
+    )
+    sample_rate: float = Field(1.0, ge=0, le=1)
+    max_profiles: int = Field(
+        10, ge=1, description="Profiles to take before turning off"
+    )
+    duration: float = Field(600, gt=0, description="Seconds before turning off")
+    format: Literal["speedscope", "folded"] = "speedscope"
+
+
+class ProfilingStatus(BaseModel):
+    rule: Optional[ProfilingRule]
+    remaining: int
+    expires_in: float
+    profiles: List[str]
+
+
+class Sampler(threading.Thread):
+    """
+    Samples the stacks of the threads serving requests at a fixed interval.
+
+    Args:
+        interval (float): Seconds between samples.
+        loop_thread (int): Ident of the event loop thread.
+    """
+
+    def __init__(self, interval: float, loop_thread: int):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.samples: List[Tuple[str, Tuple[Frame, ...], float]] = []
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self.done = threading.Event()
+
+    def run(self):
+        self.started_at = last = time.perf_counter()
+        while not self.done.wait(self.interval):
+            now = time.perf_counter()
+            self.sample(now - last)
+            last = now
+        self.stopped_at = time.perf_counter()
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+    def sample(self, weight: float):
+        names = {
+            thread.ident: thread.name
+            for thread in threading.enumerate()
+            if thread.ident == self.loop_thread
+            or thread.name.startswith(WORKER_THREAD_PREFIX)
+        }
+        for ident, frame in sys._current_frames().items():
+            if ident not in names:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    (
+                        getattr(code, "co_qualname", code.co_name),
+                        code.co_filename,
+                        code.co_firstlineno,
+                    )
+                )
+                frame = frame.f_back
+            stack.reverse()
+            if not is_idle(stack):
+                self.samples.append((names[ident], tuple(stack), weight))
+
+
+def is_idle(stack: List[Frame]) -> bool:
+    """
+    Tells whether a thread, given its stack from the outermost frame, waits for work.
+    """
+    end = len(stack)
+    while end and stack[end - 1][1].endswith(WAIT_FILES):
+        end -= 1
+    return end > 0 and stack[end - 1][0].rsplit(".", 1)[-1] in IDLE_FUNCTIONS
+
+
+def to_speedscope(sampler: Sampler, name: str) -> dict:
+    """
+    Converts the samples to the speedscope file format, with a profile per thread.
+    """
+    frames: List[dict] = []
+    frame_ids: Dict[Frame, int] = {}
+    profiles: Dict[str, dict] = {}
+    duration = sampler.stopped_at - sampler.started_at
+    for thread, stack, weight in sampler.samples:
+        profile = profiles.setdefault(
+            thread,
+            {
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": duration,
+                "samples": [],
+                "weights": [],
+            },
+        )
+        ids = []
+        for frame in stack:
+            if frame not in frame_ids:
+                frame_ids[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            ids.append(frame_ids[frame])
+        profile["samples"].append(ids)
+        profile["weights"].append(weight)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "observability profiling",
+        "shared": {"frames": frames},
+        "profiles": list(profiles.values()),
+    }
+
+
+def to_folded(sampler: Sampler) -> str:
+    """
+    Converts the samples to collapsed stacks for `flamegraph.pl`, counted in
+    microseconds.
+    """
+    totals: Dict[str, float] = {}
+    for thread, stack, weight in sampler.samples:
+        line = ";".join(
+            [thread] + [f"{frame[0]} ({frame[1]}:{frame[2]})" for frame in stack]
+        )
+        totals[line] = totals.get(line, 0) + weight
+    return "".join(f"{line} {round(total * 1e6)}\n" for line, total in totals.items())
+
+
+class RequestProfiler:
+    """
+    Profiles the requests matching the active rule and keeps the latest profiles
+    in a directory.
+
+    Only one request is profiled at a time. Without an active rule,
+    `ProfilingMiddleware` costs a single attribute check per request.
+
+    Args:
+        directory (str): Where the profiles are written.
+        max_files (int): Profiles kept in `directory`, the oldest are removed first.
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, directory: str, max_files: int, interval: float):
+        self.directory = directory
+        self.max_files = max_files
+        self.interval = interval
+        self.rule: Optional[ProfilingRule] = None
+        self.remaining = 0
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+        self._busy = False
+
+    def enable(self, rule: ProfilingRule):
+        with self._lock:
+            self.rule = rule
+            self.remaining = rule.max_profiles
+            self.expires_at = time.monotonic() + rule.duration
+
+    def disable(self):
+        with self._lock:
+            self.rule = None
+
+    def status(self) -> ProfilingStatus:
+        expires_in = self.expires_at - time.monotonic()
+        rule = self.rule if expires_in > 0 else None
+        return ProfilingStatus(
+            rule=rule,
+            remaining=self.remaining if rule else 0,
+            expires_in=expires_in if rule else 0,
+            profiles=self.profiles(),
+        )
+
+    def profiles(self) -> List[str]:
+        """
+        Returns the file names of the kept profiles, newest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return [entry.name for entry in entries]
+
+    def claim(self, request: Request) -> Optional[ProfilingRule]:
+        """
+        Returns the rule if the request is to be profiled, and counts it.
+        """
+        rule = self.rule
+        if rule is None:
+            return None
+        if rule.path and not request.url.path.startswith(rule.path):
+            return None
+        if rule.header:
+            name, _, value = rule.header.partition(":")
+            actual = request.headers.get(name.strip())
+            if actual is None or (value.strip() and actual != value.strip()):
+                return None
+        if rule.sample_rate < 1 and random.random() >= rule.sample_rate:
+            return None
+        with self._lock:
+            if self.rule is not rule or self._busy:
+                return None
+            if time.monotonic() >= self.expires_at:
+                self.rule = None
+                return None
+            self._busy = True
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.rule = None
+        return rule
+
+    def release(self):
+        """
+        Lets the next matching request be profiled.
+        """
+        with self._lock:
+            self._busy = False
+
+    def save(self, sampler: Sampler, request: Request, format: str):
+        """
+        Writes a profile and removes the oldest ones over `max_files`.
+        """
+        duration = sampler.stopped_at - sampler.started_at
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", request.url.path).strip("_") or "root"
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        name = f"{timestamp}-{request.method}-{slug}-{duration * 1000:.0f}ms"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if format == "folded":
+                path = os.path.join(self.directory, f"{name}.folded")
+                with open(path, "w") as f:
+                    f.write(to_folded(sampler))
+            else:
+                path = os.path.join(self.directory, f"{name}.speedscope.json")
+                with open(path, "w") as f:
+                    json.dump(
+                        to_speedscope(sampler, f"{request.method} {request.url.path}"),
+                        f,
+                    )
+            for old in self.profiles()[self.max_files :]:
+                os.remove(os.path.join(self.directory, old))
+        except OSError as e:
+            logger.warning(f"Failed to write the profile {name}: {e}")
+            return
+        logger.info(f"Profiled {request.method} {request.url.path} to {path}")
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware sampling the stacks while a request matching the rule of the
+    profiler is handled, up to the last byte of the response.
+
+    Args:
+        app: The wrapped ASGI app.
+        profiler (RequestProfiler): The profiler holding the rule.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if profiler.rule is None or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        rule = profiler.claim(request)
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        sampler = Sampler(profiler.interval, threading.get_ident())
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Joining the sampler waits up to an interval, off the event loop.
+            await run_in_threadpool(sampler.stop)
+            profiler.release()
+            await run_in_threadpool(profiler.save, sampler, request, rule.format)
+
+
+def admin_token_dependency(admin_token: str):
+    """
+    Creates a dependency requiring the `X-Admin-Token` header to match
+    `admin_token`, answering `404` when no token is configured.
+    """
+
+    def require_admin(x_admin_token: Optional[str] = Header(None)):
+        if not admin_token:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        if x_admin_token is None or not hmac.compare_digest(x_admin_token, admin_token):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+    return require_admin
+
+
+def create_admin_router(profiler: RequestProfiler, admin_token: str) -> APIRouter:
+    """
+    Creates the endpoints controlling the profiler, under `/admin/profiling`.
+
+    They require the `X-Admin-Token` header to match `admin_token`, and answer
+    `404` when no token is configured.
+    """
+    router = APIRouter(
+        prefix="/admin/profiling",
+        dependencies=[Depends(admin_token_dependency(admin_token))],
+    )
+
+    @router.get("", response_model=ProfilingStatus)
+    def get_profiling():
+        """
+        Returns the active rule and the kept profiles.
+        """
+        return profiler.status()
+
+    @router.put("", response_model=ProfilingStatus)
+    def enable_profiling(rule: ProfilingRule):
+        """
+        Starts profiling the requests matching the rule.
+        """
+        profiler.enable(rule)
+        return profiler.status()
+
+    @router.delete("", response_model=ProfilingStatus)
+    def disable_profiling():
+        """
+        Stops profiling.
+        """
+        profiler.disable()
+        return profiler.status()
+
+    @router.get("/profiles/{name}")
+    def get_profile(name: str):
+        """
+        Downloads a profile.
+        """
+        if name not in profiler.profiles():
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(os.path.join(profiler.directory, name))
+
+    return router
@@ -0,0 +1,214 @@
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.trace import SpanKind
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Histogram,
+    generate_latest,
+    write_to_textfile,
+)
+from starlette.requests import Request
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# Spans are no-ops until `setup_tracing` installs a tracer provider, so with
+# tracing off the instrumentation below costs a few attribute lookups.
+tracer = trace.get_tracer(__name__)
+
+# From database-bound backend requests to narrator requests waiting on LLMs.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+# Metrics of both services, declared once so that a process importing both, such
+# as the benchmarks, registers them once.
+REQUEST_LATENCY = Histogram(
+    "http_server_request_duration_seconds",
+    "Latency of the HTTP requests handled by the service.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CLIENT_LATENCY = Histogram(
+    "http_client_request_duration_seconds",
+    "Latency of the HTTP requests sent by the service.",
+    ["method", "url", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+NPC_TICKS = Counter(
+    "npc_ticks_total",
+    "NPC ticks by outcome. The backend counts the location ticks as action, silence, "
+    "error, or skipped as idle, busy or deferred, the narrator its ticks as action, "
+    "silence, invalid or error.",
+    ["outcome"],
+)
+
+
+def setup_tracing(service_name: str, exporter: str, trace_file: str):
+    """
+    Installs the tracer provider and the span exporter.
+
+    Args:
+        service_name (str): The service name reported on every span.
+        exporter (str): `none`, `console`, `file` (JSON lines in `trace_file`) or `otlp`
+            (configured with the standard `OTEL_EXPORTER_OTLP_*` variables).
+        trace_file (str): The file `file` exporter appends spans to.
+    """
+    if exporter == "none":
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if exporter == "console":
+        span_exporter = ConsoleSpanExporter(out=sys.stdout)
+    elif exporter == "file":
+        span_exporter = ConsoleSpanExporter(
+            out=open(trace_file, "a"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    elif exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        span_exporter = OTLPSpanExporter()
+    else:
+        raise ValueError(f"Unknown TRACE_EXPORTER {exporter!r}")
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+
+
+def shutdown_tracing():
+    """
+    Flushes the pending spans.
+    """
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+async def telemetry_middleware(request: Request, call_next):
+    """
+    Continues the trace of the caller and records the request latency by route.
+    """
+    start = time.perf_counter()
+    with tracer.start_as_current_span(
+        f"{request.method} {request.url.path}",
+        context=propagate.extract(request.headers),
+        kind=SpanKind.SERVER,
+    ) as span:
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # The route template keeps the label set bounded, unlike the raw path.
+            route = request.scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            span.update_name(f"{request.method} {route}")
+            span.set_attribute("http.route", route)
+            span.set_attribute("http.response.status_code", status)
+            REQUEST_LATENCY.labels(request.method, route, str(status)).observe(
+                time.perf_counter() - start
+            )
+
+
+def metrics_response() -> Response:
+    """
+    Renders every metric in the Prometheus text format.
+    """
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def start_metrics_file_writer(path: str, interval: float) -> threading.Event:
+    """
+    Periodically writes the metrics to a file, e.g. for the node exporter's textfile
+    collector.
+
+    Args:
+        path (str): The file to write.
+        interval (float): Seconds between writes.
+
+    Returns:
+        threading.Event: Set it to stop the writer.
+    """
+    stop = threading.Event()
+
+    def write():
+        while not stop.wait(interval):
+            try:
+                write_to_textfile(path, REGISTRY)
+            except OSError as e:
+                logger.warning(f"Failed to write the metrics to {path}: {e}")
+
+    threading.Thread(target=write, name="metrics-writer", daemon=True).start()
+    return stop
+
+
+class OutgoingRequest:
+    """
+    An outgoing HTTP request being traced.
+
+    Attributes:
+        headers (Dict[str, str]): Headers carrying the trace context, to send along.
+        status (Optional[int]): The response status, set by the caller.
+    """
+
+    __slots__ = ("headers", "status")
+
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+        self.status: Optional[int] = None
+
+
+@contextmanager
+def traced_request(method: str, url: str):
+    """
+    Span and latency of an outgoing HTTP request.
+
+    Args:
+        method (str): The HTTP method.
+        url (str): The URL template, without IDs or query parameters.
+
+    Yields:
+        OutgoingRequest: The headers to send and where to put the response status.
+    """
+    start = time.perf_counter()
+    with tracer.start_as_current_span(f"{method} {url}", kind=SpanKind.CLIENT) as span:
+        outgoing = OutgoingRequest(inject_context())
+        try:
+            yield outgoing
+        finally:
+            status = str(outgoing.status) if outgoing.status is not None else "error"
+            span.set_attribute("http.request.method", method)
+            span.set_attribute("url.full", url)
+            span.set_attribute("http.response.status_code", status)
+            CLIENT_LATENCY.labels(method, url, status).observe(
+                time.perf_counter() - start
+            )
+
+
+def inject_context() -> Dict[str, str]:
+    """
+    Returns the current trace context as W3C trace context headers.
+    """
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+def extract_context(carrier: Dict[str, str]) -> context.Context:
+    """
+    Returns the trace context carried by `carrier`.
+    """
+    return propagate.extract(carrier)